@@ -1,13 +1,31 @@
+# Patch do gevent antes de qualquer import de rede (preload_app carrega o app no master)
+from gevent import monkey
+monkey.patch_all()
+
 import os
+import multiprocessing
 
 # Configuração do Gunicorn para Render
 bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
-workers = 2
-worker_class = "sync"
+workers = multiprocessing.cpu_count() * 2 + 1
+worker_class = "gevent"
 worker_connections = 1000
 timeout = 30
 keepalive = 2
+# Recicla workers periodicamente (protege contra vazamentos em greenlets)
 max_requests = 1000
 max_requests_jitter = 100
 preload_app = True
 
+
+def post_fork(server, worker):
+    # Faz o psycopg2 ceder o controle ao gevent durante o I/O com o banco
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+    # Com preload_app o pool foi criado no master: cada worker abre suas próprias conexões
+    # (close=False não fecha os sockets herdados, que ainda pertencem ao master)
+    from src.main import app
+    from src.models.wendy_models import db
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -0,0 +1,45 @@
+# Log de auditoria das ações administrativas (exclusões de conta)
+# A requisição só enfileira o registro; a escrita (arquivo em AUDIT_LOG_FILE ou
+# stderr) fica com a thread do QueueListener, fora do caminho da resposta
+
+import atexit
+import logging
+import os
+import queue
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+audit_logger = logging.getLogger('wendy.audit')
+audit_logger.setLevel(logging.INFO)
+audit_logger.propagate = False
+
+_listener = None
+_listener_pid = None
+
+
+def _start_listener():
+    """Inicia o listener no processo atual.
+
+    Threads não sobrevivem ao fork (preload_app do gunicorn): cada worker
+    inicia o seu na primeira gravação.
+    """
+    global _listener, _listener_pid
+    path = os.getenv('AUDIT_LOG_FILE')
+    handler = logging.FileHandler(path) if path else logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(message)s'))
+
+    log_queue = queue.SimpleQueue()
+    audit_logger.handlers = [QueueHandler(log_queue)]
+    _listener = QueueListener(log_queue, handler)
+    _listener.start()
+    _listener_pid = os.getpid()
+    # Esvazia a fila antes do worker sair (reciclagem por max_requests)
+    atexit.register(_listener.stop)
+
+
+def audit_log(event, data):
+    """Enfileira um registro de auditoria (uma linha JSON serializada pelo orjson)"""
+    if _listener_pid != os.getpid():
+        _start_listener()
+    audit_logger.info(orjson.dumps({'event': event, **data}).decode())
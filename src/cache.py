@@ -0,0 +1,32 @@
+# Cache compartilhado entre os workers (Flask-Caching)
+# Com REDIS_URL usa o Redis; sem ele, cai num cache em memória por processo
+
+import os
+from flask_caching import Cache
+
+cache = Cache()
+
+DASHBOARD_CACHE_KEY = 'admin:dashboard'
+DASHBOARD_CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', 5))
+CITIES_CACHE_KEY = 'cities:available'
+CITIES_CACHE_TTL = int(os.getenv('CITIES_CACHE_TTL', 300))
+
+
+def init_cache(app):
+    redis_url = os.getenv('REDIS_URL')
+    if redis_url:
+        app.config['CACHE_TYPE'] = 'RedisCache'
+        app.config['CACHE_REDIS_URL'] = redis_url
+    else:
+        app.config['CACHE_TYPE'] = 'SimpleCache'
+    app.config['CACHE_KEY_PREFIX'] = 'wendy:'
+    cache.init_app(app)
+
+
+def cached_data(key, timeout, compute):
+    """Devolve o valor em cache ou calcula, grava e devolve"""
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, timeout=timeout)
+    return data
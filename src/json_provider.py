@@ -0,0 +1,40 @@
+# Provider JSON do Flask baseado em orjson
+# Serialização em Rust, com datetime/date/UUID tratados nativamente
+
+import orjson
+from decimal import Decimal
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.engine import Row, RowMapping
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Substitui o json da stdlib pelo orjson em jsonify e request.get_json"""
+
+    # Sem OPT_NAIVE_UTC: datetimes naive saem no mesmo formato do isoformat()
+    option = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+    @staticmethod
+    def default(obj):
+        # Linhas do Core (select/with_entities) vão direto para a resposta
+        if isinstance(obj, Row):
+            return obj._asdict()
+        if isinstance(obj, RowMapping):
+            return dict(obj)
+        # Numeric do Postgres (SUM/AVG sobre colunas numeric): mesma saída do
+        # provider padrão do Flask, sem passar pela cadeia de checagens dele
+        if isinstance(obj, Decimal):
+            return str(obj)
+        return DefaultJSONProvider.default(obj)
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self.option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=self.default, option=self.option),
+            mimetype=self.mimetype
+        )
@@ -1,121 +1,245 @@
 import os
 import sys
-from flask import Flask, send_from_directory, jsonify
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import click
+import orjson
+from datetime import datetime, timedelta
+from flask import Flask, Response, current_app, request, send_from_directory, jsonify
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
-from src.models.wendy_models import db
-from src.models.geolocation_models import DelivererLocation, OrderTracking, GeofenceArea
-from src.models.chat_models import Conversation, Message
-from src.models.rating_models import Rating, UserRatingStats
-from src.models.notification_models import DeviceToken
-from src.routes.auth import auth_bp
-from src.routes.stores import stores_bp
-from src.routes.products import products_bp
-from src.routes.orders import orders_bp
-from src.routes.deliverers import deliverers_bp
-from src.routes.admin import admin_bp
-from src.routes.geolocation import geolocation_bp
-from src.routes.chat import chat_bp
-from src.routes.ratings import ratings_bp
-from src.routes.notifications import notifications_bp
-from src.routes.reports import reports_bp
+from werkzeug.security import safe_join
+from whitenoise import WhiteNoise
+from src.cache import init_cache
+from src.json_provider import OrjsonProvider
+from sqlalchemy import event
+from src.models.wendy_models import db, enable_strict_loading, set_sqlite_pragmas, DAILY_REVENUE_VIEW
 
-sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+# Respostas fixas serializadas uma única vez na importação
+HEALTH_BODY = orjson.dumps({
+    'status': 'ok',
+    'message': 'Wendy Backend API is running',
+    'version': '2.4.0',
+    'features': ['geolocation', 'real-time-tracking', 'chat', 'ratings', 'notifications', 'reports']
+})
+
+ROOT_INFO_BODY = orjson.dumps({
+    'message': 'Wendy Backend API v2.4.0',
+    'endpoints': {
+        'health': '/api/health',
+        'auth': '/api/auth/*',
+        'stores': '/api/stores/*',
+        'products': '/api/products/*',
+        'orders': '/api/orders/*',
+        'deliverers': '/api/deliverers/*',
+        'admin': '/api/admin/*',
+        'geolocation': '/api/geolocation/*',
+        'chat': '/api/chat/*',
+        'ratings': '/api/ratings/*',
+        'notifications': '/api/notifications/*',
+        'reports': '/api/reports/*',
+        'store': '/api/store/*'
+    },
+    'new_features': [
+        'Real-time location tracking',
+        'Order tracking with maps',
+        'Delivery time estimation',
+        'Nearby deliverers search',
+        'Geofence zones',
+        'Chat between users',
+        'Ratings system',
+        'Push notifications',
+        'Advanced reports'
+    ]
+})
+
+HEALTH_ETAG = hashlib.md5(HEALTH_BODY).hexdigest()
+ROOT_INFO_ETAG = hashlib.md5(ROOT_INFO_BODY).hexdigest()
+
+def cacheable_json(body, etag, max_age):
+    """Resposta JSON fixa com ETag e Cache-Control público (CDN/navegador respondem repetições)"""
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+def register_blueprints(app):
+    """Importa cada blueprint junto do seu registro"""
+    from src.routes.auth import auth_bp
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    from src.routes.stores import stores_bp
+    app.register_blueprint(stores_bp, url_prefix='/api/stores')
+    from src.routes.products import products_bp
+    app.register_blueprint(products_bp, url_prefix='/api/products')
+    from src.routes.orders import orders_bp
+    app.register_blueprint(orders_bp, url_prefix='/api/orders')
+    from src.routes.deliverers import deliverers_bp
+    app.register_blueprint(deliverers_bp, url_prefix='/api/deliverers')
+    from src.routes.admin import admin_bp
+    app.register_blueprint(admin_bp, url_prefix='/api/admin')
+    from src.routes.geolocation import geolocation_bp
+    app.register_blueprint(geolocation_bp, url_prefix='/api/geolocation')
+    from src.routes.chat import chat_bp
+    app.register_blueprint(chat_bp, url_prefix='/api/chat')
+    from src.routes.ratings import ratings_bp
+    app.register_blueprint(ratings_bp, url_prefix='/api/ratings')
+    from src.routes.notifications import notifications_bp
+    app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
+    from src.routes.reports import reports_bp
+    app.register_blueprint(reports_bp, url_prefix='/api/reports')
+
+def register_commands(app):
+    """Comandos de manutenção (executar via cron: flask --app src.main <comando>)"""
+
+    @app.cli.command('purge-tracking')
+    @click.option('--days', default=30, show_default=True, help='Dias de histórico mantidos')
+    def purge_tracking(days):
+        """Remove histórico de localização e tracking mais antigo que N dias"""
+        from src.models.geolocation_models import DelivererLocation, OrderTracking
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        locations = DelivererLocation.purge_older_than(cutoff)
+        tracking = OrderTracking.purge_older_than(cutoff)
+        click.echo(f'{locations} localizações e {tracking} pontos de tracking removidos')
+
+    @app.cli.command('backfill-order-names')
+    def backfill_order_names():
+        """Preenche client/store/deliverer_name dos pedidos antigos"""
+        from src.models.wendy_models import BACKFILL_ORDER_NAMES
+        for statement in BACKFILL_ORDER_NAMES:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+        click.echo('Nomes dos pedidos preenchidos')
+
+    @app.cli.command('refresh-daily-revenue')
+    def refresh_daily_revenue():
+        """Atualiza a view materializada do relatório de receita diária"""
+        # Cria a view caso o comando rode antes da primeira inicialização do app
+        for statement in DAILY_REVENUE_VIEW:
+            db.session.execute(db.text(statement))
+        db.session.commit()
+        # CONCURRENTLY não roda dentro de transação
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(db.text('REFRESH MATERIALIZED VIEW CONCURRENTLY mv_daily_revenue'))
+        click.echo('Receita diária atualizada')
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-
-# Configurações
-app.config['SECRET_KEY'] = 'wendy-marketplace-secret-key-2025'
-app.config['JWT_SECRET_KEY'] = 'wendy-jwt-secret-key-2025'
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False
-
-# CORS - permitir os 3 frontends
-CORS(app, origins=[
-    "https://wendy-site-admin.vercel.app",
-    "https://wendy-site-lojista.vercel.app",
-    "https://wendy-site-app.vercel.app"
-])
-
-# JWT
-jwt = JWTManager(app)
-
-# Registrar blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(stores_bp, url_prefix='/api/stores')
-app.register_blueprint(products_bp, url_prefix='/api/products')
-app.register_blueprint(orders_bp, url_prefix='/api/orders')
-app.register_blueprint(deliverers_bp, url_prefix='/api/deliverers')
-app.register_blueprint(admin_bp, url_prefix='/api/admin')
-app.register_blueprint(geolocation_bp, url_prefix='/api/geolocation')
-app.register_blueprint(chat_bp, url_prefix='/api/chat')
-app.register_blueprint(ratings_bp, url_prefix='/api/ratings')
-app.register_blueprint(notifications_bp, url_prefix='/api/notifications')
-app.register_blueprint(reports_bp, url_prefix='/api/reports')
-
-
-# Configuração do banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Criar tabelas
-with app.app_context():
-    db.create_all()
-
-@app.route('/api/health')
 def health_check():
-    return jsonify({
-        'status': 'ok',
-        'message': 'Wendy Backend API is running',
-        'version': '2.4.0',
-        'features': ['geolocation', 'real-time-tracking', 'chat', 'ratings', 'notifications', 'reports']
-    })
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
+    return cacheable_json(HEALTH_BODY, HEALTH_ETAG, max_age=30)
+
+def accel_redirect(path):
+    """Delega o envio do arquivo ao nginx (X-Accel-Redirect); o Python não lê o conteúdo"""
+    prefix = current_app.config['STATIC_ACCEL_REDIRECT_PREFIX'].rstrip('/')
+    response = Response()
+    response.headers['X-Accel-Redirect'] = f'{prefix}/{path}'
+    # O nginx define o Content-Type pela extensão do arquivo
+    del response.headers['Content-Type']
+    return response
+
 def serve(path):
-    static_folder_path = app.static_folder
+    static_folder_path = current_app.static_folder
     if static_folder_path is None:
         return jsonify({'error': 'Static folder not configured'}), 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
+    # Atrás do nginx, arquivos existentes são entregues pelo proxy;
+    # sem ele, o WhiteNoise já os entregou e aqui só resta o fallback da SPA
+    if current_app.config['STATIC_ACCEL_REDIRECT_PREFIX'] and path:
+        file_path = safe_join(static_folder_path, path)
+        if file_path and os.path.isfile(file_path):
+            return accel_redirect(path)
+
+    index_path = os.path.join(static_folder_path, 'index.html')
+    if os.path.exists(index_path):
+        return send_from_directory(static_folder_path, 'index.html')
     else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return jsonify({
-                'message': 'Wendy Backend API v2.4.0',
-                'endpoints': {
-                    'health': '/api/health',
-                    'auth': '/api/auth/*',
-                    'stores': '/api/stores/*',
-                    'products': '/api/products/*',
-                    'orders': '/api/orders/*',
-                    'deliverers': '/api/deliverers/*',
-                    'admin': '/api/admin/*',
-                    'geolocation': '/api/geolocation/*',
-                    'chat': '/api/chat/*',
-                    'ratings': '/api/ratings/*',
-                    'notifications': '/api/notifications/*',
-                    'reports': '/api/reports/*',
-                    'store': '/api/store/*'
-                },
-                'new_features': [
-                    'Real-time location tracking',
-                    'Order tracking with maps',
-                    'Delivery time estimation',
-                    'Nearby deliverers search',
-                    'Geofence zones',
-                    'Chat between users',
-                    'Ratings system',
-                    'Push notifications',
-                    'Advanced reports'
-                ]
-            })
+        return cacheable_json(ROOT_INFO_BODY, ROOT_INFO_ETAG, max_age=300)
+
+def create_app():
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.json = OrjsonProvider(app)
+
+    # Configurações
+    app.config['SECRET_KEY'] = 'wendy-marketplace-secret-key-2025'
+    app.config['JWT_SECRET_KEY'] = 'wendy-jwt-secret-key-2025'
+    app.config['JWT_ACCESS_TOKEN_EXPIRES'] = False
+
+    # CORS - permitir os 3 frontends
+    CORS(app, origins=[
+        "https://wendy-site-admin.vercel.app",
+        "https://wendy-site-lojista.vercel.app",
+        "https://wendy-site-app.vercel.app"
+    ])
+
+    # JWT
+    JWTManager(app)
+
+    # Cache (Redis quando REDIS_URL estiver definida)
+    init_cache(app)
+
+    # Location interna do nginx que aponta para src/static (ex.: /_protected).
+    # Quando definida, o proxy envia os arquivos; caso contrário, o WhiteNoise.
+    app.config['STATIC_ACCEL_REDIRECT_PREFIX'] = os.getenv('STATIC_ACCEL_REDIRECT_PREFIX')
+    if not app.config['STATIC_ACCEL_REDIRECT_PREFIX']:
+        # Arquivos estáticos servidos pelo WhiteNoise (ETag, gzip/br e sendfile), antes do Flask
+        app.wsgi_app = WhiteNoise(app.wsgi_app, root=app.static_folder, prefix='/', index_file=True)
+
+    # Registrar blueprints
+    register_blueprints(app)
+
+    # Configuração do banco de dados
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_RECORD_QUERIES'] = False
+    # Pool dimensionado para os greenlets do gevent.
+    # Regra: workers * (pool_size + max_overflow) <= max_connections do PostgreSQL
+    # (menos as conexões reservadas para admin/migrações).
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 20)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 30)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'pool_pre_ping': True,  # conexões ociosas derrubadas pelo Postgres do Render
+        # LIFO: reaproveita sempre as conexões mais quentes; as excedentes ficam
+        # ociosas e são recicladas em vez de todas serem revezadas
+        'pool_use_lifo': True,
+        # Cache de SQL compilado do SQLAlchemy, dimensionado para o vocabulário de queries do app
+        'query_cache_size': 1200,
+        'echo': False
+    }
+    db.init_app(app)
+
+    # Sem o Postgres (DATABASE_URL sqlite:// no desenvolvimento), ajusta o SQLite a cada conexão
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', set_sqlite_pragmas)
+
+    # CI/testes: DB_STRICT_LOADING=1 faz qualquer lazy load com SQL falhar,
+    # travando as correções de N+1 (listagens precisam de options explícitas)
+    app.config['DB_STRICT_LOADING'] = os.getenv('DB_STRICT_LOADING') == '1'
+    if app.config['DB_STRICT_LOADING']:
+        enable_strict_loading()
+
+    # Criar tabelas (os modelos auxiliares precisam estar importados)
+    from src.models import geolocation_models, chat_models, rating_models, notification_models
+    with app.app_context():
+        db.create_all()
+        # DDL idempotente que o create_all não aplica a tabelas já existentes
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.begin() as connection:
+                for statement in geolocation_models.SPATIAL_SEARCH_DDL + DAILY_REVENUE_VIEW:
+                    connection.execute(db.text(statement))
+
+    register_commands(app)
+
+    app.add_url_rule('/api/health', view_func=health_check)
+    app.add_url_rule('/', defaults={'path': ''}, view_func=serve)
+    app.add_url_rule('/<path:path>', view_func=serve)
+
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
-
@@ -1,50 +1,67 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from src.models.wendy_models import db
+from sqlalchemy.ext.hybrid import hybrid_property
+from src.models.wendy_models import db, SerializerMixin, utc_now
+import zstandard
 
-class Conversation(db.Model):
+# Mensagens acima deste tamanho são gravadas comprimidas (zstd) em content_zstd
+COMPRESS_THRESHOLD = 200
+_compressor = zstandard.ZstdCompressor(level=3)
+_decompressor = zstandard.ZstdDecompressor()
+
+class Conversation(SerializerMixin, db.Model):
     __tablename__ = 'conversations'
     
     id = db.Column(db.Integer, primary_key=True)
     participant1_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     participant2_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=True) # Conversa ligada a um pedido
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utc_now())
+    updated_at = db.Column(db.DateTime, server_default=utc_now(), onupdate=utc_now())
     
     messages = db.relationship('Message', backref='conversation', lazy=True, order_by='Message.timestamp')
     participant1 = db.relationship('User', foreign_keys=[participant1_id], backref='conversations_as_p1')
     participant2 = db.relationship('User', foreign_keys=[participant2_id], backref='conversations_as_p2')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'participant1_id': self.participant1_id,
-            'participant2_id': self.participant2_id,
-            'order_id': self.order_id,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat()
-        }
+    __serialize__ = (
+        'id', 'participant1_id', 'participant2_id', 'order_id', 'created_at', 'updated_at'
+    )
 
-class Message(db.Model):
+class Message(SerializerMixin, db.Model):
     __tablename__ = 'messages'
+    __table_args__ = (
+        db.Index('ix_msg_conv_ts', 'conversation_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversations.id'), nullable=False)
     sender_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    content = db.Column(db.Text, nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    # Texto completo (mensagens curtas) ou apenas o prefixo pesquisável (mensagens longas)
+    _content = db.Column('content', db.Text, nullable=False)
+    content_zstd = db.Column(db.LargeBinary)
+    timestamp = db.Column(db.DateTime, server_default=utc_now())
     is_read = db.Column(db.Boolean, default=False)
     
     sender = db.relationship('User', foreign_keys=[sender_id], backref='sent_messages')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'conversation_id': self.conversation_id,
-            'sender_id': self.sender_id,
-            'content': self.content,
-            'timestamp': self.timestamp.isoformat(),
-            'is_read': self.is_read
-        }
+    @hybrid_property
+    def content(self):
+        if self.content_zstd is not None:
+            return _decompressor.decompress(self.content_zstd).decode('utf-8')
+        return self._content
+    
+    @content.setter
+    def content(self, value):
+        if value is not None and len(value) > COMPRESS_THRESHOLD:
+            self._content = value[:COMPRESS_THRESHOLD]
+            self.content_zstd = _compressor.compress(value.encode('utf-8'))
+        else:
+            self._content = value
+            self.content_zstd = None
+    
+    @content.expression
+    def content(cls):
+        return cls._content
+    
+    __serialize__ = (
+        'id', 'conversation_id', 'sender_id', 'content', 'timestamp', 'is_read'
+    )
 
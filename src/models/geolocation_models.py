@@ -1,9 +1,23 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
-from src.models.wendy_models import db
+from sqlalchemy import DDL, event, insert, select
+from sqlalchemy.sql import func
+from src.models.wendy_models import db, SerializerMixin, utc_now, related
 
-class DelivererLocation(db.Model):
+def purge_in_batches(model, *criteria, batch_size=5000):
+    """Apaga em lotes (um commit por lote) as linhas que atendem aos critérios"""
+    total = 0
+    while True:
+        ids = select(model.id).where(*criteria).limit(batch_size).scalar_subquery()
+        deleted = db.session.query(model).filter(model.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        total += deleted
+        if deleted < batch_size:
+            return total
+
+class DelivererLocation(SerializerMixin, db.Model):
     __tablename__ = 'deliverer_locations'
+    __table_args__ = (
+        db.Index('ix_devloc_active', 'deliverer_id', 'is_active', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     deliverer_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -13,27 +27,38 @@ class DelivererLocation(db.Model):
     speed = db.Column(db.Float)  # Velocidade em km/h
     heading = db.Column(db.Float)  # Direção em graus
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utc_now())
     
-    # Relacionamentos
-    deliverer = db.relationship('User', backref='locations')
+    # Relacionamentos (joined: to_dict sempre usa o nome do entregador)
+    deliverer = db.relationship('User', backref='locations', lazy='joined')
+    
+    __serialize__ = (
+        'id', 'deliverer_id', 'latitude', 'longitude', 'accuracy', 'speed', 'heading', 'is_active',
+        'created_at', related('deliverer_name', 'deliverer', 'name')
+    )
+    
+    @classmethod
+    def bulk_insert(cls, rows):
+        """Insere várias localizações num único INSERT (Core, sem instanciar objetos ORM)"""
+        if rows:
+            db.session.execute(insert(cls.__table__), rows)
+    
+    @classmethod
+    def purge_older_than(cls, cutoff):
+        """Remove localizações antigas, preservando a posição ativa de cada entregador"""
+        return purge_in_batches(cls, cls.created_at < cutoff, cls.is_active == False)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'deliverer_id': self.deliverer_id,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'accuracy': self.accuracy,
-            'speed': self.speed,
-            'heading': self.heading,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'deliverer_name': self.deliverer.name if self.deliverer else None
-        }
+    @classmethod
+    def within_box(cls, latitude, longitude, radius_km):
+        """Filtro por caixa envolvente do raio (usa o índice GiST; só PostgreSQL)"""
+        center = func.earth_box(func.ll_to_earth(latitude, longitude), radius_km * 1000)
+        return center.op('@>')(func.ll_to_earth(cls.latitude, cls.longitude))
 
-class OrderTracking(db.Model):
+class OrderTracking(SerializerMixin, db.Model):
     __tablename__ = 'order_tracking'
+    __table_args__ = (
+        db.Index('ix_track_order_ts', 'order_id', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
@@ -43,26 +68,29 @@ class OrderTracking(db.Model):
     status = db.Column(db.String(50))  # 'pickup', 'in_transit', 'delivered'
     estimated_arrival = db.Column(db.DateTime)
     distance_remaining = db.Column(db.Float)  # Distância restante em km
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utc_now())
     
     # Relacionamentos
     order = db.relationship('Order', backref='tracking_points')
     deliverer = db.relationship('User', backref='tracking_history')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'order_id': self.order_id,
-            'deliverer_id': self.deliverer_id,
-            'latitude': self.latitude,
-            'longitude': self.longitude,
-            'status': self.status,
-            'estimated_arrival': self.estimated_arrival.isoformat() if self.estimated_arrival else None,
-            'distance_remaining': self.distance_remaining,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    __serialize__ = (
+        'id', 'order_id', 'deliverer_id', 'latitude', 'longitude', 'status', 'estimated_arrival',
+        'distance_remaining', 'created_at'
+    )
+    
+    @classmethod
+    def bulk_insert(cls, rows):
+        """Insere vários pontos de tracking num único INSERT (Core)"""
+        if rows:
+            db.session.execute(insert(cls.__table__), rows)
+    
+    @classmethod
+    def purge_older_than(cls, cutoff):
+        """Remove pontos de tracking antigos"""
+        return purge_in_batches(cls, cls.created_at < cutoff)
 
-class GeofenceArea(db.Model):
+class GeofenceArea(SerializerMixin, db.Model):
     __tablename__ = 'geofence_areas'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -72,17 +100,34 @@ class GeofenceArea(db.Model):
     radius = db.Column(db.Float, nullable=False)  # Raio em metros
     area_type = db.Column(db.String(50))  # 'store', 'delivery_zone', 'restricted'
     is_active = db.Column(db.Boolean, default=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utc_now())
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'center_latitude': self.center_latitude,
-            'center_longitude': self.center_longitude,
-            'radius': self.radius,
-            'area_type': self.area_type,
-            'is_active': self.is_active,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    __serialize__ = (
+        'id', 'name', 'center_latitude', 'center_longitude', 'radius', 'area_type', 'is_active',
+        'created_at'
+    )
+
+# Busca espacial no PostgreSQL com cube + earthdistance (índices GiST funcionais)
+SPATIAL_EXTENSIONS = (
+    "CREATE EXTENSION IF NOT EXISTS cube",
+    "CREATE EXTENSION IF NOT EXISTS earthdistance",
+)
+for _table in (DelivererLocation.__table__, GeofenceArea.__table__):
+    for _statement in SPATIAL_EXTENSIONS:
+        event.listen(_table, 'before_create', DDL(_statement).execute_if(dialect='postgresql'))
+
+db.Index('ix_devloc_earth',
+         func.ll_to_earth(DelivererLocation.latitude, DelivererLocation.longitude),
+         postgresql_using='gist').ddl_if(dialect='postgresql')
+db.Index('ix_geofence_earth',
+         func.ll_to_earth(GeofenceArea.center_latitude, GeofenceArea.center_longitude),
+         postgresql_using='gist').ddl_if(dialect='postgresql')
 
+# O create_all não altera tabelas existentes: em bancos anteriores à busca
+# espacial, extensões e índices são criados na inicialização (create_app)
+SPATIAL_SEARCH_DDL = SPATIAL_EXTENSIONS + (
+    "CREATE INDEX IF NOT EXISTS ix_devloc_earth ON deliverer_locations "
+    "USING gist (ll_to_earth(latitude, longitude))",
+    "CREATE INDEX IF NOT EXISTS ix_geofence_earth ON geofence_areas "
+    "USING gist (ll_to_earth(center_latitude, center_longitude))",
+)
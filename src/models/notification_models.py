@@ -1,27 +1,21 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from src.models.wendy_models import db, SerializerMixin, utc_now
 
-db = SQLAlchemy()
-
-class DeviceToken(db.Model):
+class DeviceToken(SerializerMixin, db.Model):
     __tablename__ = 'device_tokens'
+    __table_args__ = (
+        db.Index('ix_devtoken_user', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     token = db.Column(db.String(255), unique=True, nullable=False)
     device_type = db.Column(db.String(50), nullable=False) # e.g., 'android', 'ios', 'web'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utc_now())
+    updated_at = db.Column(db.DateTime, server_default=utc_now(), onupdate=utc_now())
     
     user = db.relationship('User', backref='device_tokens')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'token': self.token,
-            'device_type': self.device_type,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    __serialize__ = (
+        'id', 'user_id', 'token', 'device_type', 'created_at', 'updated_at'
+    )
 
@@ -1,10 +1,12 @@
-from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
+from sqlalchemy.sql import func
+from src.models.wendy_models import db, SerializerMixin, utc_now, related
 
-db = SQLAlchemy()
-
-class Rating(db.Model):
+class Rating(SerializerMixin, db.Model):
     __tablename__ = 'ratings'
+    __table_args__ = (
+        db.Index('ix_rating_rated', 'rated_id'),
+        db.Index('ix_rating_order', 'order_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     rater_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)  # Quem avalia
@@ -13,30 +15,21 @@ class Rating(db.Model):
     rating = db.Column(db.Integer, nullable=False)  # 1-5 estrelas
     comment = db.Column(db.Text, nullable=True)  # Comentário opcional
     rating_type = db.Column(db.String(50), nullable=False)  # 'delivery', 'service', 'product'
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, server_default=utc_now())
+    updated_at = db.Column(db.DateTime, server_default=utc_now(), onupdate=utc_now())
     
-    # Relacionamentos
-    rater = db.relationship('User', foreign_keys=[rater_id], backref='ratings_given')
-    rated = db.relationship('User', foreign_keys=[rated_id], backref='ratings_received')
+    # Relacionamentos (joined: to_dict sempre usa os nomes de rater/rated)
+    rater = db.relationship('User', foreign_keys=[rater_id], backref='ratings_given', lazy='joined')
+    rated = db.relationship('User', foreign_keys=[rated_id], backref='ratings_received', lazy='joined')
     order = db.relationship('Order', backref='ratings')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'rater_id': self.rater_id,
-            'rated_id': self.rated_id,
-            'order_id': self.order_id,
-            'rating': self.rating,
-            'comment': self.comment,
-            'rating_type': self.rating_type,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'rater_name': self.rater.name if self.rater else None,
-            'rated_name': self.rated.name if self.rated else None
-        }
+    __serialize__ = (
+        'id', 'rater_id', 'rated_id', 'order_id', 'rating', 'comment', 'rating_type', 'created_at',
+        'updated_at', related('rater_name', 'rater', 'name'),
+        related('rated_name', 'rated', 'name')
+    )
 
-class UserRatingStats(db.Model):
+class UserRatingStats(SerializerMixin, db.Model):
     __tablename__ = 'user_rating_stats'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -48,51 +41,54 @@ class UserRatingStats(db.Model):
     three_star_count = db.Column(db.Integer, default=0)
     two_star_count = db.Column(db.Integer, default=0)
     one_star_count = db.Column(db.Integer, default=0)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, server_default=utc_now(), onupdate=utc_now())
     
     # Relacionamento
     user = db.relationship('User', backref='rating_stats')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'total_ratings': self.total_ratings,
-            'average_rating': round(self.average_rating, 1),
-            'five_star_count': self.five_star_count,
-            'four_star_count': self.four_star_count,
-            'three_star_count': self.three_star_count,
-            'two_star_count': self.two_star_count,
-            'one_star_count': self.one_star_count,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    STAR_COLUMNS = {1: 'one_star_count', 2: 'two_star_count', 3: 'three_star_count',
+                    4: 'four_star_count', 5: 'five_star_count'}
+    
+    __serialize__ = (
+        'id', 'user_id', 'total_ratings', 'five_star_count', 'four_star_count', 'three_star_count',
+        'two_star_count', 'one_star_count', 'updated_at',
+        ('average_rating', 'round(self.average_rating, 1)')
+    )
+    
+    @classmethod
+    def apply_new_rating(cls, rated_id, stars):
+        """Soma uma nova avaliação às estatísticas com um único UPDATE, sem reagregar o histórico"""
+        star_column = getattr(cls, cls.STAR_COLUMNS[stars])
+        updated = db.session.query(cls).filter_by(user_id=rated_id).update({
+            cls.average_rating: (cls.average_rating * cls.total_ratings + stars) / (cls.total_ratings + 1),
+            cls.total_ratings: cls.total_ratings + 1,
+            star_column: star_column + 1
+        }, synchronize_session=False)
+        
+        if not updated:
+            # Primeira avaliação do usuário: cria a linha a partir do histórico
+            stats = cls(user_id=rated_id)
+            db.session.add(stats)
+            stats.update_stats()
     
     def update_stats(self):
-        """Atualiza as estatísticas baseado nas avaliações recebidas"""
-        ratings = Rating.query.filter_by(rated_id=self.user_id).all()
+        """Recalcula as estatísticas a partir de todas as avaliações (reparo)"""
+        # Uma única agregação no banco: no máximo 5 linhas (uma por nota)
+        rows = db.session.query(Rating.rating, func.count(Rating.id)).filter(
+            Rating.rated_id == self.user_id
+        ).group_by(Rating.rating).all()
+        star_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+        star_counts.update(dict(rows))
         
-        if not ratings:
-            self.total_ratings = 0
+        self.total_ratings = sum(star_counts.values())
+        if self.total_ratings:
+            total_score = sum(stars * count for stars, count in star_counts.items())
+            self.average_rating = total_score / self.total_ratings
+        else:
             self.average_rating = 0.0
-            self.five_star_count = 0
-            self.four_star_count = 0
-            self.three_star_count = 0
-            self.two_star_count = 0
-            self.one_star_count = 0
-            return
-        
-        self.total_ratings = len(ratings)
-        total_score = sum(rating.rating for rating in ratings)
-        self.average_rating = total_score / self.total_ratings
-        
-        # Contar por estrelas
-        star_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for rating in ratings:
-            star_counts[rating.rating] += 1
         
         self.one_star_count = star_counts[1]
         self.two_star_count = star_counts[2]
         self.three_star_count = star_counts[3]
         self.four_star_count = star_counts[4]
         self.five_star_count = star_counts[5]
-
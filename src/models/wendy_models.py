@@ -1,49 +1,362 @@
+from flask import current_app, g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+import time
+from collections import namedtuple
+from dataclasses import field, make_dataclass
+from cachetools import TTLCache
+from sqlalchemy import DDL, case, column, event, exists, func, insert, inspect, or_, select, table, union
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session, defer, joinedload, selectinload, raiseload
+from sqlalchemy.sql.expression import FunctionElement
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
-class User(db.Model):
+# Números de pedido gerados pelo banco no próprio INSERT (8 dígitos, sem
+# colidir com os números aleatórios de 6 dígitos já existentes)
+order_number_seq = db.Sequence('order_number_seq', metadata=db.metadata)
+
+class next_order_number(FunctionElement):
+    """Próximo número de pedido, compilado conforme o dialeto"""
+    type = db.String()
+    inherit_cache = True
+
+@compiles(next_order_number, 'postgresql')
+def _next_order_number_postgresql(element, compiler, **kw):
+    return compiler.process(func.to_char(order_number_seq.next_value(), 'FM00000000'), **kw)
+
+@compiles(next_order_number)
+def _next_order_number_default(element, compiler, **kw):
+    # SQLite (desenvolvimento) não tem sequences: próximo id da tabela, com 8 dígitos
+    orders = table('orders', column('id'))
+    return compiler.process(
+        func.printf('%08d', select(func.coalesce(func.max(orders.c.id), 0) + 1).scalar_subquery()), **kw
+    )
+
+class utc_now(FunctionElement):
+    """Instante atual em UTC para colunas timestamp sem fuso (comparadas com datetime.utcnow())"""
+    type = db.DateTime()
+    inherit_cache = True
+
+@compiles(utc_now, 'postgresql')
+def _utc_now_postgresql(element, compiler, **kw):
+    # now() segue o fuso da sessão; mesmo padrão do trigger set_updated_at
+    return compiler.process(func.timezone('utc', func.now()), **kw)
+
+@compiles(utc_now)
+def _utc_now_default(element, compiler, **kw):
+    # No SQLite o CURRENT_TIMESTAMP já é UTC
+    return 'CURRENT_TIMESTAMP'
+
+# Valores monetários: NUMERIC(12,2) exato no banco; asdecimal=False mantém
+# float no Python (mesma API/JSON), sem o custo do Decimal por operação
+Money = db.Numeric(12, 2, asdecimal=False)
+
+# Domínios de status como ENUM nativo no PostgreSQL: 4 bytes por valor
+# (linhas e índices menores) e valores inválidos rejeitados pelo banco
+USER_TYPE = db.Enum('client', 'store', 'deliverer', 'admin', name='user_type', metadata=db.metadata)
+APPROVAL_STATUS = db.Enum('pending', 'approved', 'rejected', name='approval_status', metadata=db.metadata)
+ORDER_STATUS = db.Enum(
+    'pending', 'accepted', 'preparing', 'ready', 'delivering', 'delivered', 'cancelled',
+    name='order_status', metadata=db.metadata
+)
+PAYMENT_STATUS = db.Enum('pending', 'paid', 'failed', name='payment_status', metadata=db.metadata)
+VEHICLE_TYPE = db.Enum('motorcycle', 'bicycle', 'car', name='vehicle_type', metadata=db.metadata)
+DELIVERY_REQUEST_STATUS = db.Enum(
+    'pending', 'accepted', 'picked_up', 'delivered', 'cancelled',
+    name='delivery_request_status', metadata=db.metadata
+)
+
+def serialize_list(query, options):
+    """Serializa uma listagem com os relacionamentos já carregados.
+
+    raiseload('*') faz qualquer relacionamento esquecido nas opções falhar
+    em vez de disparar uma query por linha (N+1).
+    """
+    return [obj.to_dict() for obj in query.options(*options, raiseload('*')).all()]
+
+def raise_on_lazy_sql(execute_state):
+    """Acrescenta raiseload('*', sql_only=True) a todo SELECT de entidades.
+
+    Relacionamento não carregado explicitamente passa a lançar exceção
+    em vez de disparar uma query (N+1); opções explícitas têm precedência.
+    """
+    if execute_state.is_select and not execute_state.is_column_load and not execute_state.is_relationship_load:
+        execute_state.statement = execute_state.statement.options(raiseload('*', sql_only=True))
+
+def enable_strict_loading():
+    """Liga o modo estrito (CI/testes): lazy loads com SQL viram erro"""
+    if not event.contains(Session, 'do_orm_execute', raise_on_lazy_sql):
+        event.listen(Session, 'do_orm_execute', raise_on_lazy_sql)
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite (desenvolvimento local): mmap de 256 MB e 8 MB de cache de páginas por conexão"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.execute('PRAGMA cache_size=-8192')
+    cursor.close()
+
+def listing_options(model):
+    """default_loader_options do modelo para listagens.
+
+    Em debug (ou com DB_STRICT_LOADING) acrescenta raiseload('*'): um
+    relacionamento novo no to_dict sem eager load falha no desenvolvimento
+    em vez de virar N+1 silencioso em produção.
+    """
+    options = model.default_loader_options()
+    if has_app_context() and (current_app.debug or current_app.config.get('DB_STRICT_LOADING')):
+        options += (raiseload('*'),)
+    return options
+
+def count_rows(model, *criteria):
+    """SELECT COUNT(*) direto na tabela, sem o subquery com todas as colunas
+    do Query.count() e sem autoflush (contagens são só leitura)"""
+    with db.session.no_autoflush:
+        return db.session.scalar(select(func.count()).select_from(model).where(*criteria))
+
+def count_where(condition):
+    """COUNT condicional: SUM(CASE WHEN condição THEN 1 ELSE 0 END)"""
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+def sum_where(condition, column):
+    """SUM condicional da coluna; 0 quando nenhuma linha atende"""
+    return func.coalesce(func.sum(case((condition, column))), 0)
+
+def row_exists(model, *criteria):
+    """SELECT EXISTS(...): para na primeira linha encontrada, ao contrário do COUNT(*)"""
+    with db.session.no_autoflush:
+        return db.session.scalar(select(exists().select_from(model).where(*criteria)))
+
+Page = namedtuple('Page', 'items total pages')
+
+def _page(rows, query, page, per_page, items):
+    """Monta a Page com o total do COUNT(*) OVER() (última coluna de cada linha)"""
+    if rows:
+        total = rows[0][-1]
+    else:
+        # Página além do fim: nenhuma linha traz o total
+        total = query.order_by(None).count() if page > 1 else 0
+    pages = -(-total // per_page) if per_page > 0 else 0
+    return Page(items, total, pages)
+
+def paginate_with_total(query, page, per_page):
+    """Paginação com o total na mesma query (COUNT(*) OVER()), sem o SELECT COUNT do paginate()"""
+    page = max(page, 1)
+    rows = query.add_columns(func.count().over().label('_total')).limit(per_page).offset(
+        (page - 1) * per_page
+    ).all()
+    return _page(rows, query, page, per_page, [row[0] for row in rows])
+
+def core_page(query, row_cls, page, per_page):
+    """paginate_with_total via Core: a página vem como DTOs, sem entidades ORM"""
+    page = max(page, 1)
+    stmt = query.with_entities(*row_cls.columns, func.count().over()).limit(per_page).offset(
+        (page - 1) * per_page
+    ).statement
+    rows = db.session.execute(stmt).all()
+    return _page(rows, query, page, per_page, [row_cls(*row[:-1]) for row in rows])
+
+def row_class(model, extra_fields=(), columns=None):
+    """DTO com __slots__ para as core_columns do modelo (ou as colunas dadas).
+
+    O orjson serializa dataclasses nativamente, então as listas de DTOs
+    vão direto para o jsonify, sem to_dict.
+    """
+    columns = columns or model.core_columns()
+    fields = [column.key for column in columns] + list(extra_fields)
+    row_cls = make_dataclass(f'{model.__name__}Row', fields, slots=True)
+    row_cls.columns = columns
+    return row_cls
+
+def core_rows(query, row_cls):
+    """Lista via Core, sem instanciar entidades ORM.
+
+    Reaproveita os filtros/ordenação da query, seleciona só as colunas do
+    DTO e o constrói por posição; yield_per limita a memória do cursor.
+    """
+    stmt = query.with_entities(*row_cls.columns).statement.execution_options(yield_per=1000)
+    return [row_cls(*row) for row in db.session.execute(stmt)]
+
+def name_of(model, fk):
+    """Subquery correlata com o nome do registro referenciado (dispensa JOIN/alias)"""
+    return select(model.name).where(model.id == fk).scalar_subquery()
+
+def related(key, relationship, attr):
+    """Atributo de um relacionamento many-to-one, preservando None"""
+    return (key, f'(_r.{attr} if (_r := self.{relationship}) is not None else None)')
+
+def build_to_dict(name, fields):
+    """Compila um to_dict em linha reta: um único literal de dict, sem laço por campo"""
+    entries = []
+    for spec in fields:
+        key, expr = spec if isinstance(spec, tuple) else (spec, f'self.{spec}')
+        entries.append(f'{key!r}: {expr}')
+    source = 'def to_dict(self):\n    return {' + ', '.join(entries) + '}\n'
+    namespace = {}
+    # Globais do módulo: as expressões podem chamar helpers como category_name
+    exec(compile(source, f'<{name}.to_dict>', 'exec'), globals(), namespace)
+    return namespace['to_dict']
+
+class SerializerMixin:
+    """Gera to_dict a partir de __serialize__ na criação da classe.
+
+    Cada item é o nome de um atributo ou um par (chave, expressão sobre self).
+    A função gerada fica também em _serialize, para quem define o próprio to_dict.
+    Colunas longas listadas em __summary_exclude__ ficam fora de to_dict_summary
+    e são adiadas (defer) por summary_options() nas listagens.
+    """
+    __serialize__ = ()
+    __summary_exclude__ = ()
+    
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = cls.__dict__.get('__serialize__')
+        if fields:
+            cls._serialize = build_to_dict(cls.__name__, fields)
+            if 'to_dict' not in cls.__dict__:
+                cls.to_dict = cls._serialize
+            exclude = cls.__dict__.get('__summary_exclude__')
+            if exclude:
+                summary = [f for f in fields if (f[0] if isinstance(f, tuple) else f) not in exclude]
+                cls.to_dict_summary = build_to_dict(cls.__name__, summary)
+    
+    @classmethod
+    def summary_options(cls):
+        # raiseload: um acesso esquecido à coluna adiada falha em vez de virar N+1
+        return tuple(defer(getattr(cls, name), raiseload=True) for name in cls.__summary_exclude__)
+
+class User(SerializerMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        db.Index('ix_users_type_approval', 'user_type', 'approval_status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     phone = db.Column(db.String(20))
-    user_type = db.Column(db.String(20), nullable=False)  # 'client', 'store', 'deliverer', 'admin'
+    user_type = db.Column(USER_TYPE, nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     is_approved = db.Column(db.Boolean, default=True)  # Clientes são aprovados automaticamente
-    approval_status = db.Column(db.String(20), default='approved')  # 'pending', 'approved', 'rejected'
+    approval_status = db.Column(APPROVAL_STATUS, default='approved')
     rejection_reason = db.Column(db.Text)  # Motivo da rejeição, se aplicável
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    @classmethod
+    def core_columns(cls):
+        return (
+            cls.id, cls.email, cls.name, cls.phone, cls.user_type, cls.is_active,
+            cls.is_approved, cls.approval_status, cls.rejection_reason, cls.created_at
+        )
+    
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
     
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        if not has_app_context():
+            return check_password_hash(self.password_hash, password)
+        # Memoizado por requisição (flask.g): o PBKDF2 custa dezenas de ms de CPU
+        checks = g.setdefault('password_checks', {})
+        key = (self.password_hash, password)
+        if key not in checks:
+            checks[key] = check_password_hash(self.password_hash, password)
+        return checks[key]
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'email': self.email,
-            'name': self.name,
-            'phone': self.phone,
-            'user_type': self.user_type,
-            'is_active': self.is_active,
-            'is_approved': self.is_approved,
-            'approval_status': self.approval_status,
-            'rejection_reason': self.rejection_reason,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
-
-class Store(db.Model):
+    @classmethod
+    def approval_columns(cls):
+        """Colunas alteradas na aprovação/rejeição/reativação de lojas e entregadores"""
+        return (cls.is_active, cls.is_approved, cls.approval_status, cls.rejection_reason)
+    
+    @classmethod
+    def get_cached(cls, user_id):
+        """Busca por id memoizada em flask.g, descartada ao fim da requisição"""
+        cache = g.setdefault('user_cache', {})
+        key = str(user_id)
+        if key not in cache:
+            cache[key] = db.session.get(cls, user_id)
+        return cache[key]
+    
+    @classmethod
+    def cached_type(cls, user_id):
+        """user_type pelo id, em cache entre requisições (None se o usuário não existe)"""
+        key = str(user_id)
+        if key not in _user_types:
+            _user_types[key] = db.session.scalar(select(cls.user_type).where(cls.id == user_id))
+        return _user_types[key]
+
+    @classmethod
+    def deletion_dependencies(cls, user_id, user_type):
+        """Loja, perfil de entregador e contagens exibidos antes da exclusão,
+        num único SELECT (LEFT JOIN no perfil e contagens em subqueries correlatas)"""
+        stmt = select(cls.id).where(cls.id == user_id)
+        if user_type == 'store_owner':
+            stmt = stmt.outerjoin(Store, Store.user_id == cls.id).add_columns(
+                Store.id.label('store_id'), Store.name.label('store_name'),
+                select(func.count()).where(Product.store_id == Store.id).scalar_subquery().label('products_count'),
+                select(func.count()).where(Order.store_id == Store.id).scalar_subquery().label('orders_count'),
+            )
+        elif user_type == 'deliverer':
+            stmt = stmt.outerjoin(Deliverer, Deliverer.user_id == cls.id).add_columns(
+                Deliverer.id.label('deliverer_id'), Deliverer.rating,
+                select(func.count()).where(Order.deliverer_id == cls.id).scalar_subquery().label('deliveries_count'),
+            )
+        elif user_type == 'client':
+            stmt = stmt.add_columns(
+                select(func.count()).where(Order.client_id == cls.id).scalar_subquery().label('orders_count'),
+            )
+        row = db.session.execute(stmt.limit(1)).one()
+
+        if user_type == 'store_owner':
+            if row.store_id is None:
+                return {}
+            return {'store': {
+                'id': row.store_id,
+                'name': row.store_name,
+                'products_count': row.products_count,
+                'orders_count': row.orders_count
+            }}
+        if user_type == 'deliverer':
+            if row.deliverer_id is None:
+                return {}
+            return {'deliverer': {
+                'id': row.deliverer_id,
+                'deliveries_count': row.deliveries_count,
+                'rating': row.rating
+            }}
+        if user_type == 'client':
+            return {'client': {'orders_count': row.orders_count}}
+        return {}
+
+    __serialize__ = (
+        'id', 'email', 'name', 'phone', 'user_type', 'is_active', 'is_approved', 'approval_status',
+        'rejection_reason', 'created_at'
+    )
+
+# Cache em memória (por processo) de user_id -> user_type para as checagens de
+# admin (usuário excluído fica como None). Invalidado nos commits deste processo
+# (ver clear_stale_caches); o TTL limita a defasagem de alterações feitas por outro worker.
+USER_TYPE_CACHE_TTL = 60
+_user_types = TTLCache(maxsize=512, ttl=USER_TYPE_CACHE_TTL)
+
+class Store(SerializerMixin, db.Model):
     __tablename__ = 'stores'
+    __table_args__ = (
+        db.Index('ix_stores_city_active', 'city', 'is_active'),
+        db.Index('ix_stores_user', 'user_id'),
+        # Filas do admin: aprovação/ativa, mais recentes primeiro
+        db.Index('ix_stores_approved_active_created', 'is_approved', 'is_active', 'created_at'),
+        # Parcial: lojas privilegiadas entre as aprovadas e ativas (gestão de privilégio e busca)
+        db.Index(
+            'ix_stores_privileged_active', 'is_privileged',
+            postgresql_where=db.text('is_approved AND is_active')
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
@@ -54,47 +367,105 @@ class Store(db.Model):
     state = db.Column(db.String(50))
     zip_code = db.Column(db.String(10))
     is_approved = db.Column(db.Boolean, default=False)
-    approval_status = db.Column(db.String(20), default='pending')  # 'pending', 'approved', 'rejected'
+    approval_status = db.Column(APPROVAL_STATUS, default='pending')
     rejection_reason = db.Column(db.Text)  # Motivo da rejeição, se aplicável
     is_active = db.Column(db.Boolean, default=True)
-    minimum_order_value = db.Column(db.Float)  # Valor mínimo personalizado (se permitido)
-    custom_delivery_fee_per_km = db.Column(db.Float)  # Taxa personalizada (se permitido)
+    minimum_order_value = db.Column(Money)  # Valor mínimo personalizado (se permitido)
+    custom_delivery_fee_per_km = db.Column(Money)  # Taxa personalizada (se permitido)
     uses_platform_defaults = db.Column(db.Boolean, default=True)  # Usar configurações da plataforma
     is_privileged = db.Column(db.Boolean, default=False)  # Privilégio na busca de produtos
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relacionamentos
-    user = db.relationship('User', backref='store')
-    products = db.relationship('Product', backref='store', lazy=True)
+    # Exclusões em cascata feitas pelo banco (ON DELETE): o ORM não carrega os filhos
+    user = db.relationship('User', backref=db.backref('store', cascade='all, delete-orphan', passive_deletes=True))
+    products = db.relationship('Product', backref='store', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'name': self.name,
-            'description': self.description,
-            'category': self.category,
-            'cnpj': self.cnpj,
-            'address': self.address,
-            'city': self.city,
-            'state': self.state,
-            'zip_code': self.zip_code,
-            'is_approved': self.is_approved,
-            'approval_status': self.approval_status,
-            'rejection_reason': self.rejection_reason,
-            'is_active': self.is_active,
-            'is_privileged': self.is_privileged,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
-
-class Product(db.Model):
+    @classmethod
+    def default_loader_options(cls):
+        # selectin (e não joined): um IN com os ids da página, sem afetar o LIMIT do paginate
+        return (selectinload(cls.user),)
+    
+    @classmethod
+    def get_for_approval(cls, store_id):
+        """Loja e dono num único SELECT com JOIN; do dono, só as colunas de aprovação"""
+        return db.session.get(cls, store_id, options=[joinedload(cls.user).load_only(*User.approval_columns())])
+    
+    @classmethod
+    def core_columns(cls):
+        return (
+            cls.id, cls.user_id, cls.name, cls.description, cls.category, cls.cnpj,
+            cls.address, cls.city, cls.state, cls.zip_code, cls.is_approved,
+            cls.approval_status, cls.rejection_reason, cls.is_active, cls.is_privileged,
+            cls.created_at, cls.category_id
+        )
+    
+    @classmethod
+    def core_rows(cls, query):
+        return resolve_categories(core_rows(query, ROW_CLASSES[cls]))
+    
+    @classmethod
+    def admin_columns(cls, summary=False):
+        """core_columns com nome/email do dono; summary=True tira as colunas longas"""
+        columns = cls.core_columns() + (
+            name_of(User, cls.user_id).label('owner_name'),
+            select(User.email).where(User.id == cls.user_id).scalar_subquery().label('owner_email'),
+        )
+        if summary:
+            columns = tuple(column for column in columns if column.key not in cls.__summary_exclude__)
+        return columns
+    
+    @classmethod
+    def privilege_columns(cls, order_stats=False):
+        """core_columns com dono e contagens em subqueries correlatas: a lista
+        inteira sai num único SELECT (sem uma query por loja)"""
+        columns = cls.core_columns() + (
+            name_of(User, cls.user_id).label('user_name'),
+            select(User.email).where(User.id == cls.user_id).scalar_subquery().label('user_email'),
+            select(func.count()).where(
+                Product.store_id == cls.id, Product.is_active == True
+            ).scalar_subquery().label('products_count'),
+        )
+        if order_stats:
+            columns += (
+                select(func.count()).where(Order.store_id == cls.id).scalar_subquery().label('total_orders'),
+                select(func.count()).where(
+                    Order.store_id == cls.id, Order.status == 'delivered'
+                ).scalar_subquery().label('delivered_orders'),
+            )
+        return columns
+    
+    @classmethod
+    def privilege_rows(cls, query, order_stats=False):
+        """Lojas da gestão de privilégio como DTOs (dono, produtos ativos e, opcionalmente, pedidos)"""
+        return resolve_categories(core_rows(query, PRIVILEGE_STORE_ROWS[order_stats]))
+    
+    @classmethod
+    def admin_page(cls, query, page, per_page, summary=False):
+        """Página da listagem do admin via Core (DTOs, sem entidades ORM)"""
+        result = core_page(query, ADMIN_STORE_ROWS[summary], page, per_page)
+        resolve_categories(result.items)
+        return result
+    
+    __serialize__ = (
+        'id', 'user_id', 'name', 'description',
+        ('category', 'category_name(self.category_id, self.category)'), 'category_id', 'cnpj',
+        'address', 'city', 'state', 'zip_code', 'is_approved', 'approval_status',
+        'rejection_reason', 'is_active', 'is_privileged', 'created_at'
+    )
+    __summary_exclude__ = ('description', 'rejection_reason')
+
+class Product(SerializerMixin, db.Model):
     __tablename__ = 'products'
+    __table_args__ = (
+        db.Index('ix_products_store_active', 'store_id', 'is_active'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    store_id = db.Column(db.Integer, db.ForeignKey('stores.id'), nullable=False)
+    store_id = db.Column(db.Integer, db.ForeignKey('stores.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    price = db.Column(db.Float, nullable=False)
+    price = db.Column(Money, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'))
     subcategory_id = db.Column(db.Integer, db.ForeignKey('subcategories.id'))
     category = db.Column(db.String(50))  # Manter por compatibilidade
@@ -103,136 +474,306 @@ class Product(db.Model):
     image_url = db.Column(db.String(255))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'store_id': self.store_id,
-            'store_name': self.store.name if self.store else None,
-            'name': self.name,
-            'description': self.description,
-            'price': self.price,
-            'category': self.category,
-            'stock_quantity': self.stock_quantity,
-            'is_active': self.is_active,
-            'image_url': self.image_url,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
-
-class Order(db.Model):
+    @classmethod
+    def default_loader_options(cls):
+        return (joinedload(cls.store),)
+    
+    @classmethod
+    def core_columns(cls):
+        return (
+            cls.id, cls.store_id, name_of(Store, cls.store_id).label('store_name'),
+            cls.name, cls.description, cls.price, cls.category, cls.stock_quantity,
+            cls.is_active, cls.image_url, cls.created_at, cls.category_id
+        )
+    
+    @classmethod
+    def core_rows(cls, query):
+        return resolve_categories(core_rows(query, ROW_CLASSES[cls]))
+    
+    __serialize__ = (
+        'id', 'store_id', related('store_name', 'store', 'name'), 'name', 'description', 'price',
+        ('category', 'category_name(self.category_id, self.category)'), 'category_id',
+        'stock_quantity', 'is_active', 'image_url', 'created_at'
+    )
+    __summary_exclude__ = ('description',)
+
+class Order(SerializerMixin, db.Model):
     __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_store_status_created', 'store_id', 'status', 'created_at'),
+        db.Index('ix_orders_client_created', 'client_id', 'created_at'),
+        # Pedidos ativos do cliente (checagem antes de excluir usuários)
+        db.Index('ix_orders_client_status', 'client_id', 'status'),
+        db.Index('ix_orders_deliverer_updated', 'deliverer_id', 'updated_at'),
+        db.Index('ix_orders_deliverer_status', 'deliverer_id', 'status'),
+        # Dashboard/relatórios: receita por status e período; pedidos parados
+        # (status = X AND updated_at <= T) viram range scan neste índice
+        db.Index('ix_orders_status_updated', 'status', 'updated_at'),
+    )
+    # order_number volta no RETURNING do INSERT
+    __mapper_args__ = {'eager_defaults': True}
     
     id = db.Column(db.Integer, primary_key=True)
-    client_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # Cliente excluído: o pedido fica no histórico, com o client_name preservado
+    client_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
     store_id = db.Column(db.Integer, db.ForeignKey('stores.id'), nullable=False)
-    deliverer_id = db.Column(db.Integer, db.ForeignKey('users.id'))
-    order_number = db.Column(db.String(20), unique=True, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, accepted, preparing, ready, delivering, delivered, cancelled
-    total_amount = db.Column(db.Float, nullable=False)
-    delivery_fee = db.Column(db.Float, default=5.0)
+    deliverer_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='SET NULL'))
+    order_number = db.Column(
+        db.String(20), unique=True, nullable=False,
+        default=next_order_number()
+    )
+    status = db.Column(ORDER_STATUS, default='pending', index=True)
+    total_amount = db.Column(Money, nullable=False)
+    delivery_fee = db.Column(Money, default=5.0)
     payment_method = db.Column(db.String(20))  # pix, card, cash
-    payment_status = db.Column(db.String(20), default='pending')  # pending, paid, failed
+    payment_status = db.Column(PAYMENT_STATUS, default='pending', index=True)
     delivery_address = db.Column(db.String(255))
     delivery_city = db.Column(db.String(100))
     delivery_state = db.Column(db.String(50))
     delivery_zip_code = db.Column(db.String(10))
     notes = db.Column(db.Text)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    # onupdate no SQL para os demais dialetos (SQLite); no PostgreSQL o trigger também o mantém
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=utc_now())
+    # Nomes para exibição (desnormalizados): preenchidos e propagados por
+    # triggers no PostgreSQL, lidos de volta via RETURNING
+    client_name = db.Column(db.String(100), server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
+    store_name = db.Column(db.String(100), server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
+    deliverer_name = db.Column(db.String(100), server_default=db.FetchedValue(), server_onupdate=db.FetchedValue())
     
     # Relacionamentos
-    client = db.relationship('User', foreign_keys=[client_id], backref='client_orders')
-    deliverer = db.relationship('User', foreign_keys=[deliverer_id], backref='deliverer_orders')
+    # passive_deletes='all': o SET NULL (e a devolução à fila, via trigger) fica com o banco
+    client = db.relationship(
+        'User', foreign_keys=[client_id], backref=db.backref('client_orders', passive_deletes='all')
+    )
+    deliverer = db.relationship(
+        'User', foreign_keys=[deliverer_id], backref=db.backref('deliverer_orders', passive_deletes='all')
+    )
     store_rel = db.relationship('Store', backref='orders')
-    items = db.relationship('OrderItem', backref='order', lazy=True)
+    items = db.relationship('OrderItem', backref='order', lazy='selectin')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'client_id': self.client_id,
-            'store_id': self.store_id,
-            'deliverer_id': self.deliverer_id,
-            'order_number': self.order_number,
-            'status': self.status,
-            'total_amount': self.total_amount,
-            'delivery_fee': self.delivery_fee,
-            'payment_method': self.payment_method,
-            'payment_status': self.payment_status,
-            'delivery_address': self.delivery_address,
-            'delivery_city': self.delivery_city,
-            'delivery_state': self.delivery_state,
-            'delivery_zip_code': self.delivery_zip_code,
-            'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'client_name': self.client.name if self.client else None,
-            'store_name': self.store_rel.name if self.store_rel else None,
-            'deliverer_name': self.deliverer.name if self.deliverer else None,
-            'items': [item.to_dict() for item in self.items]
-        }
-
-class OrderItem(db.Model):
+    @classmethod
+    def default_loader_options(cls):
+        return (selectinload(cls.items).joinedload(OrderItem.product),)
+    
+    @classmethod
+    def core_columns(cls):
+        return (
+            cls.id, cls.client_id, cls.store_id, cls.deliverer_id, cls.order_number,
+            cls.status, cls.total_amount, cls.delivery_fee, cls.payment_method,
+            cls.payment_status, cls.delivery_address, cls.delivery_city,
+            cls.delivery_state, cls.delivery_zip_code, cls.notes, cls.created_at,
+            cls.updated_at, cls.client_name, cls.store_name, cls.deliverer_name
+        )
+    
+    @classmethod
+    def involving(cls, user_id):
+        """Pedidos em que o usuário é cliente, entregador ou dono da loja"""
+        return or_(
+            cls.client_id == user_id,
+            cls.deliverer_id == user_id,
+            cls.store_id.in_(select(Store.id).where(Store.user_id == user_id))
+        )
+
+    @classmethod
+    def count_by_user(cls, user_ids, *criteria):
+        """{user_id: pedidos} de vários usuários numa única query, somando os papéis
+        de cliente, entregador e dono da loja (UNION descarta pedidos repetidos)"""
+        involvement = union(
+            select(cls.client_id.label('user_id'), cls.id).where(cls.client_id.in_(user_ids), *criteria),
+            select(cls.deliverer_id, cls.id).where(cls.deliverer_id.in_(user_ids), *criteria),
+            select(Store.user_id, cls.id).join(Store, Store.id == cls.store_id).where(
+                Store.user_id.in_(user_ids), *criteria
+            ),
+        ).subquery()
+        return dict(db.session.execute(
+            select(involvement.c.user_id, func.count()).group_by(involvement.c.user_id)
+        ).all())
+
+    @classmethod
+    def core_rows(cls, query):
+        """Pedidos via Core com os itens de todos eles buscados em uma única query"""
+        return cls.attach_items(core_rows(query, ROW_CLASSES[cls]))
+    
+    @classmethod
+    def core_page(cls, query, page, per_page):
+        """core_rows paginado, com o total na mesma query"""
+        result = core_page(query, ROW_CLASSES[cls], page, per_page)
+        cls.attach_items(result.items)
+        return result
+    
+    @staticmethod
+    def attach_items(orders):
+        """Preenche os itens dos DTOs de pedido com uma única query IN"""
+        if orders:
+            items_by_order = {order.id: order.items for order in orders}
+            items = core_rows(
+                OrderItem.query.filter(OrderItem.order_id.in_(list(items_by_order))),
+                ROW_CLASSES[OrderItem]
+            )
+            for item in items:
+                items_by_order[item.order_id].append(item)
+        return orders
+    
+    _COLUMN_FIELDS = (
+        'id', 'client_id', 'store_id', 'deliverer_id', 'order_number', 'status', 'total_amount',
+        'delivery_fee', 'payment_method', 'payment_status', 'delivery_address', 'delivery_city',
+        'delivery_state', 'delivery_zip_code', 'notes', 'created_at', 'updated_at',
+        'client_name', 'store_name', 'deliverer_name'
+    )
+    __serialize__ = _COLUMN_FIELDS + (('items', '[item.to_dict() for item in self.items]'),)
+    _columns_dict = staticmethod(build_to_dict('Order', _COLUMN_FIELDS))
+    
+    @classmethod
+    def updated_date(cls):
+        """updated_at::date, a mesma expressão do índice ix_orders_delivered_date"""
+        return db.cast(cls.updated_at, db.Date)
+    
+    @classmethod
+    def get_without_notes(cls, order_id):
+        """Pedido sem carregar o notes (o histórico pode ser grande)"""
+        return db.session.get(cls, order_id, options=[defer(cls.notes)])
+    
+    @classmethod
+    def notes_appended(cls, entry):
+        """Expressão que acrescenta a entrada ao notes (separada por linha em branco)
+        no próprio UPDATE, sem ler nem reenviar o texto atual"""
+        return func.coalesce(func.nullif(cls.notes, '', type_=db.Text) + '\n\n' + entry, entry)
+    
+    @classmethod
+    def for_listing(cls, query):
+        """Carrega os itens em uma query IN e proíbe qualquer outro lazy load"""
+        return query.options(selectinload(cls.items).raiseload(OrderItem.product), raiseload('*'))
+    
+    @classmethod
+    def to_dict_bulk(cls, orders):
+        """Serializa pedidos de for_listing; os nomes de produto vêm de uma única query IN"""
+        orders = list(orders)
+        product_names = OrderItem.product_names([item for order in orders for item in order.items])
+        result = []
+        for order in orders:
+            data = cls._columns_dict(order)
+            data['items'] = OrderItem.to_dict_bulk(order.items, product_names)
+            result.append(data)
+        return result
+
+# Receita diária: índice parcial de expressão, só com os pedidos entregues
+db.Index('ix_orders_delivered_date', Order.updated_date(), postgresql_where=db.text("status = 'delivered'"))
+
+class OrderItem(SerializerMixin, db.Model):
     __tablename__ = 'order_items'
+    __table_args__ = (
+        db.Index('ix_order_items_order', 'order_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('orders.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    unit_price = db.Column(db.Float, nullable=False)
-    total_price = db.Column(db.Float, nullable=False)
+    unit_price = db.Column(Money, nullable=False)
+    total_price = db.Column(Money, nullable=False)
     
     # Relacionamentos
-    product = db.relationship('Product', backref='order_items')
+    product = db.relationship('Product', backref='order_items', lazy='joined')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'order_id': self.order_id,
-            'product_id': self.product_id,
-            'quantity': self.quantity,
-            'unit_price': self.unit_price,
-            'total_price': self.total_price,
-            'product_name': self.product.name if self.product else None
-        }
-
-class Deliverer(db.Model):
+    @classmethod
+    def default_loader_options(cls):
+        return (joinedload(cls.product),)
+    
+    @classmethod
+    def core_columns(cls):
+        return (
+            cls.id, cls.order_id, cls.product_id, cls.quantity, cls.unit_price,
+            cls.total_price, name_of(Product, cls.product_id).label('product_name')
+        )
+    
+    _COLUMN_FIELDS = ('id', 'order_id', 'product_id', 'quantity', 'unit_price', 'total_price')
+    __serialize__ = _COLUMN_FIELDS + (related('product_name', 'product', 'name'),)
+    _columns_dict = staticmethod(build_to_dict('OrderItem', _COLUMN_FIELDS))
+    
+    @classmethod
+    def bulk_create(cls, order_id, items):
+        """Insere todos os itens do pedido num único INSERT multi-VALUES (Core)"""
+        if items:
+            db.session.execute(insert(cls.__table__), [
+                {
+                    'order_id': order_id,
+                    'product_id': item['product'].id,
+                    'quantity': item['quantity'],
+                    'unit_price': item['unit_price'],
+                    'total_price': item['total_price']
+                }
+                for item in items
+            ])
+    
+    @staticmethod
+    def product_names(items):
+        """Mapa {product_id: nome} para os itens, em uma única query"""
+        product_ids = {item.product_id for item in items}
+        if not product_ids:
+            return {}
+        return dict(db.session.query(Product.id, Product.name).filter(Product.id.in_(product_ids)).all())
+    
+    @classmethod
+    def to_dict_bulk(cls, items, product_names):
+        """Serializa itens usando o mapa de nomes, sem acessar o relacionamento product"""
+        result = []
+        for item in items:
+            data = cls._columns_dict(item)
+            data['product_name'] = product_names.get(item.product_id)
+            result.append(data)
+        return result
+
+class Deliverer(SerializerMixin, db.Model):
     __tablename__ = 'deliverers'
+    __table_args__ = (
+        db.Index('ix_deliverers_user', 'user_id'),
+        # Parcial: só os entregadores online entram no índice (no Postgres)
+        db.Index('ix_deliverers_online', 'is_online', 'is_approved', postgresql_where=db.text('is_online')),
+        db.Index('ix_deliverers_approved_created', 'is_approved', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
     cpf = db.Column(db.String(15))
-    vehicle_type = db.Column(db.String(20))  # motorcycle, bicycle, car
+    vehicle_type = db.Column(VEHICLE_TYPE)
     vehicle_plate = db.Column(db.String(10))
     is_online = db.Column(db.Boolean, default=False)
     is_approved = db.Column(db.Boolean, default=False)
-    approval_status = db.Column(db.String(20), default='pending')  # 'pending', 'approved', 'rejected'
+    approval_status = db.Column(APPROVAL_STATUS, default='pending')
     rejection_reason = db.Column(db.Text)  # Motivo da rejeição, se aplicável
     rating = db.Column(db.Float, default=5.0)
     total_deliveries = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relacionamentos
-    user = db.relationship('User', backref='deliverer_profile')
+    user = db.relationship(
+        'User', backref=db.backref('deliverer_profile', cascade='all, delete-orphan', passive_deletes=True)
+    )
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'cpf': self.cpf,
-            'vehicle_type': self.vehicle_type,
-            'vehicle_plate': self.vehicle_plate,
-            'is_online': self.is_online,
-            'is_approved': self.is_approved,
-            'approval_status': self.approval_status,
-            'rejection_reason': self.rejection_reason,
-            'rating': self.rating,
-            'total_deliveries': self.total_deliveries,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'user_name': self.user.name if self.user else None,
-            'user_phone': self.user.phone if self.user else None
-        }
-
-class DeliveryRequest(db.Model):
+    @classmethod
+    def default_loader_options(cls):
+        return (joinedload(cls.user),)
+    
+    @classmethod
+    def get_for_approval(cls, deliverer_id):
+        """Entregador e usuário num único SELECT com JOIN; do usuário, as colunas de
+        aprovação e as usadas no to_dict"""
+        return db.session.get(cls, deliverer_id, options=[
+            joinedload(cls.user).load_only(*User.approval_columns(), User.name, User.phone)
+        ])
+    
+    __serialize__ = (
+        'id', 'user_id', 'cpf', 'vehicle_type', 'vehicle_plate', 'is_online', 'is_approved',
+        'approval_status', 'rejection_reason', 'rating', 'total_deliveries', 'created_at',
+        related('user_name', 'user', 'name'), related('user_phone', 'user', 'phone')
+    )
+
+class DeliveryRequest(SerializerMixin, db.Model):
     __tablename__ = 'delivery_requests'
+    __table_args__ = (
+        db.Index('ix_delivery_requests_status_created', 'status', 'created_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     client_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -240,76 +781,134 @@ class DeliveryRequest(db.Model):
     pickup_address = db.Column(db.String(255), nullable=False)
     delivery_address = db.Column(db.String(255), nullable=False)
     item_description = db.Column(db.String(255))
-    estimated_price = db.Column(db.Float)
+    estimated_price = db.Column(Money)
     estimated_time = db.Column(db.Integer)  # em minutos
     payment_method = db.Column(db.String(20))
-    status = db.Column(db.String(20), default='pending')  # pending, accepted, picked_up, delivered, cancelled
+    status = db.Column(DELIVERY_REQUEST_STATUS, default='pending')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relacionamentos
     client = db.relationship('User', foreign_keys=[client_id], backref='delivery_requests')
     deliverer = db.relationship('User', foreign_keys=[deliverer_id], backref='assigned_deliveries')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'client_id': self.client_id,
-            'deliverer_id': self.deliverer_id,
-            'pickup_address': self.pickup_address,
-            'delivery_address': self.delivery_address,
-            'item_description': self.item_description,
-            'estimated_price': self.estimated_price,
-            'estimated_time': self.estimated_time,
-            'payment_method': self.payment_method,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'client_name': self.client.name if self.client else None,
-            'deliverer_name': self.deliverer.name if self.deliverer else None
-        }
-
-
-class AllowedCity(db.Model):
+    @classmethod
+    def default_loader_options(cls):
+        return (joinedload(cls.client), joinedload(cls.deliverer))
+    
+    __serialize__ = (
+        'id', 'client_id', 'deliverer_id', 'pickup_address', 'delivery_address',
+        'item_description', 'estimated_price', 'estimated_time', 'payment_method', 'status',
+        'created_at', related('client_name', 'client', 'name'),
+        related('deliverer_name', 'deliverer', 'name')
+    )
+
+
+class AllowedCity(SerializerMixin, db.Model):
     __tablename__ = 'allowed_cities'
+    __table_args__ = (
+        # Único: duplicatas barradas pelo banco no INSERT (o índice também serve as buscas)
+        db.UniqueConstraint('name', 'state', name='uq_allowed_cities_name_state'),
+        # Cobre as listagens ordenadas por nome (index-only scan no PostgreSQL)
+        db.Index(
+            'ix_allowed_cities_active_name', 'is_active', 'name',
+            postgresql_include=['id', 'state', 'delivery_fee_per_km', 'minimum_order_value', 'created_at']
+        ),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     state = db.Column(db.String(50), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
-    delivery_fee_per_km = db.Column(db.Float, default=2.0)  # Taxa por km
-    minimum_order_value = db.Column(db.Float, default=30.0)  # Pedido mínimo
+    delivery_fee_per_km = db.Column(Money, default=2.0)  # Taxa por km
+    minimum_order_value = db.Column(Money, default=30.0)  # Pedido mínimo
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'state': self.state,
-            'is_active': self.is_active,
-            'delivery_fee_per_km': self.delivery_fee_per_km,
-            'minimum_order_value': self.minimum_order_value,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
-
-class PlatformSettings(db.Model):
+    __serialize__ = (
+        'id', 'name', 'state', 'is_active', 'delivery_fee_per_km', 'minimum_order_value',
+        'created_at'
+    )
+    
+    @classmethod
+    def list_rows(cls, *criteria):
+        """Cidades ordenadas por nome como dicts, via Core (sem entidades ORM)"""
+        stmt = select(
+            cls.id, cls.name, cls.state, cls.is_active, cls.delivery_fee_per_km,
+            cls.minimum_order_value, cls.created_at
+        ).where(*criteria).order_by(cls.name)
+        return [row._asdict() for row in db.session.execute(stmt)]
+
+class PlatformSettings(SerializerMixin, db.Model):
     __tablename__ = 'platform_settings'
     
     id = db.Column(db.Integer, primary_key=True)
     setting_key = db.Column(db.String(100), unique=True, nullable=False)
     setting_value = db.Column(db.Text, nullable=False)
     description = db.Column(db.Text)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # onupdate no SQL para os demais dialetos (SQLite); no PostgreSQL o trigger também o mantém
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=utc_now())
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'setting_key': self.setting_key,
-            'setting_value': self.setting_value,
-            'description': self.description,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    __serialize__ = (
+        'id', 'setting_key', 'setting_value', 'description', 'updated_at'
+    )
+    
+    @classmethod
+    def upsert(cls, rows):
+        """Grava várias configurações num único INSERT ... ON CONFLICT (setting_key) DO UPDATE.
+
+        rows: dicts com setting_key, setting_value e description (a descrição
+        só é usada quando a chave ainda não existe; updated_at vem do trigger).
+        """
+        if rows:
+            stmt = pg_insert(cls).values(rows)
+            db.session.execute(stmt.on_conflict_do_update(
+                index_elements=[cls.setting_key],
+                set_={'setting_value': stmt.excluded.setting_value}
+            ))
+            # INSERT do Core não passa pelo flush do ORM
+            invalidate_on_commit(db.session, 'settings')
+    
+    @classmethod
+    def insert_missing(cls, rows):
+        """Cria as configurações que ainda não existem, num único INSERT ... ON CONFLICT DO NOTHING"""
+        if rows:
+            db.session.execute(
+                pg_insert(cls).values(rows).on_conflict_do_nothing(index_elements=[cls.setting_key])
+            )
+            # Chaves antes ausentes podem estar em cache como "sem valor"
+            invalidate_on_commit(db.session, 'settings')
+    
+    @classmethod
+    def get_values(cls, defaults):
+        """Valores de várias configurações ({chave: padrão} -> {chave: valor}).
+
+        Lê do cache em memória; as chaves ausentes vêm numa única query IN.
+        """
+        missing = [key for key in defaults if key not in _setting_values]
+        if missing:
+            found = dict(db.session.execute(
+                select(cls.setting_key, cls.setting_value).where(cls.setting_key.in_(missing))
+            ).all())
+            for key in missing:
+                _setting_values[key] = found.get(key)
+        values = {}
+        for key, default in defaults.items():
+            value = _setting_values.get(key)
+            values[key] = default if value is None else value
+        return values
+    
+    @classmethod
+    def get_value(cls, key, default=None):
+        """Valor de uma configuração, lido do cache em memória quando possível"""
+        return cls.get_values({key: default})[key]
+
+# Cache em memória (por processo) dos valores de configuração da plataforma.
+# Invalidado nos commits deste processo; o TTL limita a defasagem quando
+# outro worker altera uma configuração.
+PLATFORM_SETTINGS_CACHE_TTL = 60
+_setting_values = TTLCache(maxsize=64, ttl=PLATFORM_SETTINGS_CACHE_TTL)
 
 
-class Category(db.Model):
+class Category(SerializerMixin, db.Model):
     __tablename__ = 'categories'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -322,24 +921,43 @@ class Category(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relacionamentos
-    subcategories = db.relationship('Subcategory', backref='category', lazy=True, cascade='all, delete-orphan')
+    subcategories = db.relationship('Subcategory', backref='category', lazy='selectin', cascade='all, delete-orphan')
     stores = db.relationship('Store', backref='category_ref', lazy=True)
     products = db.relationship('Product', backref='category_ref', lazy=True)
     
+    @classmethod
+    def default_loader_options(cls):
+        return (selectinload(cls.subcategories),)
+    
+    __serialize__ = (
+        'id', 'name', 'description', 'icon', 'color', 'is_active', 'sort_order', 'created_at',
+        ('subcategories', '[sub.to_dict() for sub in self.subcategories if sub.is_active]')
+    )
+    
     def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'icon': self.icon,
-            'color': self.color,
-            'is_active': self.is_active,
-            'sort_order': self.sort_order,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'subcategories': [sub.to_dict() for sub in self.subcategories if sub.is_active]
-        }
-
-class Subcategory(db.Model):
+        # Categorias mudam raramente: o dict (com subcategorias) fica em cache
+        data = _category_dicts.get(self.id)
+        if data is None:
+            data = _category_dicts[self.id] = self._serialize()
+        return data
+    
+    @staticmethod
+    def in_use(category_id):
+        """Se algum produto ou loja usa a categoria (dois EXISTS num único SELECT)"""
+        return db.session.scalar(select(or_(
+            exists().where(Product.category_id == category_id),
+            exists().where(Store.category_id == category_id)
+        )))
+    
+    @staticmethod
+    def usage_counts(category_id):
+        """(produtos, lojas) que usam a categoria, numa única ida ao banco"""
+        return db.session.execute(select(
+            select(func.count()).select_from(Product).where(Product.category_id == category_id).scalar_subquery(),
+            select(func.count()).select_from(Store).where(Store.category_id == category_id).scalar_subquery()
+        )).one()
+
+class Subcategory(SerializerMixin, db.Model):
     __tablename__ = 'subcategories'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -353,14 +971,192 @@ class Subcategory(db.Model):
     # Relacionamentos
     products = db.relationship('Product', backref='subcategory_ref', lazy=True)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'category_id': self.category_id,
-            'name': self.name,
-            'description': self.description,
-            'is_active': self.is_active,
-            'sort_order': self.sort_order,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    __serialize__ = (
+        'id', 'category_id', 'name', 'description', 'is_active', 'sort_order', 'created_at'
+    )
+
+# Cache em memória (por processo) de id -> nome das categorias.
+# Invalidado nos commits deste processo; o TTL limita a
+# defasagem quando outro worker altera uma categoria.
+CATEGORY_CACHE_TTL = 300
+_category_cache = {'names': None, 'loaded_at': 0.0}
+_category_dicts = TTLCache(maxsize=512, ttl=CATEGORY_CACHE_TTL)
+
+def category_names():
+    """Mapa {category_id: nome}, carregado com uma única query"""
+    names = _category_cache['names']
+    if names is None or time.monotonic() - _category_cache['loaded_at'] > CATEGORY_CACHE_TTL:
+        names = dict(db.session.execute(select(Category.id, Category.name)).all())
+        _category_cache['names'] = names
+        _category_cache['loaded_at'] = time.monotonic()
+    return names
+
+def category_name(category_id, fallback=None):
+    """Nome da categoria pelo id; sem id, usa a coluna legada (string)"""
+    if category_id is None:
+        return fallback
+    return category_names().get(category_id, fallback)
+
+def resolve_categories(rows):
+    """Preenche o nome da categoria nos DTOs vindos do Core"""
+    for row in rows:
+        row.category = category_name(row.category_id, row.category)
+    return rows
+
+# Invalidação dos caches em memória num único ponto, depois do COMMIT: no flush
+# a transação ainda não terminou e outra requisição voltaria a guardar o valor antigo
+def invalidate_on_commit(session, *keys):
+    """Agenda a limpeza de caches ('settings', 'categories', ('user', id)) para o próximo commit"""
+    session.info.setdefault('stale_caches', set()).update(keys)
+
+@event.listens_for(Session, 'after_flush')
+def collect_stale_caches(session, flush_context):
+    keys = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, PlatformSettings):
+            keys.add('settings')
+        elif isinstance(obj, (Category, Subcategory)):
+            keys.add('categories')
+        elif isinstance(obj, User) and obj not in session.new:
+            keys.add(('user', str(obj.id)))
+    if keys:
+        invalidate_on_commit(session, *keys)
+
+@event.listens_for(Session, 'after_commit')
+def clear_stale_caches(session):
+    for key in session.info.pop('stale_caches', ()):
+        if key == 'settings':
+            _setting_values.clear()
+        elif key == 'categories':
+            _category_cache['names'] = None
+            _category_dicts.clear()
+        else:
+            _user_types.pop(key[1], None)
+
+# updated_at mantido por trigger no PostgreSQL: vale também para SQL manual,
+# fora do ORM (o onupdate=utc_now() das colunas cobre os demais dialetos)
+# (só em UPDATEs diretos: a propagação de nomes, disparada por outro trigger,
+# não altera o updated_at usado nos relatórios)
+SET_UPDATED_AT = DDL(
+    "CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$ "
+    "BEGIN IF pg_trigger_depth() = 1 THEN NEW.updated_at = timezone('utc', now()); END IF; "
+    "RETURN NEW; END; $$ LANGUAGE plpgsql"
+)
+for _table in (Order.__table__, PlatformSettings.__table__):
+    event.listen(_table, 'after_create', SET_UPDATED_AT.execute_if(dialect='postgresql'))
+    event.listen(_table, 'after_create', DDL(
+        f'CREATE TRIGGER trg_{_table.name}_updated_at BEFORE UPDATE ON {_table.name} '
+        'FOR EACH ROW EXECUTE FUNCTION set_updated_at()'
+    ).execute_if(dialect='postgresql'))
+
+# Nomes desnormalizados em orders: preenchidos no INSERT/troca de FK e
+# propagados quando o nome do usuário ou da loja muda. FK que vira NULL
+# (ON DELETE SET NULL) mantém o nome gravado: o histórico continua legível.
+ORDER_NAME_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION set_order_names() RETURNS trigger AS $$ BEGIN "
+    "IF NEW.client_id IS NOT NULL THEN "
+    "NEW.client_name = (SELECT name FROM users WHERE id = NEW.client_id); END IF; "
+    "NEW.store_name = (SELECT name FROM stores WHERE id = NEW.store_id); "
+    "IF NEW.deliverer_id IS NOT NULL THEN "
+    "NEW.deliverer_name = (SELECT name FROM users WHERE id = NEW.deliverer_id); END IF; "
+    "RETURN NEW; END; $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER trg_orders_names BEFORE INSERT OR UPDATE OF client_id, store_id, deliverer_id "
+    "ON orders FOR EACH ROW EXECUTE FUNCTION set_order_names()",
+    "CREATE OR REPLACE FUNCTION propagate_user_name() RETURNS trigger AS $$ BEGIN "
+    "UPDATE orders SET client_name = NEW.name WHERE client_id = NEW.id; "
+    "UPDATE orders SET deliverer_name = NEW.name WHERE deliverer_id = NEW.id; "
+    "RETURN NULL; END; $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER trg_users_name AFTER UPDATE OF name ON users FOR EACH ROW "
+    "WHEN (OLD.name IS DISTINCT FROM NEW.name) EXECUTE FUNCTION propagate_user_name()",
+    "CREATE OR REPLACE FUNCTION propagate_store_name() RETURNS trigger AS $$ BEGIN "
+    "UPDATE orders SET store_name = NEW.name WHERE store_id = NEW.id; "
+    "RETURN NULL; END; $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER trg_stores_name AFTER UPDATE OF name ON stores FOR EACH ROW "
+    "WHEN (OLD.name IS DISTINCT FROM NEW.name) EXECUTE FUNCTION propagate_store_name()",
+)
+for _statement in ORDER_NAME_TRIGGERS:
+    event.listen(Order.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+
+# Mesma regra do set_order_names para os dialetos sem os triggers (SQLite no
+# desenvolvimento), nos INSERTs/UPDATEs feitos pelo ORM; a propagação de
+# renomeações continua só no PostgreSQL
+ORDER_NAME_SOURCES = (
+    ('client_id', 'client_name', 'users'),
+    ('store_id', 'store_name', 'stores'),
+    ('deliverer_id', 'deliverer_name', 'users'),
+)
+
+@event.listens_for(Order, 'before_insert')
+@event.listens_for(Order, 'before_update')
+def fill_order_names(mapper, connection, order):
+    if connection.dialect.name == 'postgresql':
+        return
+    state = inspect(order)
+    for fk, name_attr, source in ORDER_NAME_SOURCES:
+        fk_value = state.dict.get(fk)
+        if fk_value is not None and (state.pending or state.attrs[fk].history.has_changes()):
+            source_table = table(source, column('id'), column('name'))
+            setattr(order, name_attr, connection.scalar(
+                select(source_table.c.name).where(source_table.c.id == fk_value)
+            ))
+
+# Exclusão de usuário: loja, perfil de entregador e produtos saem por
+# ON DELETE CASCADE; as entregas em andamento voltam para a fila (sem
+# entregador) antes do SET NULL de orders.client_id/deliverer_id.
+# orders.store_id segue sem cascata: loja com pedidos não é excluída
+# (o histórico é preservado).
+DELETE_TRIGGERS = (
+    "CREATE OR REPLACE FUNCTION release_deliveries() RETURNS trigger AS $$ BEGIN "
+    "UPDATE orders SET deliverer_id = NULL, deliverer_name = NULL, status = 'pending' WHERE deliverer_id = OLD.id "
+    "AND status IN ('accepted', 'preparing', 'ready', 'delivering'); "
+    "RETURN OLD; END; $$ LANGUAGE plpgsql",
+    "CREATE TRIGGER trg_users_release_deliveries BEFORE DELETE ON users "
+    "FOR EACH ROW EXECUTE FUNCTION release_deliveries()",
+)
+for _statement in DELETE_TRIGGERS:
+    event.listen(Order.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+
+# Preenche os nomes dos pedidos criados antes dos triggers (bancos existentes)
+BACKFILL_ORDER_NAMES = (
+    "UPDATE orders o SET client_name = u.name FROM users u "
+    "WHERE u.id = o.client_id AND o.client_name IS NULL",
+    "UPDATE orders o SET store_name = s.name FROM stores s "
+    "WHERE s.id = o.store_id AND o.store_name IS NULL",
+    "UPDATE orders o SET deliverer_name = u.name FROM users u "
+    "WHERE u.id = o.deliverer_id AND o.deliverer_name IS NULL",
+)
+
+# Receita diária pré-agregada para o relatório do admin; atualizada fora
+# das requisições por `flask refresh-daily-revenue` (cron). O índice único
+# permite REFRESH ... CONCURRENTLY, sem bloquear as leituras.
+DAILY_REVENUE_VIEW = (
+    "CREATE MATERIALIZED VIEW IF NOT EXISTS mv_daily_revenue AS "
+    "SELECT CAST(updated_at AS DATE) AS date, SUM(total_amount) AS revenue, COUNT(*) AS orders "
+    "FROM orders WHERE status = 'delivered' GROUP BY 1",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_daily_revenue_date ON mv_daily_revenue (date)",
+)
+for _statement in DAILY_REVENUE_VIEW:
+    event.listen(Order.__table__, 'after_create', DDL(_statement).execute_if(dialect='postgresql'))
+
+# Fora do metadata: o create_all não cria uma tabela com esse nome
+daily_revenue = table(
+    'mv_daily_revenue',
+    column('date', db.Date), column('revenue', Money), column('orders', db.Integer)
+)
 
+# DTOs das listagens via Core (criados após todos os modelos: as colunas
+# de nome referenciam outras tabelas)
+ROW_CLASSES = {
+    User: row_class(User),
+    Store: row_class(Store),
+    Product: row_class(Product),
+    OrderItem: row_class(OrderItem),
+    Order: row_class(Order, [('items', list, field(default_factory=list))]),
+}
+ADMIN_STORE_ROWS = {
+    summary: row_class(Store, columns=Store.admin_columns(summary)) for summary in (False, True)
+}
+PRIVILEGE_STORE_ROWS = {
+    False: row_class(Store, columns=Store.privilege_columns()),
+    True: row_class(Store, [('success_rate', float, field(default=0))], columns=Store.privilege_columns(True)),
+}
@@ -1,634 +1,615 @@
-from flask import Blueprint, request, jsonify
+import hashlib
+import orjson
+from functools import wraps
+from flask import Blueprint, Response, current_app, g, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.wendy_models import db, User, Store, Deliverer, Order, Product, AllowedCity, PlatformSettings, Category, Subcategory
+from src.audit import audit_log
+from src.cache import (
+    cache, cached_data, DASHBOARD_CACHE_KEY, DASHBOARD_CACHE_TTL, CITIES_CACHE_KEY, CITIES_CACHE_TTL
+)
+from src.models.wendy_models import db, User, Store, Deliverer, Order, ORDER_STATUS, Product, AllowedCity, PlatformSettings, Category, Subcategory, count_rows, count_where, sum_where, row_exists, invalidate_on_commit, listing_options, paginate_with_total, daily_revenue
 from datetime import datetime, timedelta
-from sqlalchemy import func
+from sqlalchemy import and_, bindparam, exists, func, lambda_stmt, or_, select, update
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
 admin_bp = Blueprint('admin', __name__)
 
+# Só erros de banco: um handler de Exception no blueprint teria precedência sobre
+# os do flask_jwt_extended (registrados no app) e trocaria os 401/422 de token por 500
+@admin_bp.errorhandler(SQLAlchemyError)
+def handle_database_error(error):
+    """Erro de banco em qualquer rota do admin: desfaz a transação e responde 500 sem expor detalhes"""
+    db.session.rollback()
+    current_app.logger.exception(error)
+    return jsonify({'error': 'Erro interno do servidor'}), 500
+
 def admin_required():
-    """Decorator para verificar se o usuário é admin"""
-    user_id = get_jwt_identity()
-    user = User.query.get(user_id)
-    return user and user.user_type == 'admin'
+    """Verifica se o usuário do token ainda existe e é admin.
+
+    O tipo vem do banco (os tokens não expiram: rebaixamento ou exclusão
+    precisam valer na hora), pelo cache de tipos invalidado nos commits.
+    O resultado fica em flask.g para checagens repetidas na mesma requisição.
+    """
+    if 'is_admin' not in g:
+        g.is_admin = User.cached_type(get_jwt_identity()) == 'admin'
+    return g.is_admin
+
+def prebuilt_error(message, status):
+    """Resposta de erro serializada uma única vez, na importação"""
+    return orjson.dumps({'error': message}), status, {'Content-Type': 'application/json'}
+
+# Erros mais frequentes das rotas do admin
+ADMIN_DENIED = prebuilt_error('Acesso negado', 403)
+ADMIN_ONLY_DENIED = prebuilt_error('Acesso negado - apenas administradores', 403)
+STORE_NOT_FOUND = prebuilt_error('Loja não encontrada', 404)
+USER_NOT_FOUND = prebuilt_error('Usuário não encontrado', 404)
+DELIVERER_NOT_FOUND = prebuilt_error('Entregador não encontrado', 404)
+ORDER_NOT_FOUND = prebuilt_error('Pedido não encontrado', 404)
+CATEGORY_NOT_FOUND = prebuilt_error('Categoria não encontrada', 404)
+SUBCATEGORY_NOT_FOUND = prebuilt_error('Subcategoria não encontrada', 404)
+CITY_NOT_FOUND = prebuilt_error('Cidade não encontrada', 404)
+# orders.store_id não tem ON DELETE: o histórico de pedidos impede excluir a loja
+STORE_HAS_ORDERS = prebuilt_error(
+    'Não é possível excluir lojas com histórico de pedidos. Suspenda a conta em vez de excluí-la.', 409
+)
+
+def admin_endpoint(view=None, *, denied=ADMIN_DENIED):
+    """Restringe a rota a admins (usar abaixo do @jwt_required()).
+
+    Erros de banco ficam com o errorhandler do blueprint (rollback + 500).
+    """
+    if view is None:
+        return lambda view: admin_endpoint(view, denied=denied)
+    
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not admin_required():
+            return denied
+        return view(*args, **kwargs)
+    return wrapper
+
+# Statements do dashboard (uma agregação condicional por tabela) montados uma
+# única vez: com lambda_stmt a chave do cache de SQL compilado sai pronta, sem
+# reconstruir e percorrer a expressão a cada requisição
+DASHBOARD_STORES = lambda_stmt(lambda: select(
+    func.count().label('total'),
+    count_where(and_(Store.is_approved == True, Store.is_active == True)).label('active'),
+    count_where(and_(Store.is_approved == False, Store.is_active == True)).label('pending')
+).select_from(Store))
+
+DASHBOARD_DELIVERERS = lambda_stmt(lambda: select(
+    func.count().label('total'),
+    count_where(Deliverer.is_approved == True).label('active'),
+    count_where(and_(Deliverer.is_approved == True, Deliverer.is_online == True)).label('online')
+).select_from(Deliverer))
+
+DASHBOARD_ORDERS = lambda_stmt(lambda: select(
+    func.count().label('total'),
+    count_where(Order.created_at >= bindparam('month_start')).label('monthly'),
+    sum_where(Order.status == 'delivered', Order.total_amount).label('revenue'),
+    sum_where(
+        and_(Order.status == 'delivered', Order.updated_at >= bindparam('month_start')), Order.total_amount
+    ).label('monthly_revenue')
+).select_from(Order))
+
+# Assinatura barata do estado do dashboard: pedidos pelo último updated_at e pela
+# contagem; lojas e entregadores (tabelas pequenas) pelas flags que entram nos contadores
+DASHBOARD_SIGNATURE = lambda_stmt(lambda: select(
+    select(func.count()).select_from(Order).scalar_subquery(),
+    select(func.max(Order.updated_at)).scalar_subquery(),
+    select(func.count()).select_from(Store).scalar_subquery(),
+    select(count_where(Store.is_approved == True)).scalar_subquery(),
+    select(count_where(Store.is_active == True)).scalar_subquery(),
+    select(func.count()).select_from(Deliverer).scalar_subquery(),
+    select(count_where(Deliverer.is_approved == True)).scalar_subquery(),
+    select(count_where(Deliverer.is_online == True)).scalar_subquery()
+))
+
+def current_month_start():
+    return datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def dashboard_etag():
+    """ETag do dashboard: muda quando algum contador pode ter mudado (ou quando vira o mês)"""
+    signature = db.session.execute(DASHBOARD_SIGNATURE).one()
+    return hashlib.md5(f'{current_month_start():%Y-%m}|{tuple(signature)}'.encode()).hexdigest()
+
+def dashboard_stats():
+    """Contadores do dashboard"""
+    current_month = current_month_start()
+    
+    # Só leitura, sem autoflush
+    with db.session.no_autoflush:
+        stores = db.session.execute(DASHBOARD_STORES).one()
+        deliverers = db.session.execute(DASHBOARD_DELIVERERS).one()
+        orders = db.session.execute(DASHBOARD_ORDERS, {'month_start': current_month}).one()
+    
+    return {
+        'stores': {
+            'total': stores.total,
+            'active': stores.active,
+            'pending': stores.pending
+        },
+        'deliverers': {
+            'total': deliverers.total,
+            'active': deliverers.active,
+            'online': deliverers.online
+        },
+        'orders': {
+            'total': orders.total,
+            'monthly': orders.monthly
+        },
+        'revenue': {
+            'total': orders.revenue,
+            'monthly': orders.monthly_revenue
+        }
+    }
 
 @admin_bp.route('/dashboard', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_dashboard_stats():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        # Estatísticas gerais
-        total_stores = Store.query.count()
-        active_stores = Store.query.filter_by(is_approved=True, is_active=True).count()
-        pending_stores = Store.query.filter_by(is_approved=False, is_active=True).count()
-        
-        total_deliverers = Deliverer.query.count()
-        active_deliverers = Deliverer.query.filter_by(is_approved=True).count()
-        online_deliverers = Deliverer.query.filter_by(is_approved=True, is_online=True).count()
-        
-        total_orders = Order.query.count()
-        
-        # Receita total
-        total_revenue = db.session.query(func.sum(Order.total_amount)).filter(
-            Order.status == 'delivered'
-        ).scalar() or 0
-        
-        # Receita do mês atual
-        current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_revenue = db.session.query(func.sum(Order.total_amount)).filter(
-            Order.status == 'delivered',
-            Order.updated_at >= current_month
-        ).scalar() or 0
-        
-        # Pedidos do mês
-        monthly_orders = Order.query.filter(
-            Order.created_at >= current_month
-        ).count()
-        
-        return jsonify({
-            'stores': {
-                'total': total_stores,
-                'active': active_stores,
-                'pending': pending_stores
-            },
-            'deliverers': {
-                'total': total_deliverers,
-                'active': active_deliverers,
-                'online': online_deliverers
-            },
-            'orders': {
-                'total': total_orders,
-                'monthly': monthly_orders
-            },
-            'revenue': {
-                'total': total_revenue,
-                'monthly': monthly_revenue
-            }
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Polling do painel sem mudanças: 304 só com a query da assinatura, sem agregar nem serializar
+    etag = dashboard_etag()
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        # Mesmo resultado para todos os admins; a chave inclui a ETag, então mudanças
+        # aparecem na hora e o TTL curto só absorve os refreshes simultâneos
+        data = cached_data(f'{DASHBOARD_CACHE_KEY}:{etag}', DASHBOARD_CACHE_TTL, dashboard_stats)
+        response = jsonify(data)
+    response.set_etag(etag)
+    # Dado de admin: o navegador guarda, mas sempre revalida
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
 
 @admin_bp.route('/stores/pending', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_pending_stores():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        stores = Store.query.filter_by(is_approved=False, is_active=True).order_by(
-            Store.created_at.desc()
-        ).all()
-        
-        stores_data = []
-        for store in stores:
-            store_dict = store.to_dict()
-            store_dict['owner_name'] = store.user.name if store.user else None
-            store_dict['owner_email'] = store.user.email if store.user else None
-            stores_data.append(store_dict)
-        
-        return jsonify({
-            'stores': stores_data,
-            'total': len(stores_data)
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    stores = Store.query.filter_by(is_approved=False, is_active=True).options(
+        *listing_options(Store)
+    ).order_by(
+        Store.created_at.desc()
+    ).all()
+    
+    stores_data = []
+    for store in stores:
+        store_dict = store.to_dict()
+        store_dict['owner_name'] = store.user.name if store.user else None
+        store_dict['owner_email'] = store.user.email if store.user else None
+        stores_data.append(store_dict)
+    
+    return jsonify({
+        'stores': stores_data,
+        'total': len(stores_data)
+    }), 200
 
 @admin_bp.route('/stores/<int:store_id>/approve', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def approve_store(store_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        store = Store.query.get(store_id)
-        
-        if not store:
-            return jsonify({'error': 'Loja não encontrada'}), 404
-        
-        # Aprovar loja
-        store.is_approved = True
-        store.approval_status = 'approved'
-        store.rejection_reason = None
-        
-        # Aprovar usuário também
-        store.user.is_approved = True
-        store.user.approval_status = 'approved'
-        store.user.rejection_reason = None
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Loja aprovada com sucesso',
-            'store': store.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    store = Store.get_for_approval(store_id)
+    
+    if not store:
+        return STORE_NOT_FOUND
+    
+    # Aprovar loja
+    store.is_approved = True
+    store.approval_status = 'approved'
+    store.rejection_reason = None
+    
+    # Aprovar usuário também
+    store.user.is_approved = True
+    store.user.approval_status = 'approved'
+    store.user.rejection_reason = None
+    
+    # Serializado antes do commit, que expira o objeto (evita recarregá-lo)
+    store_data = store.to_dict()
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Loja aprovada com sucesso',
+        'store': store_data
+    }), 200
 
 @admin_bp.route('/stores/<int:store_id>/reject', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def reject_store(store_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        store = Store.query.get(store_id)
-        
-        if not store:
-            return jsonify({'error': 'Loja não encontrada'}), 404
-        
-        data = request.get_json()
-        reason = data.get('reason', 'Não especificado')
-        
-        # Rejeitar loja
-        store.is_approved = False
-        store.approval_status = 'rejected'
-        store.rejection_reason = reason
-        store.is_active = False
-        
-        # Rejeitar usuário também
-        store.user.is_approved = False
-        store.user.approval_status = 'rejected'
-        store.user.rejection_reason = reason
-        store.user.is_active = False
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Loja rejeitada com sucesso',
-            'reason': reason
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    store = Store.get_for_approval(store_id)
+    
+    if not store:
+        return STORE_NOT_FOUND
+    
+    data = request.get_json()
+    reason = data.get('reason', 'Não especificado')
+    
+    # Rejeitar loja
+    store.is_approved = False
+    store.approval_status = 'rejected'
+    store.rejection_reason = reason
+    store.is_active = False
+    
+    # Rejeitar usuário também
+    store.user.is_approved = False
+    store.user.approval_status = 'rejected'
+    store.user.rejection_reason = reason
+    store.user.is_active = False
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Loja rejeitada com sucesso',
+        'reason': reason
+    }), 200
 
 @admin_bp.route('/deliverers/pending', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_pending_deliverers():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        deliverers = Deliverer.query.filter_by(is_approved=False).order_by(
-            Deliverer.created_at.desc()
-        ).all()
-        
-        return jsonify({
-            'deliverers': [deliverer.to_dict() for deliverer in deliverers],
-            'total': len(deliverers)
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    deliverers = Deliverer.query.filter_by(is_approved=False).options(
+        *listing_options(Deliverer)
+    ).order_by(
+        Deliverer.created_at.desc()
+    ).all()
+    
+    return jsonify({
+        'deliverers': [deliverer.to_dict() for deliverer in deliverers],
+        'total': len(deliverers)
+    }), 200
 
 @admin_bp.route('/deliverers/<int:deliverer_id>/approve', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def approve_deliverer(deliverer_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        deliverer = Deliverer.query.get(deliverer_id)
-        
-        if not deliverer:
-            return jsonify({'error': 'Entregador não encontrado'}), 404
-        
-        # Aprovar entregador
-        deliverer.is_approved = True
-        deliverer.approval_status = 'approved'
-        deliverer.rejection_reason = None
-        
-        # Aprovar usuário também
-        deliverer.user.is_approved = True
-        deliverer.user.approval_status = 'approved'
-        deliverer.user.rejection_reason = None
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Entregador aprovado com sucesso',
-            'deliverer': deliverer.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    deliverer = Deliverer.get_for_approval(deliverer_id)
+    
+    if not deliverer:
+        return DELIVERER_NOT_FOUND
+    
+    # Aprovar entregador
+    deliverer.is_approved = True
+    deliverer.approval_status = 'approved'
+    deliverer.rejection_reason = None
+    
+    # Aprovar usuário também
+    deliverer.user.is_approved = True
+    deliverer.user.approval_status = 'approved'
+    deliverer.user.rejection_reason = None
+    
+    # Serializado antes do commit, que expira o objeto (evita recarregá-lo)
+    deliverer_data = deliverer.to_dict()
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Entregador aprovado com sucesso',
+        'deliverer': deliverer_data
+    }), 200
 
 @admin_bp.route('/deliverers/<int:deliverer_id>/reject', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def reject_deliverer(deliverer_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        deliverer = Deliverer.query.get(deliverer_id)
-        
-        if not deliverer:
-            return jsonify({'error': 'Entregador não encontrado'}), 404
-        
-        data = request.get_json()
-        reason = data.get('reason', 'Não especificado')
-        
-        # Rejeitar entregador
-        deliverer.is_approved = False
-        deliverer.approval_status = 'rejected'
-        deliverer.rejection_reason = reason
-        
-        # Rejeitar usuário também
-        deliverer.user.is_approved = False
-        deliverer.user.approval_status = 'rejected'
-        deliverer.user.rejection_reason = reason
-        deliverer.user.is_active = False
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Entregador rejeitado com sucesso',
-            'reason': reason
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    deliverer = Deliverer.get_for_approval(deliverer_id)
+    
+    if not deliverer:
+        return DELIVERER_NOT_FOUND
+    
+    data = request.get_json()
+    reason = data.get('reason', 'Não especificado')
+    
+    # Rejeitar entregador
+    deliverer.is_approved = False
+    deliverer.approval_status = 'rejected'
+    deliverer.rejection_reason = reason
+    
+    # Rejeitar usuário também
+    deliverer.user.is_approved = False
+    deliverer.user.approval_status = 'rejected'
+    deliverer.user.rejection_reason = reason
+    deliverer.user.is_active = False
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Entregador rejeitado com sucesso',
+        'reason': reason
+    }), 200
 
 @admin_bp.route('/stores', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_all_stores():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        status = request.args.get('status')  # 'approved', 'pending', 'rejected'
-        
-        query = Store.query
-        
-        if status == 'approved':
-            query = query.filter_by(is_approved=True, is_active=True)
-        elif status == 'pending':
-            query = query.filter_by(is_approved=False, is_active=True)
-        elif status == 'rejected':
-            query = query.filter_by(is_active=False)
-        
-        stores = query.order_by(Store.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        stores_data = []
-        for store in stores.items:
-            store_dict = store.to_dict()
-            store_dict['owner_name'] = store.user.name if store.user else None
-            store_dict['owner_email'] = store.user.email if store.user else None
-            stores_data.append(store_dict)
-        
-        return jsonify({
-            'stores': stores_data,
-            'total': stores.total,
-            'pages': stores.pages,
-            'current_page': page
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 20))
+    status = request.args.get('status')  # 'approved', 'pending', 'rejected'
+    
+    query = Store.query
+    
+    if status == 'approved':
+        query = query.filter_by(is_approved=True, is_active=True)
+    elif status == 'pending':
+        query = query.filter_by(is_approved=False, is_active=True)
+    elif status == 'rejected':
+        query = query.filter_by(is_active=False)
+    
+    # summary=true: sem descrição/motivo de rejeição
+    summary = request.args.get('summary') == 'true'
+    
+    # DTOs via Core (dono incluso como subquery), serializados direto pelo orjson
+    stores = Store.admin_page(query.order_by(Store.created_at.desc()), page, per_page, summary)
+    
+    return jsonify({
+        'stores': stores.items,
+        'total': stores.total,
+        'pages': stores.pages,
+        'current_page': page
+    }), 200
 
 @admin_bp.route('/deliverers', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_all_deliverers():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        status = request.args.get('status')  # 'approved', 'pending'
-        
-        query = Deliverer.query
-        
-        if status == 'approved':
-            query = query.filter_by(is_approved=True)
-        elif status == 'pending':
-            query = query.filter_by(is_approved=False)
-        
-        deliverers = query.order_by(Deliverer.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'deliverers': [deliverer.to_dict() for deliverer in deliverers.items],
-            'total': deliverers.total,
-            'pages': deliverers.pages,
-            'current_page': page
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 20))
+    status = request.args.get('status')  # 'approved', 'pending'
+    
+    query = Deliverer.query
+    
+    if status == 'approved':
+        query = query.filter_by(is_approved=True)
+    elif status == 'pending':
+        query = query.filter_by(is_approved=False)
+    
+    deliverers = paginate_with_total(
+        query.options(*listing_options(Deliverer)).order_by(Deliverer.created_at.desc()), page, per_page
+    )
+    
+    return jsonify({
+        'deliverers': [deliverer.to_dict() for deliverer in deliverers.items],
+        'total': deliverers.total,
+        'pages': deliverers.pages,
+        'current_page': page
+    }), 200
 
 @admin_bp.route('/orders', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_all_orders():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        page = int(request.args.get('page', 1))
-        per_page = int(request.args.get('per_page', 20))
-        status = request.args.get('status')
-        
-        query = Order.query
-        
-        if status:
-            query = query.filter_by(status=status)
-        
-        orders = query.order_by(Order.created_at.desc()).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
-        
-        return jsonify({
-            'orders': [order.to_dict() for order in orders.items],
-            'total': orders.total,
-            'pages': orders.pages,
-            'current_page': page
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@admin_bp.route('/reports/revenue', methods=['GET'])
+    page = int(request.args.get('page', 1))
+    per_page = int(request.args.get('per_page', 20))
+    status = request.args.get('status')
+    
+    query = Order.query
+    
+    if status:
+        query = query.filter_by(status=status)
+    
+    orders = Order.core_page(query.order_by(Order.created_at.desc()), page, per_page)
+    
+    return jsonify({
+        'orders': orders.items,
+        'total': orders.total,
+        'pages': orders.pages,
+        'current_page': page
+    }), 200
+
+@admin_bp.route('/orders/export', methods=['GET'])
 @jwt_required()
-def get_revenue_report():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        # Relatório de receita dos últimos 30 dias
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        
-        daily_revenue = db.session.query(
-            func.date(Order.updated_at).label('date'),
+@admin_endpoint
+def export_orders():
+    """Exporta pedidos em NDJSON (uma linha por pedido), em streaming"""
+    stmt = db.select(*Order.core_columns()).order_by(Order.id)
+    status = request.args.get('status')
+    if status:
+        stmt = stmt.where(Order.status == status)
+    stmt = stmt.execution_options(yield_per=1000)
+    
+    def generate():
+        # Datas e decimais formatados pelo orjson (Rust); cursor lido em lotes
+        for partition in db.session.execute(stmt).partitions():
+            yield b''.join(
+                orjson.dumps(row._asdict(), option=orjson.OPT_APPEND_NEWLINE) for row in partition
+            )
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+def daily_revenue_since(start_date):
+    """Receita por dia a partir de start_date.
+
+    No PostgreSQL lê a view materializada (~30 linhas); sem ela (SQLite no
+    desenvolvimento ou view ainda não criada) agrupa os pedidos entregues.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql' and db.session.scalar(
+        select(func.to_regclass('mv_daily_revenue'))
+    ) is not None:
+        return db.session.execute(
+            select(daily_revenue).where(daily_revenue.c.date >= start_date).order_by(daily_revenue.c.date)
+        ).all()
+    
+    return db.session.execute(
+        select(
+            Order.updated_date().label('date'),
             func.sum(Order.total_amount).label('revenue'),
             func.count(Order.id).label('orders')
-        ).filter(
+        ).where(
             Order.status == 'delivered',
-            Order.updated_at >= thirty_days_ago
-        ).group_by(func.date(Order.updated_at)).all()
-        
-        revenue_data = []
-        for day in daily_revenue:
-            revenue_data.append({
-                'date': day.date.isoformat(),
-                'revenue': float(day.revenue),
-                'orders': day.orders
-            })
-        
-        return jsonify({
-            'daily_revenue': revenue_data,
-            'period': '30_days'
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            Order.updated_date() >= start_date
+        ).group_by(Order.updated_date()).order_by(Order.updated_date())
+    ).all()
 
+@admin_bp.route('/reports/revenue', methods=['GET'])
+@jwt_required()
+@admin_endpoint
+def get_revenue_report():
+    # Relatório de receita dos últimos 30 dias
+    thirty_days_ago = datetime.now() - timedelta(days=30)
+    
+    days = daily_revenue_since(thirty_days_ago.date())
+    
+    revenue_data = []
+    for day in days:
+        revenue_data.append({
+            'date': day.date,
+            'revenue': float(day.revenue),
+            'orders': day.orders
+        })
+    
+    return jsonify({
+        'daily_revenue': revenue_data,
+        'period': '30_days'
+    }), 200
 
 
-# Rotas para exclusão de cadastros
 
-@admin_bp.route('/users/<int:user_id>/delete', methods=['DELETE'])
-@jwt_required()
-def delete_user(user_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        user = User.query.get(user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        if user.user_type == 'admin':
-            return jsonify({'error': 'Não é possível excluir administradores'}), 403
-        
-        data = request.get_json()
-        reason = data.get('reason', 'Violação dos termos de uso')
-        
-        # Excluir registros relacionados primeiro
-        if user.user_type == 'store' and user.store:
-            # Desativar produtos da loja
-            for product in user.store.products:
-                product.is_active = False
-            
-            # Cancelar pedidos pendentes
-            pending_orders = Order.query.filter_by(store_id=user.store.id, status='pending').all()
-            for order in pending_orders:
-                order.status = 'cancelled'
-            
-            db.session.delete(user.store)
-        
-        elif user.user_type == 'deliverer' and user.deliverer_profile:
-            # Cancelar entregas pendentes
-            pending_deliveries = Order.query.filter_by(deliverer_id=user.id).filter(
-                Order.status.in_(['accepted', 'preparing', 'ready', 'delivering'])
-            ).all()
-            for order in pending_deliveries:
-                order.deliverer_id = None
-                order.status = 'pending'
-            
-            db.session.delete(user.deliverer_profile)
-        
-        # Excluir o usuário
-        db.session.delete(user)
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Usuário {user.name} excluído com sucesso',
-            'reason': reason
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+# Rotas para exclusão de cadastros
 
 @admin_bp.route('/stores/<int:store_id>/delete', methods=['DELETE'])
 @jwt_required()
+@admin_endpoint
 def delete_store(store_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        store = Store.query.get(store_id)
-        
-        if not store:
-            return jsonify({'error': 'Loja não encontrada'}), 404
-        
-        data = request.get_json()
-        reason = data.get('reason', 'Violação dos termos de uso')
-        
-        # Desativar produtos da loja
-        for product in store.products:
-            product.is_active = False
-        
-        # Cancelar pedidos pendentes
-        pending_orders = Order.query.filter_by(store_id=store.id, status='pending').all()
-        for order in pending_orders:
-            order.status = 'cancelled'
-        
-        # Excluir a loja e o usuário
-        user = store.user
-        db.session.delete(store)
-        db.session.delete(user)
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Loja {store.name} excluída com sucesso',
-            'reason': reason
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    store = Store.query.get(store_id)
+    
+    if not store:
+        return STORE_NOT_FOUND
+    
+    if row_exists(Order, Order.store_id == store.id):
+        return STORE_HAS_ORDERS
+    
+    data = request.get_json()
+    reason = data.get('reason', 'Violação dos termos de uso')
+    
+    # Excluir o usuário; a loja e os produtos saem em cascata no banco
+    store_name = store.name
+    owner_id = store.user_id
+    db.session.delete(store.user)
+    db.session.commit()
+    
+    audit_log('store_deleted', {
+        'deleted_by': get_jwt_identity(),
+        'deleted_at': datetime.utcnow().isoformat(),
+        'reason': reason,
+        'store': {'id': store_id, 'name': store_name, 'user_id': owner_id}
+    })
+    
+    return jsonify({
+        'message': f'Loja {store_name} excluída com sucesso',
+        'reason': reason
+    }), 200
 
 @admin_bp.route('/deliverers/<int:deliverer_id>/delete', methods=['DELETE'])
 @jwt_required()
+@admin_endpoint
 def delete_deliverer(deliverer_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        deliverer = Deliverer.query.get(deliverer_id)
-        
-        if not deliverer:
-            return jsonify({'error': 'Entregador não encontrado'}), 404
-        
-        data = request.get_json()
-        reason = data.get('reason', 'Violação dos termos de uso')
-        
-        # Cancelar entregas pendentes
-        pending_deliveries = Order.query.filter_by(deliverer_id=deliverer.user_id).filter(
-            Order.status.in_(['accepted', 'preparing', 'ready', 'delivering'])
-        ).all()
-        for order in pending_deliveries:
-            order.deliverer_id = None
-            order.status = 'pending'
-        
-        # Excluir o entregador e o usuário
-        user = deliverer.user
-        db.session.delete(deliverer)
-        db.session.delete(user)
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Entregador {user.name} excluído com sucesso',
-            'reason': reason
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    deliverer = Deliverer.query.get(deliverer_id)
+    
+    if not deliverer:
+        return DELIVERER_NOT_FOUND
+    
+    data = request.get_json()
+    reason = data.get('reason', 'Violação dos termos de uso')
+    
+    # Excluir o usuário; o perfil sai em cascata no banco e o
+    # trigger devolve as entregas em andamento à fila
+    user = deliverer.user
+    user_info = {'id': user.id, 'name': user.name, 'email': user.email}
+    db.session.delete(user)
+    db.session.commit()
+    
+    audit_log('deliverer_deleted', {
+        'deleted_by': get_jwt_identity(),
+        'deleted_at': datetime.utcnow().isoformat(),
+        'reason': reason,
+        'deliverer_id': deliverer_id,
+        'user_info': user_info
+    })
+    
+    return jsonify({
+        'message': f'Entregador {user.name} excluído com sucesso',
+        'reason': reason
+    }), 200
 
 # Rotas para reativar usuários rejeitados
 
 @admin_bp.route('/stores/<int:store_id>/reactivate', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def reactivate_store(store_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        store = Store.query.get(store_id)
-        
-        if not store:
-            return jsonify({'error': 'Loja não encontrada'}), 404
-        
-        # Reativar loja
-        store.is_active = True
-        store.is_approved = False
-        store.approval_status = 'pending'
-        store.rejection_reason = None
-        
-        # Reativar usuário
-        store.user.is_active = True
-        store.user.is_approved = False
-        store.user.approval_status = 'pending'
-        store.user.rejection_reason = None
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Loja reativada e colocada em análise novamente',
-            'store': store.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    store = Store.get_for_approval(store_id)
+    
+    if not store:
+        return STORE_NOT_FOUND
+    
+    # Reativar loja
+    store.is_active = True
+    store.is_approved = False
+    store.approval_status = 'pending'
+    store.rejection_reason = None
+    
+    # Reativar usuário
+    store.user.is_active = True
+    store.user.is_approved = False
+    store.user.approval_status = 'pending'
+    store.user.rejection_reason = None
+    
+    # Serializado antes do commit, que expira o objeto (evita recarregá-lo)
+    store_data = store.to_dict()
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Loja reativada e colocada em análise novamente',
+        'store': store_data
+    }), 200
 
 @admin_bp.route('/deliverers/<int:deliverer_id>/reactivate', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def reactivate_deliverer(deliverer_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        deliverer = Deliverer.query.get(deliverer_id)
-        
-        if not deliverer:
-            return jsonify({'error': 'Entregador não encontrado'}), 404
-        
-        # Reativar entregador
-        deliverer.is_approved = False
-        deliverer.approval_status = 'pending'
-        deliverer.rejection_reason = None
-        
-        # Reativar usuário
-        deliverer.user.is_active = True
-        deliverer.user.is_approved = False
-        deliverer.user.approval_status = 'pending'
-        deliverer.user.rejection_reason = None
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Entregador reativado e colocado em análise novamente',
-            'deliverer': deliverer.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    deliverer = Deliverer.get_for_approval(deliverer_id)
+    
+    if not deliverer:
+        return DELIVERER_NOT_FOUND
+    
+    # Reativar entregador
+    deliverer.is_approved = False
+    deliverer.approval_status = 'pending'
+    deliverer.rejection_reason = None
+    
+    # Reativar usuário
+    deliverer.user.is_active = True
+    deliverer.user.is_approved = False
+    deliverer.user.approval_status = 'pending'
+    deliverer.user.rejection_reason = None
+    
+    # Serializado antes do commit, que expira o objeto (evita recarregá-lo)
+    deliverer_data = deliverer.to_dict()
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Entregador reativado e colocado em análise novamente',
+        'deliverer': deliverer_data
+    }), 200
 
 
 # Rotas para gerenciar cidades permitidas
 
 @admin_bp.route('/cities', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_allowed_cities():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        cities = AllowedCity.query.order_by(AllowedCity.name).all()
-        
-        return jsonify({
-            'cities': [city.to_dict() for city in cities],
-            'total': len(cities)
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    cities = AllowedCity.list_rows()
+    
+    return jsonify({
+        'cities': cities,
+        'total': len(cities)
+    }), 200
 
 @admin_bp.route('/cities', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def add_allowed_city():
     try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
         data = request.get_json()
         
         # Validar dados obrigatórios
@@ -637,16 +618,7 @@ def add_allowed_city():
             if field not in data or not data[field]:
                 return jsonify({'error': f'Campo {field} é obrigatório'}), 400
         
-        # Verificar se cidade já existe
-        existing_city = AllowedCity.query.filter_by(
-            name=data['name'], 
-            state=data['state']
-        ).first()
-        
-        if existing_city:
-            return jsonify({'error': 'Cidade já cadastrada'}), 400
-        
-        # Criar nova cidade
+        # Criar nova cidade (duplicata barrada pela constraint única name/state)
         city = AllowedCity(
             name=data['name'],
             state=data['state'],
@@ -657,414 +629,318 @@ def add_allowed_city():
         
         db.session.add(city)
         db.session.commit()
+        cache.delete(CITIES_CACHE_KEY)
         
         return jsonify({
             'message': 'Cidade adicionada com sucesso',
             'city': city.to_dict()
         }), 201
         
-    except Exception as e:
+    except IntegrityError:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': 'Cidade já cadastrada'}), 400
 
 @admin_bp.route('/cities/<int:city_id>', methods=['PUT'])
 @jwt_required()
+@admin_endpoint
 def update_allowed_city(city_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        city = AllowedCity.query.get(city_id)
-        
-        if not city:
-            return jsonify({'error': 'Cidade não encontrada'}), 404
-        
-        data = request.get_json()
-        
-        # Atualizar campos
-        if 'name' in data:
-            city.name = data['name']
-        if 'state' in data:
-            city.state = data['state']
-        if 'delivery_fee_per_km' in data:
-            city.delivery_fee_per_km = data['delivery_fee_per_km']
-        if 'minimum_order_value' in data:
-            city.minimum_order_value = data['minimum_order_value']
-        if 'is_active' in data:
-            city.is_active = data['is_active']
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Cidade atualizada com sucesso',
-            'city': city.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    city = AllowedCity.query.get(city_id)
+    
+    if not city:
+        return CITY_NOT_FOUND
+    
+    data = request.get_json()
+    
+    # Atualizar campos
+    if 'name' in data:
+        city.name = data['name']
+    if 'state' in data:
+        city.state = data['state']
+    if 'delivery_fee_per_km' in data:
+        city.delivery_fee_per_km = data['delivery_fee_per_km']
+    if 'minimum_order_value' in data:
+        city.minimum_order_value = data['minimum_order_value']
+    if 'is_active' in data:
+        city.is_active = data['is_active']
+    
+    db.session.commit()
+    cache.delete(CITIES_CACHE_KEY)
+    
+    return jsonify({
+        'message': 'Cidade atualizada com sucesso',
+        'city': city.to_dict()
+    }), 200
 
 @admin_bp.route('/cities/<int:city_id>', methods=['DELETE'])
 @jwt_required()
+@admin_endpoint
 def delete_allowed_city(city_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        city = AllowedCity.query.get(city_id)
-        
-        if not city:
-            return jsonify({'error': 'Cidade não encontrada'}), 404
-        
-        db.session.delete(city)
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Cidade {city.name} removida com sucesso'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    city = AllowedCity.query.get(city_id)
+    
+    if not city:
+        return CITY_NOT_FOUND
+    
+    db.session.delete(city)
+    db.session.commit()
+    cache.delete(CITIES_CACHE_KEY)
+    
+    return jsonify({
+        'message': f'Cidade {city.name} removida com sucesso'
+    }), 200
+
+def available_cities():
+    cities = AllowedCity.list_rows(AllowedCity.is_active == True)
+    return {
+        'cities': cities,
+        'total': len(cities)
+    }
 
 # Rota pública para verificar cidades disponíveis
 @admin_bp.route('/cities/available', methods=['GET'])
 def get_available_cities():
-    try:
-        cities = AllowedCity.query.filter_by(is_active=True).order_by(AllowedCity.name).all()
-        
-        return jsonify({
-            'cities': [city.to_dict() for city in cities],
-            'total': len(cities)
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    return jsonify(cached_data(CITIES_CACHE_KEY, CITIES_CACHE_TTL, available_cities)), 200
 
 # Rotas para configurações da plataforma
 
 @admin_bp.route('/settings', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_platform_settings():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        settings = PlatformSettings.query.all()
-        
-        settings_dict = {}
-        for setting in settings:
-            settings_dict[setting.setting_key] = {
-                'value': setting.setting_value,
-                'description': setting.description,
-                'updated_at': setting.updated_at.isoformat() if setting.updated_at else None
-            }
-        
-        return jsonify({
-            'settings': settings_dict
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    settings = PlatformSettings.query.all()
+    
+    settings_dict = {}
+    for setting in settings:
+        settings_dict[setting.setting_key] = {
+            'value': setting.setting_value,
+            'description': setting.description,
+            'updated_at': setting.updated_at
+        }
+    
+    return jsonify({
+        'settings': settings_dict
+    }), 200
 
 @admin_bp.route('/settings', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def update_platform_settings():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        
-        for key, value in data.items():
-            setting = PlatformSettings.query.filter_by(setting_key=key).first()
-            
-            if setting:
-                setting.setting_value = str(value)
-                setting.updated_at = datetime.utcnow()
-            else:
-                setting = PlatformSettings(
-                    setting_key=key,
-                    setting_value=str(value)
-                )
-                db.session.add(setting)
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Configurações atualizadas com sucesso'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
-
-
-# Rotas para gerenciar categorias
-
-@admin_bp.route('/categories', methods=['GET'])
-def get_categories():
-    try:
-        categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order, Category.name).all()
-        
-        return jsonify({
-            'categories': [category.to_dict() for category in categories],
-            'total': len(categories)
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@admin_bp.route('/categories/admin', methods=['GET'])
-@jwt_required()
-def get_all_categories():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        categories = Category.query.order_by(Category.sort_order, Category.name).all()
-        
-        return jsonify({
-            'categories': [category.to_dict() for category in categories],
-            'total': len(categories)
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
-
-@admin_bp.route('/categories', methods=['POST'])
-@jwt_required()
-def create_category():
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        
-        # Validar dados obrigatórios
-        if 'name' not in data or not data['name']:
-            return jsonify({'error': 'Nome da categoria é obrigatório'}), 400
-        
-        # Verificar se categoria já existe
-        existing_category = Category.query.filter_by(name=data['name']).first()
-        if existing_category:
-            return jsonify({'error': 'Categoria já existe'}), 400
-        
-        # Criar nova categoria
-        category = Category(
-            name=data['name'],
-            description=data.get('description', ''),
-            icon=data.get('icon', ''),
-            color=data.get('color', '#66CCFF'),
-            sort_order=data.get('sort_order', 0)
-        )
-        
-        db.session.add(category)
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Categoria criada com sucesso',
-            'category': category.to_dict()
-        }), 201
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
-
-@admin_bp.route('/categories/<int:category_id>', methods=['PUT'])
-@jwt_required()
-def update_category(category_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        category = Category.query.get(category_id)
-        if not category:
-            return jsonify({'error': 'Categoria não encontrada'}), 404
-        
-        data = request.get_json()
-        
-        # Atualizar campos
-        if 'name' in data:
-            category.name = data['name']
-        if 'description' in data:
-            category.description = data['description']
-        if 'icon' in data:
-            category.icon = data['icon']
-        if 'color' in data:
-            category.color = data['color']
-        if 'sort_order' in data:
-            category.sort_order = data['sort_order']
-        if 'is_active' in data:
-            category.is_active = data['is_active']
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Categoria atualizada com sucesso',
-            'category': category.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
-
-@admin_bp.route('/categories/<int:category_id>', methods=['DELETE'])
-@jwt_required()
-def delete_category(category_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        category = Category.query.get(category_id)
-        if not category:
-            return jsonify({'error': 'Categoria não encontrada'}), 404
-        
-        # Verificar se há produtos ou lojas usando esta categoria
-        products_count = Product.query.filter_by(category_id=category_id).count()
-        stores_count = Store.query.filter_by(category_id=category_id).count()
-        
-        if products_count > 0 or stores_count > 0:
-            return jsonify({'error': f'Não é possível excluir categoria. Há {products_count} produtos e {stores_count} lojas usando esta categoria'}), 400
-        
-        db.session.delete(category)
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Categoria {category.name} excluída com sucesso'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    
+    PlatformSettings.upsert([setting_row(key, value) for key, value in data.items()])
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Configurações atualizadas com sucesso'
+    }), 200
 
-# Rotas para gerenciar subcategorias
 
-@admin_bp.route('/categories/<int:category_id>/subcategories', methods=['GET'])
-def get_subcategories(category_id):
-    try:
-        subcategories = Subcategory.query.filter_by(
-            category_id=category_id, 
-            is_active=True
-        ).order_by(Subcategory.sort_order, Subcategory.name).all()
-        
-        return jsonify({
-            'subcategories': [sub.to_dict() for sub in subcategories],
-            'total': len(subcategories)
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+# Rotas para gerenciar categorias
 
-@admin_bp.route('/subcategories', methods=['POST'])
+@admin_bp.route('/categories', methods=['GET'])
+def get_categories():
+    categories = Category.query.filter_by(is_active=True).order_by(Category.sort_order, Category.name).all()
+    
+    return jsonify({
+        'categories': [category.to_dict() for category in categories],
+        'total': len(categories)
+    }), 200
+
+@admin_bp.route('/categories/admin', methods=['GET'])
 @jwt_required()
-def create_subcategory():
+@admin_endpoint
+def get_all_categories():
+    categories = Category.query.order_by(Category.sort_order, Category.name).all()
+    
+    return jsonify({
+        'categories': [category.to_dict() for category in categories],
+        'total': len(categories)
+    }), 200
+
+@admin_bp.route('/categories', methods=['POST'])
+@jwt_required()
+@admin_endpoint
+def create_category():
     try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
         data = request.get_json()
         
         # Validar dados obrigatórios
-        required_fields = ['category_id', 'name']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({'error': f'Campo {field} é obrigatório'}), 400
-        
-        # Verificar se categoria existe
-        category = Category.query.get(data['category_id'])
-        if not category:
-            return jsonify({'error': 'Categoria não encontrada'}), 404
-        
-        # Verificar se subcategoria já existe na categoria
-        existing_sub = Subcategory.query.filter_by(
-            category_id=data['category_id'],
-            name=data['name']
-        ).first()
-        if existing_sub:
-            return jsonify({'error': 'Subcategoria já existe nesta categoria'}), 400
+        if 'name' not in data or not data['name']:
+            return jsonify({'error': 'Nome da categoria é obrigatório'}), 400
         
-        # Criar nova subcategoria
-        subcategory = Subcategory(
-            category_id=data['category_id'],
+        # Criar nova categoria (duplicata barrada pelo UNIQUE de categories.name)
+        category = Category(
             name=data['name'],
             description=data.get('description', ''),
+            icon=data.get('icon', ''),
+            color=data.get('color', '#66CCFF'),
             sort_order=data.get('sort_order', 0)
         )
         
-        db.session.add(subcategory)
+        db.session.add(category)
         db.session.commit()
         
         return jsonify({
-            'message': 'Subcategoria criada com sucesso',
-            'subcategory': subcategory.to_dict()
+            'message': 'Categoria criada com sucesso',
+            'category': category.to_dict()
         }), 201
         
-    except Exception as e:
+    except IntegrityError:
         db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        return jsonify({'error': 'Categoria já existe'}), 400
+
+@admin_bp.route('/categories/<int:category_id>', methods=['PUT'])
+@jwt_required()
+@admin_endpoint
+def update_category(category_id):
+    category = Category.query.get(category_id)
+    if not category:
+        return CATEGORY_NOT_FOUND
+    
+    data = request.get_json()
+    
+    # Atualizar campos
+    if 'name' in data:
+        category.name = data['name']
+    if 'description' in data:
+        category.description = data['description']
+    if 'icon' in data:
+        category.icon = data['icon']
+    if 'color' in data:
+        category.color = data['color']
+    if 'sort_order' in data:
+        category.sort_order = data['sort_order']
+    if 'is_active' in data:
+        category.is_active = data['is_active']
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Categoria atualizada com sucesso',
+        'category': category.to_dict()
+    }), 200
+
+@admin_bp.route('/categories/<int:category_id>', methods=['DELETE'])
+@jwt_required()
+@admin_endpoint
+def delete_category(category_id):
+    category = Category.query.get(category_id)
+    if not category:
+        return CATEGORY_NOT_FOUND
+    
+    # Verificar se há produtos ou lojas usando esta categoria; as contagens
+    # (só para a mensagem) ficam para quando a exclusão é recusada
+    if Category.in_use(category_id):
+        products_count, stores_count = Category.usage_counts(category_id)
+        return jsonify({'error': f'Não é possível excluir categoria. Há {products_count} produtos e {stores_count} lojas usando esta categoria'}), 400
+    
+    db.session.delete(category)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'Categoria {category.name} excluída com sucesso'
+    }), 200
+
+# Rotas para gerenciar subcategorias
+
+@admin_bp.route('/categories/<int:category_id>/subcategories', methods=['GET'])
+def get_subcategories(category_id):
+    subcategories = Subcategory.query.filter_by(
+        category_id=category_id, 
+        is_active=True
+    ).order_by(Subcategory.sort_order, Subcategory.name).all()
+    
+    return jsonify({
+        'subcategories': [sub.to_dict() for sub in subcategories],
+        'total': len(subcategories)
+    }), 200
+
+@admin_bp.route('/subcategories', methods=['POST'])
+@jwt_required()
+@admin_endpoint
+def create_subcategory():
+    data = request.get_json()
+    
+    # Validar dados obrigatórios
+    required_fields = ['category_id', 'name']
+    for field in required_fields:
+        if field not in data or not data[field]:
+            return jsonify({'error': f'Campo {field} é obrigatório'}), 400
+    
+    # Verificar se categoria existe
+    category = Category.query.get(data['category_id'])
+    if not category:
+        return CATEGORY_NOT_FOUND
+    
+    # Verificar se subcategoria já existe na categoria
+    existing_sub = Subcategory.query.filter_by(
+        category_id=data['category_id'],
+        name=data['name']
+    ).first()
+    if existing_sub:
+        return jsonify({'error': 'Subcategoria já existe nesta categoria'}), 400
+    
+    # Criar nova subcategoria
+    subcategory = Subcategory(
+        category_id=data['category_id'],
+        name=data['name'],
+        description=data.get('description', ''),
+        sort_order=data.get('sort_order', 0)
+    )
+    
+    db.session.add(subcategory)
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Subcategoria criada com sucesso',
+        'subcategory': subcategory.to_dict()
+    }), 201
 
 @admin_bp.route('/subcategories/<int:subcategory_id>', methods=['PUT'])
 @jwt_required()
+@admin_endpoint
 def update_subcategory(subcategory_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        subcategory = Subcategory.query.get(subcategory_id)
-        if not subcategory:
-            return jsonify({'error': 'Subcategoria não encontrada'}), 404
-        
-        data = request.get_json()
-        
-        # Atualizar campos
-        if 'name' in data:
-            subcategory.name = data['name']
-        if 'description' in data:
-            subcategory.description = data['description']
-        if 'sort_order' in data:
-            subcategory.sort_order = data['sort_order']
-        if 'is_active' in data:
-            subcategory.is_active = data['is_active']
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Subcategoria atualizada com sucesso',
-            'subcategory': subcategory.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    subcategory = Subcategory.query.get(subcategory_id)
+    if not subcategory:
+        return SUBCATEGORY_NOT_FOUND
+    
+    data = request.get_json()
+    
+    # Atualizar campos
+    if 'name' in data:
+        subcategory.name = data['name']
+    if 'description' in data:
+        subcategory.description = data['description']
+    if 'sort_order' in data:
+        subcategory.sort_order = data['sort_order']
+    if 'is_active' in data:
+        subcategory.is_active = data['is_active']
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Subcategoria atualizada com sucesso',
+        'subcategory': subcategory.to_dict()
+    }), 200
 
 @admin_bp.route('/subcategories/<int:subcategory_id>', methods=['DELETE'])
 @jwt_required()
+@admin_endpoint
 def delete_subcategory(subcategory_id):
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        subcategory = Subcategory.query.get(subcategory_id)
-        if not subcategory:
-            return jsonify({'error': 'Subcategoria não encontrada'}), 404
-        
-        # Verificar se há produtos usando esta subcategoria
-        products_count = Product.query.filter_by(subcategory_id=subcategory_id).count()
-        
-        if products_count > 0:
-            return jsonify({'error': f'Não é possível excluir subcategoria. Há {products_count} produtos usando esta subcategoria'}), 400
-        
-        db.session.delete(subcategory)
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Subcategoria {subcategory.name} excluída com sucesso'
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    subcategory = Subcategory.query.get(subcategory_id)
+    if not subcategory:
+        return SUBCATEGORY_NOT_FOUND
+    
+    # Verificar se há produtos usando esta subcategoria
+    if row_exists(Product, Product.subcategory_id == subcategory_id):
+        products_count = count_rows(Product, Product.subcategory_id == subcategory_id)
+        return jsonify({'error': f'Não é possível excluir subcategoria. Há {products_count} produtos usando esta subcategoria'}), 400
+    
+    db.session.delete(subcategory)
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'Subcategoria {subcategory.name} excluída com sucesso'
+    }), 200
 
 
 # Função para inicializar configurações padrão
@@ -1083,17 +959,9 @@ def initialize_default_settings():
         'support_phone': '(11) 99999-9999'
     }
     
-    for key, value in default_settings.items():
-        existing_setting = PlatformSettings.query.filter_by(setting_key=key).first()
-        if not existing_setting:
-            setting = PlatformSettings(
-                setting_key=key,
-                setting_value=value,
-                description=get_setting_description(key)
-            )
-            db.session.add(setting)
-    
     try:
+        # Sem SELECT prévio: as chaves existentes são ignoradas pelo ON CONFLICT
+        PlatformSettings.insert_missing([setting_row(key, value) for key, value in default_settings.items()])
         db.session.commit()
     except Exception as e:
         db.session.rollback()
@@ -1115,13 +983,33 @@ def get_setting_description(key):
     }
     return descriptions.get(key, '')
 
+def setting_row(key, value):
+    """Linha para PlatformSettings.upsert"""
+    return {
+        'setting_key': key,
+        'setting_value': str(value),
+        'description': get_setting_description(key)
+    }
+
 # Função para obter configuração
 def get_platform_setting(key, default_value=None):
     """Obtém uma configuração da plataforma"""
-    setting = PlatformSettings.query.filter_by(setting_key=key).first()
-    if setting:
-        return setting.setting_value
-    return default_value
+    return PlatformSettings.get_value(key, default_value)
+
+# Configurações de taxas e seus valores padrão
+FEE_SETTING_DEFAULTS = {
+    'platform_commission_percentage': '5.0',
+    'default_delivery_fee_per_km': '2.0',
+    'minimum_delivery_fee': '5.0',
+    'maximum_delivery_distance': '10.0',
+    'default_minimum_order_value': '30.0',
+    'allow_store_set_minimum': 'false',
+    'allow_store_set_delivery_fee': 'false'
+}
+
+def get_platform_settings_bulk(*keys):
+    """Várias configurações de taxas de uma vez (uma query IN para as que não estão em cache)"""
+    return PlatformSettings.get_values({key: FEE_SETTING_DEFAULTS[key] for key in keys})
 
 # Função para atualizar configuração
 def update_platform_setting(key, value, description=None):
@@ -1148,82 +1036,77 @@ def update_platform_setting(key, value, description=None):
 
 @admin_bp.route('/platform/fees', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_platform_fees():
     """Obter configurações de taxas da plataforma"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        fees = {
-            'platform_commission_percentage': float(get_platform_setting('platform_commission_percentage', '5.0')),
-            'default_delivery_fee_per_km': float(get_platform_setting('default_delivery_fee_per_km', '2.0')),
-            'minimum_delivery_fee': float(get_platform_setting('minimum_delivery_fee', '5.0')),
-            'maximum_delivery_distance': float(get_platform_setting('maximum_delivery_distance', '10.0')),
-            'default_minimum_order_value': float(get_platform_setting('default_minimum_order_value', '30.0')),
-            'allow_store_set_minimum': get_platform_setting('allow_store_set_minimum', 'false') == 'true',
-            'allow_store_set_delivery_fee': get_platform_setting('allow_store_set_delivery_fee', 'false') == 'true'
-        }
-        
-        return jsonify({'fees': fees}), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    settings = get_platform_settings_bulk(*FEE_SETTING_DEFAULTS)
+    fees = {
+        'platform_commission_percentage': float(settings['platform_commission_percentage']),
+        'default_delivery_fee_per_km': float(settings['default_delivery_fee_per_km']),
+        'minimum_delivery_fee': float(settings['minimum_delivery_fee']),
+        'maximum_delivery_distance': float(settings['maximum_delivery_distance']),
+        'default_minimum_order_value': float(settings['default_minimum_order_value']),
+        'allow_store_set_minimum': settings['allow_store_set_minimum'] == 'true',
+        'allow_store_set_delivery_fee': settings['allow_store_set_delivery_fee'] == 'true'
+    }
+    
+    return jsonify({'fees': fees}), 200
 
 @admin_bp.route('/platform/fees', methods=['PUT'])
 @jwt_required()
+@admin_endpoint
 def update_platform_fees():
     """Atualizar configurações de taxas da plataforma"""
     try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
         data = request.get_json()
+        updates = {}
         
-        # Validar e atualizar cada configuração
+        # Validar cada configuração; todas são gravadas juntas no final
         if 'platform_commission_percentage' in data:
             commission = float(data['platform_commission_percentage'])
             if commission < 0 or commission > 50:
                 return jsonify({'error': 'Comissão deve estar entre 0% e 50%'}), 400
-            update_platform_setting('platform_commission_percentage', commission)
+            updates['platform_commission_percentage'] = commission
         
         if 'default_delivery_fee_per_km' in data:
             fee_per_km = float(data['default_delivery_fee_per_km'])
             if fee_per_km < 0:
                 return jsonify({'error': 'Taxa por km não pode ser negativa'}), 400
-            update_platform_setting('default_delivery_fee_per_km', fee_per_km)
+            updates['default_delivery_fee_per_km'] = fee_per_km
         
         if 'minimum_delivery_fee' in data:
             min_fee = float(data['minimum_delivery_fee'])
             if min_fee < 0:
                 return jsonify({'error': 'Taxa mínima não pode ser negativa'}), 400
-            update_platform_setting('minimum_delivery_fee', min_fee)
+            updates['minimum_delivery_fee'] = min_fee
         
         if 'maximum_delivery_distance' in data:
             max_distance = float(data['maximum_delivery_distance'])
             if max_distance <= 0:
                 return jsonify({'error': 'Distância máxima deve ser maior que zero'}), 400
-            update_platform_setting('maximum_delivery_distance', max_distance)
+            updates['maximum_delivery_distance'] = max_distance
         
         if 'default_minimum_order_value' in data:
             min_order = float(data['default_minimum_order_value'])
             if min_order < 0:
                 return jsonify({'error': 'Valor mínimo não pode ser negativo'}), 400
-            update_platform_setting('default_minimum_order_value', min_order)
+            updates['default_minimum_order_value'] = min_order
         
         if 'allow_store_set_minimum' in data:
             allow_min = 'true' if data['allow_store_set_minimum'] else 'false'
-            update_platform_setting('allow_store_set_minimum', allow_min)
+            updates['allow_store_set_minimum'] = allow_min
         
         if 'allow_store_set_delivery_fee' in data:
             allow_fee = 'true' if data['allow_store_set_delivery_fee'] else 'false'
-            update_platform_setting('allow_store_set_delivery_fee', allow_fee)
+            updates['allow_store_set_delivery_fee'] = allow_fee
+        
+        PlatformSettings.upsert([setting_row(key, value) for key, value in updates.items()])
+        db.session.commit()
         
         return jsonify({'message': 'Configurações de taxas atualizadas com sucesso'}), 200
         
     except ValueError:
         return jsonify({'error': 'Valores inválidos fornecidos'}), 400
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/platform/calculate-delivery-fee', methods=['POST'])
 def calculate_delivery_fee():
@@ -1236,6 +1119,9 @@ def calculate_delivery_fee():
         
         distance = float(data['distance_km'])
         city_id = data.get('city_id')
+        settings = get_platform_settings_bulk(
+            'default_delivery_fee_per_km', 'minimum_delivery_fee', 'maximum_delivery_distance'
+        )
         
         # Verificar se a cidade tem configurações específicas
         if city_id:
@@ -1243,14 +1129,14 @@ def calculate_delivery_fee():
             if city and city.is_active:
                 fee_per_km = city.delivery_fee_per_km
             else:
-                fee_per_km = float(get_platform_setting('default_delivery_fee_per_km', '2.0'))
+                fee_per_km = float(settings['default_delivery_fee_per_km'])
         else:
-            fee_per_km = float(get_platform_setting('default_delivery_fee_per_km', '2.0'))
+            fee_per_km = float(settings['default_delivery_fee_per_km'])
         
         # Calcular taxa
         calculated_fee = distance * fee_per_km
-        minimum_fee = float(get_platform_setting('minimum_delivery_fee', '5.0'))
-        maximum_distance = float(get_platform_setting('maximum_delivery_distance', '10.0'))
+        minimum_fee = float(settings['minimum_delivery_fee'])
+        maximum_distance = float(settings['maximum_delivery_distance'])
         
         # Verificar distância máxima
         if distance > maximum_distance:
@@ -1272,925 +1158,761 @@ def calculate_delivery_fee():
         
     except ValueError:
         return jsonify({'error': 'Distância inválida'}), 400
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
 
 @admin_bp.route('/platform/order-limits', methods=['GET'])
 def get_order_limits():
     """Obter limites de pedido para uma cidade específica"""
-    try:
-        city_id = request.args.get('city_id')
-        
-        if city_id:
-            city = AllowedCity.query.get(city_id)
-            if city and city.is_active:
-                minimum_order_value = city.minimum_order_value
-            else:
-                minimum_order_value = float(get_platform_setting('default_minimum_order_value', '30.0'))
+    city_id = request.args.get('city_id')
+    settings = get_platform_settings_bulk(
+        'default_minimum_order_value', 'maximum_delivery_distance', 'allow_store_set_minimum'
+    )
+    
+    if city_id:
+        city = AllowedCity.query.get(city_id)
+        if city and city.is_active:
+            minimum_order_value = city.minimum_order_value
         else:
-            minimum_order_value = float(get_platform_setting('default_minimum_order_value', '30.0'))
-        
-        return jsonify({
-            'minimum_order_value': minimum_order_value,
-            'maximum_delivery_distance': float(get_platform_setting('maximum_delivery_distance', '10.0')),
-            'allow_store_set_minimum': get_platform_setting('allow_store_set_minimum', 'false') == 'true'
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+            minimum_order_value = float(settings['default_minimum_order_value'])
+    else:
+        minimum_order_value = float(settings['default_minimum_order_value'])
+    
+    return jsonify({
+        'minimum_order_value': minimum_order_value,
+        'maximum_delivery_distance': float(settings['maximum_delivery_distance']),
+        'allow_store_set_minimum': settings['allow_store_set_minimum'] == 'true'
+    }), 200
 
 
 # APIs avançadas de gestão para administrador
 
+# Conjuntos de status montados uma vez (os válidos vêm do ENUM do banco)
+ORDER_STATUSES = frozenset(ORDER_STATUS.enums)
+REASSIGNABLE_STATUSES = frozenset({'accepted', 'preparing', 'ready'})
+CLOSED_STATUSES = frozenset({'delivered', 'cancelled'})
+ACTIVE_STATUSES = ('pending', 'accepted', 'preparing', 'ready', 'delivering')
+# Pedidos ativos listados quando impedem a exclusão de um usuário
+ACTIVE_ORDERS_PREVIEW = 20
+
+# COUNT dos pedidos ativos de um usuário montado uma única vez, com o usuário
+# como parâmetro: a cada exclusão só o valor muda (o OR com o IN das lojas não
+# é reconstruído e o SQL compilado sai do cache)
+ACTIVE_ORDERS_COUNT = select(func.count()).select_from(Order).where(
+    Order.involving(bindparam('user_id')),
+    Order.status.in_(ACTIVE_STATUSES)
+)
+
 @admin_bp.route('/orders/reassign', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def reassign_order():
     """Reatribuir pedido para outro entregador"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        
-        # Validar dados obrigatórios
-        required_fields = ['order_id', 'new_deliverer_id', 'reason']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({'error': f'Campo {field} é obrigatório'}), 400
-        
-        order = Order.query.get(data['order_id'])
-        if not order:
-            return jsonify({'error': 'Pedido não encontrado'}), 404
-        
-        # Verificar se o pedido pode ser reatribuído
-        if order.status not in ['accepted', 'preparing', 'ready']:
-            return jsonify({'error': 'Pedido não pode ser reatribuído neste status'}), 400
-        
-        # Verificar se o novo entregador existe e está ativo
-        new_deliverer = User.query.filter_by(
-            id=data['new_deliverer_id'],
-            user_type='deliverer',
-            is_active=True
-        ).first()
-        
-        if not new_deliverer:
-            return jsonify({'error': 'Entregador não encontrado ou inativo'}), 404
-        
-        # Verificar se o entregador está aprovado
-        deliverer_profile = Deliverer.query.filter_by(user_id=new_deliverer.id).first()
-        if not deliverer_profile or not deliverer_profile.is_approved:
-            return jsonify({'error': 'Entregador não está aprovado'}), 400
-        
-        # Salvar entregador anterior para histórico
-        old_deliverer_id = order.deliverer_id
-        
-        # Reatribuir pedido
-        order.deliverer_id = data['new_deliverer_id']
-        order.updated_at = datetime.utcnow()
-        
-        # Criar log da reatribuição
-        admin_user = get_jwt_identity()
-        log_entry = f"Pedido reatribuído pelo admin {admin_user}. Entregador anterior: {old_deliverer_id}, Novo entregador: {data['new_deliverer_id']}. Motivo: {data['reason']}"
-        
-        # Adicionar ao campo notes do pedido
-        if order.notes:
-            order.notes += f"\n\n[{datetime.utcnow().strftime('%d/%m/%Y %H:%M')}] {log_entry}"
-        else:
-            order.notes = f"[{datetime.utcnow().strftime('%d/%m/%Y %H:%M')}] {log_entry}"
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Pedido reatribuído com sucesso',
-            'order': order.to_dict(),
-            'old_deliverer_id': old_deliverer_id,
-            'new_deliverer_id': data['new_deliverer_id']
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    
+    # Validar dados obrigatórios
+    required_fields = ['order_id', 'new_deliverer_id', 'reason']
+    for field in required_fields:
+        if field not in data or not data[field]:
+            return jsonify({'error': f'Campo {field} é obrigatório'}), 400
+    
+    order = Order.get_without_notes(data['order_id'])
+    if not order:
+        return ORDER_NOT_FOUND
+    
+    # Verificar se o pedido pode ser reatribuído
+    if order.status not in REASSIGNABLE_STATUSES:
+        return jsonify({'error': 'Pedido não pode ser reatribuído neste status'}), 400
+    
+    # Verificar se o novo entregador existe e está ativo
+    new_deliverer = User.query.filter_by(
+        id=data['new_deliverer_id'],
+        user_type='deliverer',
+        is_active=True
+    ).first()
+    
+    if not new_deliverer:
+        return jsonify({'error': 'Entregador não encontrado ou inativo'}), 404
+    
+    # Verificar se o entregador está aprovado
+    deliverer_profile = Deliverer.query.filter_by(user_id=new_deliverer.id).first()
+    if not deliverer_profile or not deliverer_profile.is_approved:
+        return jsonify({'error': 'Entregador não está aprovado'}), 400
+    
+    # Salvar entregador anterior para histórico
+    old_deliverer_id = order.deliverer_id
+    
+    # Reatribuir pedido (um único instante para o updated_at e o log)
+    now = datetime.utcnow()
+    order.deliverer_id = data['new_deliverer_id']
+    order.updated_at = now
+    
+    # Criar log da reatribuição
+    admin_user = get_jwt_identity()
+    log_entry = f"Pedido reatribuído pelo admin {admin_user}. Entregador anterior: {old_deliverer_id}, Novo entregador: {data['new_deliverer_id']}. Motivo: {data['reason']}"
+    
+    # Adicionar ao campo notes do pedido
+    order.notes = Order.notes_appended(f"[{now:%d/%m/%Y %H:%M}] {log_entry}")
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Pedido reatribuído com sucesso',
+        'order': order.to_dict(),
+        'old_deliverer_id': old_deliverer_id,
+        'new_deliverer_id': data['new_deliverer_id']
+    }), 200
 
 @admin_bp.route('/orders/<int:order_id>/cancel', methods=['POST'])
 @jwt_required()
-def cancel_order_admin():
+@admin_endpoint
+def cancel_order_admin(order_id):
     """Cancelar pedido (apenas admin)"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        reason = data.get('reason', 'Cancelado pelo administrador')
-        
-        order = Order.query.get(order_id)
-        if not order:
-            return jsonify({'error': 'Pedido não encontrado'}), 404
-        
-        # Verificar se o pedido pode ser cancelado
-        if order.status in ['delivered', 'cancelled']:
-            return jsonify({'error': 'Pedido não pode ser cancelado neste status'}), 400
-        
-        # Cancelar pedido
-        order.status = 'cancelled'
-        order.updated_at = datetime.utcnow()
-        
-        # Adicionar motivo do cancelamento
-        admin_user = get_jwt_identity()
-        cancel_log = f"[{datetime.utcnow().strftime('%d/%m/%Y %H:%M')}] Pedido cancelado pelo admin {admin_user}. Motivo: {reason}"
-        
-        if order.notes:
-            order.notes += f"\n\n{cancel_log}"
-        else:
-            order.notes = cancel_log
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Pedido cancelado com sucesso',
-            'order': order.to_dict()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    reason = data.get('reason', 'Cancelado pelo administrador')
+    
+    order = Order.get_without_notes(order_id)
+    if not order:
+        return ORDER_NOT_FOUND
+    
+    # Verificar se o pedido pode ser cancelado
+    if order.status in CLOSED_STATUSES:
+        return jsonify({'error': 'Pedido não pode ser cancelado neste status'}), 400
+    
+    # Cancelar pedido
+    now = datetime.utcnow()
+    order.status = 'cancelled'
+    order.updated_at = now
+    
+    # Adicionar motivo do cancelamento
+    admin_user = get_jwt_identity()
+    cancel_log = f"[{now:%d/%m/%Y %H:%M}] Pedido cancelado pelo admin {admin_user}. Motivo: {reason}"
+    
+    order.notes = Order.notes_appended(cancel_log)
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Pedido cancelado com sucesso',
+        'order': order.to_dict()
+    }), 200
 
 @admin_bp.route('/orders/<int:order_id>/status', methods=['PUT'])
 @jwt_required()
-def update_order_status_admin():
+@admin_endpoint
+def update_order_status_admin(order_id):
     """Atualizar status do pedido (apenas admin)"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        
-        if 'status' not in data:
-            return jsonify({'error': 'Status é obrigatório'}), 400
-        
-        valid_statuses = ['pending', 'accepted', 'preparing', 'ready', 'delivering', 'delivered', 'cancelled']
-        if data['status'] not in valid_statuses:
-            return jsonify({'error': 'Status inválido'}), 400
-        
-        order = Order.query.get(order_id)
-        if not order:
-            return jsonify({'error': 'Pedido não encontrado'}), 404
-        
-        old_status = order.status
-        order.status = data['status']
-        order.updated_at = datetime.utcnow()
-        
-        # Log da alteração
-        admin_user = get_jwt_identity()
-        reason = data.get('reason', 'Ajuste administrativo')
-        status_log = f"[{datetime.utcnow().strftime('%d/%m/%Y %H:%M')}] Status alterado pelo admin {admin_user} de '{old_status}' para '{data['status']}'. Motivo: {reason}"
-        
-        if order.notes:
-            order.notes += f"\n\n{status_log}"
-        else:
-            order.notes = status_log
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': 'Status do pedido atualizado com sucesso',
-            'order': order.to_dict(),
-            'old_status': old_status,
-            'new_status': data['status']
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    
+    if 'status' not in data:
+        return jsonify({'error': 'Status é obrigatório'}), 400
+    
+    if data['status'] not in ORDER_STATUSES:
+        return jsonify({'error': 'Status inválido'}), 400
+    
+    order = Order.get_without_notes(order_id)
+    if not order:
+        return ORDER_NOT_FOUND
+    
+    now = datetime.utcnow()
+    old_status = order.status
+    order.status = data['status']
+    order.updated_at = now
+    
+    # Log da alteração
+    admin_user = get_jwt_identity()
+    reason = data.get('reason', 'Ajuste administrativo')
+    status_log = f"[{now:%d/%m/%Y %H:%M}] Status alterado pelo admin {admin_user} de '{old_status}' para '{data['status']}'. Motivo: {reason}"
+    
+    order.notes = Order.notes_appended(status_log)
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': 'Status do pedido atualizado com sucesso',
+        'order': order.to_dict(),
+        'old_status': old_status,
+        'new_status': data['status']
+    }), 200
 
 @admin_bp.route('/reports/detailed', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_detailed_reports():
     """Obter relatórios detalhados para admin"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        # Parâmetros de filtro
-        start_date = request.args.get('start_date')
-        end_date = request.args.get('end_date')
-        
-        # Query base para pedidos
-        orders_query = Order.query
-        
-        # Aplicar filtros de data se fornecidos
-        if start_date:
-            try:
-                start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                orders_query = orders_query.filter(Order.created_at >= start_dt)
-            except ValueError:
-                return jsonify({'error': 'Formato de data inválido para start_date (use YYYY-MM-DD)'}), 400
-        
-        if end_date:
-            try:
-                end_dt = datetime.strptime(end_date, '%Y-%m-%d')
-                # Adicionar 1 dia para incluir todo o dia final
-                end_dt = end_dt.replace(hour=23, minute=59, second=59)
-                orders_query = orders_query.filter(Order.created_at <= end_dt)
-            except ValueError:
-                return jsonify({'error': 'Formato de data inválido para end_date (use YYYY-MM-DD)'}), 400
-        
-        orders = orders_query.all()
-        
-        # Calcular métricas
-        total_orders = len(orders)
-        total_revenue = sum(order.total_amount for order in orders)
-        total_delivery_fees = sum(order.delivery_fee for order in orders)
-        
-        # Pedidos por status
-        orders_by_status = {}
-        for order in orders:
-            status = order.status
-            if status not in orders_by_status:
-                orders_by_status[status] = 0
-            orders_by_status[status] += 1
-        
-        # Top lojas por receita
-        store_revenue = {}
-        for order in orders:
-            store_id = order.store_id
-            if store_id not in store_revenue:
-                store_revenue[store_id] = {
-                    'store_name': order.store_rel.name if order.store_rel else 'Loja não encontrada',
-                    'total_revenue': 0,
-                    'order_count': 0
-                }
-            store_revenue[store_id]['total_revenue'] += order.total_amount
-            store_revenue[store_id]['order_count'] += 1
-        
-        # Ordenar lojas por receita
-        top_stores = sorted(store_revenue.items(), key=lambda x: x[1]['total_revenue'], reverse=True)[:10]
-        
-        # Top entregadores por entregas
-        deliverer_stats = {}
-        for order in orders:
-            if order.deliverer_id and order.status == 'delivered':
-                deliverer_id = order.deliverer_id
-                if deliverer_id not in deliverer_stats:
-                    deliverer_user = User.query.get(deliverer_id)
-                    deliverer_stats[deliverer_id] = {
-                        'deliverer_name': deliverer_user.name if deliverer_user else 'Entregador não encontrado',
-                        'delivery_count': 0,
-                        'total_delivery_fees': 0
-                    }
-                deliverer_stats[deliverer_id]['delivery_count'] += 1
-                deliverer_stats[deliverer_id]['total_delivery_fees'] += order.delivery_fee
-        
-        # Ordenar entregadores por número de entregas
-        top_deliverers = sorted(deliverer_stats.items(), key=lambda x: x[1]['delivery_count'], reverse=True)[:10]
-        
-        # Pedidos por dia (últimos 30 dias)
-        from datetime import timedelta
+    # Parâmetros de filtro
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    
+    # Filtros de período aplicados em todas as agregações
+    criteria = []
+    
+    # Aplicar filtros de data se fornecidos
+    if start_date:
+        try:
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+            criteria.append(Order.created_at >= start_dt)
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido para start_date (use YYYY-MM-DD)'}), 400
+    
+    if end_date:
+        try:
+            end_dt = datetime.strptime(end_date, '%Y-%m-%d')
+            # Adicionar 1 dia para incluir todo o dia final
+            end_dt = end_dt.replace(hour=23, minute=59, second=59)
+            criteria.append(Order.created_at <= end_dt)
+        except ValueError:
+            return jsonify({'error': 'Formato de data inválido para end_date (use YYYY-MM-DD)'}), 400
+    
+    period = {
+        'start_date': start_date,
+        'end_date': end_date,
+        'total_days': (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days + 1 if start_date and end_date else None
+    }
+    
+    # Agregações feitas no banco (só voltam as linhas já agrupadas). O resumo
+    # roda antes da resposta: falha de banco ainda vira o 500 do errorhandler
+    with db.session.no_autoflush:
+        summary = db.session.query(
+            func.count().label('total_orders'),
+            func.coalesce(func.sum(Order.total_amount), 0).label('total_revenue'),
+            func.coalesce(func.sum(Order.delivery_fee), 0).label('total_delivery_fees')
+        ).filter(*criteria).one()
+    head = b'{"period":' + orjson.dumps(period) + b',"summary":' + orjson.dumps({
+        'total_orders': summary.total_orders,
+        'total_revenue': summary.total_revenue,
+        'total_delivery_fees': summary.total_delivery_fees,
+        'average_order_value': summary.total_revenue / summary.total_orders if summary.total_orders > 0 else 0
+    })
+    
+    def orders_by_status():
+        return dict(
+            db.session.query(Order.status, func.count()).filter(*criteria).group_by(Order.status)
+        )
+    
+    def top_stores():
+        # Nome da loja no mesmo SELECT
+        store_revenue = func.sum(Order.total_amount).label('total_revenue')
+        rows = db.session.query(
+            Order.store_id, Store.name, store_revenue, func.count().label('order_count')
+        ).outerjoin(Store, Store.id == Order.store_id).filter(*criteria).group_by(
+            Order.store_id, Store.name
+        ).order_by(store_revenue.desc()).limit(10)
+        return [{
+            'store_id': row.store_id,
+            'store_name': row.name or 'Loja não encontrada',
+            'total_revenue': row.total_revenue,
+            'order_count': row.order_count
+        } for row in rows]
+    
+    def top_deliverers():
+        delivery_count = func.count().label('delivery_count')
+        rows = db.session.query(
+            Order.deliverer_id, User.name, delivery_count,
+            func.coalesce(func.sum(Order.delivery_fee), 0).label('total_delivery_fees')
+        ).outerjoin(User, User.id == Order.deliverer_id).filter(
+            *criteria, Order.deliverer_id.isnot(None), Order.status == 'delivered'
+        ).group_by(Order.deliverer_id, User.name).order_by(delivery_count.desc()).limit(10)
+        return [{
+            'deliverer_id': row.deliverer_id,
+            'deliverer_name': row.name or 'Entregador não encontrado',
+            'delivery_count': row.delivery_count,
+            'total_delivery_fees': row.total_delivery_fees
+        } for row in rows]
+    
+    def orders_by_day():
+        # Últimos 30 dias
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_orders = Order.query.filter(Order.created_at >= thirty_days_ago).all()
-        
-        orders_by_day = {}
-        for order in recent_orders:
-            day = order.created_at.strftime('%Y-%m-%d')
-            if day not in orders_by_day:
-                orders_by_day[day] = 0
-            orders_by_day[day] += 1
-        
-        return jsonify({
-            'summary': {
-                'total_orders': total_orders,
-                'total_revenue': total_revenue,
-                'total_delivery_fees': total_delivery_fees,
-                'average_order_value': total_revenue / total_orders if total_orders > 0 else 0
-            },
-            'orders_by_status': orders_by_status,
-            'top_stores': [{'store_id': k, **v} for k, v in top_stores],
-            'top_deliverers': [{'deliverer_id': k, **v} for k, v in top_deliverers],
-            'orders_by_day': orders_by_day,
-            'period': {
-                'start_date': start_date,
-                'end_date': end_date,
-                'total_days': (datetime.strptime(end_date, '%Y-%m-%d') - datetime.strptime(start_date, '%Y-%m-%d')).days + 1 if start_date and end_date else None
-            }
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        day = func.date(Order.created_at)
+        return {
+            str(order_day): count
+            for order_day, count in db.session.query(day, func.count()).filter(
+                Order.created_at >= thirty_days_ago
+            ).group_by(day)
+        }
+    
+    sections = (
+        (b'orders_by_status', orders_by_status),
+        (b'top_stores', top_stores),
+        (b'top_deliverers', top_deliverers),
+        (b'orders_by_day', orders_by_day),
+    )
+    
+    # Cada seção é enviada assim que a sua query termina. O status 200 já foi
+    # enviado: um erro no meio fecha o JSON com o campo "error" em vez de truncá-lo
+    def generate():
+        yield head
+        try:
+            with db.session.no_autoflush:
+                for key, compute in sections:
+                    yield b',"' + key + b'":' + orjson.dumps(compute())
+        except Exception as error:
+            db.session.rollback()
+            current_app.logger.exception(error)
+            yield b',"error":"Erro interno do servidor"'
+        yield b'}'
+    
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+# Status -> (tipo do problema, tempo máximo no status, descrição)
+STUCK_ORDER_RULES = {
+    'accepted': ('stuck_accepted', timedelta(hours=2), 'Pedido aceito há mais de 2 horas sem progresso'),
+    'preparing': ('stuck_preparing', timedelta(hours=1), 'Pedido em preparo há mais de 1 hora'),
+    'ready': ('stuck_ready', timedelta(minutes=30), 'Pedido pronto há mais de 30 minutos sem coleta'),
+    'delivering': ('stuck_delivering', timedelta(hours=1), 'Pedido em entrega há mais de 1 hora')
+}
 
 @admin_bp.route('/orders/problematic', methods=['GET'])
 @jwt_required()
+@admin_endpoint
 def get_problematic_orders():
     """Obter pedidos com problemas que precisam de atenção admin"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        # Pedidos que estão há muito tempo no mesmo status
-        from datetime import timedelta
-        two_hours_ago = datetime.utcnow() - timedelta(hours=2)
-        one_hour_ago = datetime.utcnow() - timedelta(hours=1)
-        
-        problematic_orders = []
-        
-        # Pedidos aceitos há mais de 2 horas
-        stuck_accepted = Order.query.filter(
-            Order.status == 'accepted',
-            Order.updated_at <= two_hours_ago
-        ).all()
-        
-        for order in stuck_accepted:
-            problematic_orders.append({
-                **order.to_dict(),
-                'problem_type': 'stuck_accepted',
-                'problem_description': 'Pedido aceito há mais de 2 horas sem progresso'
-            })
-        
-        # Pedidos em preparo há mais de 1 hora
-        stuck_preparing = Order.query.filter(
-            Order.status == 'preparing',
-            Order.updated_at <= one_hour_ago
-        ).all()
-        
-        for order in stuck_preparing:
-            problematic_orders.append({
-                **order.to_dict(),
-                'problem_type': 'stuck_preparing',
-                'problem_description': 'Pedido em preparo há mais de 1 hora'
-            })
-        
-        # Pedidos prontos há mais de 30 minutos
-        thirty_minutes_ago = datetime.utcnow() - timedelta(minutes=30)
-        stuck_ready = Order.query.filter(
-            Order.status == 'ready',
-            Order.updated_at <= thirty_minutes_ago
-        ).all()
-        
-        for order in stuck_ready:
-            problematic_orders.append({
-                **order.to_dict(),
-                'problem_type': 'stuck_ready',
-                'problem_description': 'Pedido pronto há mais de 30 minutos sem coleta'
-            })
-        
-        # Pedidos em entrega há mais de 1 hora
-        stuck_delivering = Order.query.filter(
-            Order.status == 'delivering',
-            Order.updated_at <= one_hour_ago
-        ).all()
-        
-        for order in stuck_delivering:
-            problematic_orders.append({
-                **order.to_dict(),
-                'problem_type': 'stuck_delivering',
-                'problem_description': 'Pedido em entrega há mais de 1 hora'
-            })
-        
+    # Pedidos que estão há muito tempo no mesmo status, numa única query
+    now = datetime.utcnow()
+    stuck = or_(*(
+        and_(Order.status == status, Order.updated_at <= now - limit)
+        for status, (_, limit, _) in STUCK_ORDER_RULES.items()
+    ))
+    
+    # ?summary=1 (polling do painel): só as contagens, via GROUP BY, sem carregar pedidos
+    if request.args.get('summary'):
+        counts = dict(db.session.query(Order.status, func.count()).filter(stuck).group_by(Order.status))
+        summary = {problem_type: counts.get(status, 0) for status, (problem_type, _, _) in STUCK_ORDER_RULES.items()}
         return jsonify({
-            'problematic_orders': problematic_orders,
-            'total_problems': len(problematic_orders),
-            'summary': {
-                'stuck_accepted': len(stuck_accepted),
-                'stuck_preparing': len(stuck_preparing),
-                'stuck_ready': len(stuck_ready),
-                'stuck_delivering': len(stuck_delivering)
-            }
+            'total_problems': sum(summary.values()),
+            'summary': summary
         }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    
+    buckets = {problem_type: [] for problem_type, _, _ in STUCK_ORDER_RULES.values()}
+    for order in Order.query.filter(stuck):
+        problem_type, _, description = STUCK_ORDER_RULES[order.status]
+        buckets[problem_type].append({
+            **order.to_dict(),
+            'problem_type': problem_type,
+            'problem_description': description
+        })
+    
+    # Mesma ordem da resposta anterior: agrupados por tipo de problema
+    problematic_orders = [order for orders in buckets.values() for order in orders]
+    
+    return jsonify({
+        'problematic_orders': problematic_orders,
+        'total_problems': len(problematic_orders),
+        'summary': {problem_type: len(orders) for problem_type, orders in buckets.items()}
+    }), 200
 
 
 # APIs para exclusão segura de cadastros
 
 @admin_bp.route('/users/<int:user_id>/delete', methods=['DELETE'])
 @jwt_required()
-def delete_user_account():
+@admin_endpoint
+def delete_user_account(user_id):
     """Excluir conta de usuário (clientes, lojistas ou entregadores)"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        
-        # Motivo é obrigatório para exclusão
-        if 'reason' not in data or not data['reason']:
-            return jsonify({'error': 'Motivo da exclusão é obrigatório'}), 400
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        # Verificar se é um admin tentando excluir outro admin
-        if user.user_type == 'admin':
-            return jsonify({'error': 'Não é possível excluir contas de administrador'}), 403
-        
-        # Coletar informações antes da exclusão para log
-        user_info = {
-            'id': user.id,
-            'name': user.name,
-            'email': user.email,
-            'user_type': user.user_type,
-            'created_at': user.created_at.isoformat() if user.created_at else None
-        }
-        
-        # Verificar dependências e coletar estatísticas
-        dependencies = {}
-        
-        if user.user_type == 'store_owner':
-            # Verificar loja associada
-            store = Store.query.filter_by(user_id=user.id).first()
-            if store:
-                # Contar produtos da loja
-                products_count = Product.query.filter_by(store_id=store.id).count()
-                # Contar pedidos da loja
-                orders_count = Order.query.filter_by(store_id=store.id).count()
-                
-                dependencies['store'] = {
-                    'id': store.id,
-                    'name': store.name,
-                    'products_count': products_count,
-                    'orders_count': orders_count
-                }
-        
-        elif user.user_type == 'deliverer':
-            # Verificar perfil de entregador
-            deliverer = Deliverer.query.filter_by(user_id=user.id).first()
-            if deliverer:
-                # Contar entregas realizadas
-                deliveries_count = Order.query.filter_by(deliverer_id=user.id).count()
-                
-                dependencies['deliverer'] = {
-                    'id': deliverer.id,
-                    'deliveries_count': deliveries_count,
-                    'rating': deliverer.rating
-                }
-        
-        elif user.user_type == 'client':
-            # Contar pedidos do cliente
-            orders_count = Order.query.filter_by(client_id=user.id).count()
-            dependencies['client'] = {
-                'orders_count': orders_count
-            }
-        
-        # Verificar se há pedidos ativos que impedem a exclusão
-        active_orders = Order.query.filter(
-            db.or_(
-                Order.client_id == user.id,
-                Order.deliverer_id == user.id,
-                db.and_(
-                    Order.store_id.in_(
-                        db.session.query(Store.id).filter_by(user_id=user.id)
-                    ) if user.user_type == 'store_owner' else False
-                )
-            ),
-            Order.status.in_(['pending', 'accepted', 'preparing', 'ready', 'delivering'])
-        ).all()
-        
-        if active_orders:
-            return jsonify({
-                'error': f'Não é possível excluir usuário. Há {len(active_orders)} pedidos ativos.',
-                'active_orders': [order.to_dict() for order in active_orders]
-            }), 400
-        
-        # Confirmar exclusão com flag de confirmação
-        if not data.get('confirm_deletion', False):
-            return jsonify({
-                'error': 'Confirmação de exclusão necessária',
-                'user_info': user_info,
-                'dependencies': dependencies,
-                'message': 'Para confirmar a exclusão, envie confirm_deletion: true'
-            }), 400
-        
-        # Realizar exclusão em cascata
-        admin_user = get_jwt_identity()
-        deletion_log = {
-            'deleted_by': admin_user,
-            'deleted_at': datetime.utcnow().isoformat(),
-            'reason': data['reason'],
+    data = request.get_json(silent=True) or {}
+    
+    # Motivo é obrigatório para exclusão
+    if 'reason' not in data or not data['reason']:
+        return jsonify({'error': 'Motivo da exclusão é obrigatório'}), 400
+    
+    # Só as colunas do log de exclusão: a entidade User não é carregada
+    user = db.session.execute(
+        select(User.id, User.name, User.email, User.user_type, User.created_at).where(User.id == user_id)
+    ).first()
+    if not user:
+        return USER_NOT_FOUND
+    
+    # Verificar se é um admin tentando excluir outro admin
+    if user.user_type == 'admin':
+        return jsonify({'error': 'Não é possível excluir contas de administrador'}), 403
+    
+    # Coletar informações antes da exclusão para log
+    user_info = user._asdict()
+    
+    # Dependências e estatísticas num único SELECT
+    dependencies = User.deletion_dependencies(user.id, user.user_type)
+    
+    # Verificar se há pedidos ativos que impedem a exclusão: COUNT no banco e,
+    # só quando houver, uma prévia limitada dos pedidos (sem carregar todos)
+    active_count = db.session.scalar(ACTIVE_ORDERS_COUNT, {'user_id': user.id})
+    
+    if active_count:
+        preview = Order.query.filter(
+            Order.involving(user.id), Order.status.in_(ACTIVE_STATUSES)
+        ).order_by(Order.created_at.desc()).limit(ACTIVE_ORDERS_PREVIEW)
+        return jsonify({
+            'error': f'Não é possível excluir usuário. Há {active_count} pedidos ativos.',
+            'active_orders': Order.core_rows(preview)
+        }), 400
+    
+    # Pedidos antigos da loja do usuário também impedem a exclusão
+    if row_exists(Order, Order.store_id.in_(select(Store.id).where(Store.user_id == user.id))):
+        return STORE_HAS_ORDERS
+    
+    # Confirmar exclusão com flag de confirmação
+    if not data.get('confirm_deletion', False):
+        return jsonify({
+            'error': 'Confirmação de exclusão necessária',
             'user_info': user_info,
-            'dependencies': dependencies
-        }
-        
-        try:
-            # Excluir dados relacionados primeiro
-            if user.user_type == 'store_owner':
-                store = Store.query.filter_by(user_id=user.id).first()
-                if store:
-                    # Excluir produtos da loja
-                    Product.query.filter_by(store_id=store.id).delete()
-                    # Excluir loja
-                    db.session.delete(store)
-            
-            elif user.user_type == 'deliverer':
-                deliverer = Deliverer.query.filter_by(user_id=user.id).first()
-                if deliverer:
-                    db.session.delete(deliverer)
-            
-            # Atualizar pedidos históricos para remover referências
-            Order.query.filter_by(client_id=user.id).update({
-                'client_id': None
-            })
-            Order.query.filter_by(deliverer_id=user.id).update({
-                'deliverer_id': None
-            })
-            
-            # Excluir usuário
-            db.session.delete(user)
-            db.session.commit()
-            
-            # Log da exclusão (em produção, salvar em arquivo de log)
-            print(f"DELETION LOG: {deletion_log}")
-            
-            return jsonify({
-                'message': f'Usuário {user_info["name"]} ({user_info["user_type"]}) excluído com sucesso',
-                'deleted_user': user_info,
-                'dependencies_removed': dependencies,
-                'reason': data['reason']
-            }), 200
-            
-        except Exception as e:
-            db.session.rollback()
-            raise e
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+            'dependencies': dependencies,
+            'message': 'Para confirmar a exclusão, envie confirm_deletion: true'
+        }), 400
+    
+    # Realizar exclusão em cascata
+    admin_user = get_jwt_identity()
+    deletion_log = {
+        'deleted_by': admin_user,
+        'deleted_at': datetime.utcnow().isoformat(),
+        'reason': data['reason'],
+        'user_info': user_info,
+        'dependencies': dependencies
+    }
+    
+    # Excluir usuário: loja, produtos e perfil de entregador saem em cascata no
+    # banco; os pedidos históricos ficam com client_id/deliverer_id NULL (ON DELETE SET NULL)
+    User.query.filter_by(id=user.id).delete(synchronize_session=False)
+    invalidate_on_commit(db.session, ('user', str(user.id)))
+    db.session.commit()
+    
+    # Log da exclusão, só depois do commit: enfileirado para o log de auditoria
+    audit_log('user_deleted', deletion_log)
+    
+    return jsonify({
+        'message': f'Usuário {user_info["name"]} ({user_info["user_type"]}) excluído com sucesso',
+        'deleted_user': user_info,
+        'dependencies_removed': dependencies,
+        'reason': data['reason']
+    }), 200
 
 @admin_bp.route('/users/<int:user_id>/suspend', methods=['POST'])
 @jwt_required()
-def suspend_user_account():
+@admin_endpoint
+def suspend_user_account(user_id):
     """Suspender conta de usuário (alternativa à exclusão)"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        
-        # Motivo é obrigatório para suspensão
-        if 'reason' not in data or not data['reason']:
-            return jsonify({'error': 'Motivo da suspensão é obrigatório'}), 400
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        # Verificar se é um admin tentando suspender outro admin
-        if user.user_type == 'admin':
-            return jsonify({'error': 'Não é possível suspender contas de administrador'}), 403
-        
-        # Suspender usuário
-        user.is_active = False
-        user.updated_at = datetime.utcnow()
-        
-        # Adicionar log de suspensão
-        admin_user = get_jwt_identity()
-        suspension_log = f"[{datetime.utcnow().strftime('%d/%m/%Y %H:%M')}] Conta suspensa pelo admin {admin_user}. Motivo: {data['reason']}"
-        
-        # Se for lojista, suspender loja também
-        if user.user_type == 'store_owner':
-            store = Store.query.filter_by(user_id=user.id).first()
-            if store:
-                store.is_active = False
-        
-        # Se for entregador, marcar como inativo
-        elif user.user_type == 'deliverer':
-            deliverer = Deliverer.query.filter_by(user_id=user.id).first()
-            if deliverer:
-                deliverer.is_online = False
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Usuário {user.name} suspenso com sucesso',
-            'user': user.to_dict(),
-            'reason': data['reason'],
-            'suspended_by': admin_user
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    
+    # Motivo é obrigatório para suspensão
+    if 'reason' not in data or not data['reason']:
+        return jsonify({'error': 'Motivo da suspensão é obrigatório'}), 400
+    
+    # SELECT ... FOR UPDATE: a linha fica travada até o commit (sem corrida com
+    # exclusão/reativação concorrente entre a leitura e a escrita)
+    user = db.session.get(User, user_id, with_for_update=True)
+    if not user:
+        return USER_NOT_FOUND
+    
+    # Verificar se é um admin tentando suspender outro admin
+    if user.user_type == 'admin':
+        return jsonify({'error': 'Não é possível suspender contas de administrador'}), 403
+    
+    # Suspender usuário
+    now = datetime.utcnow()
+    user.is_active = False
+    user.updated_at = now
+    
+    # Adicionar log de suspensão
+    admin_user = get_jwt_identity()
+    suspension_log = f"[{now:%d/%m/%Y %H:%M}] Conta suspensa pelo admin {admin_user}. Motivo: {data['reason']}"
+    
+    # Se for lojista, suspender loja também (UPDATE direto, sem carregar a loja)
+    if user.user_type == 'store_owner':
+        Store.query.filter_by(user_id=user.id).update({Store.is_active: False}, synchronize_session=False)
+    
+    # Se for entregador, marcar como inativo
+    elif user.user_type == 'deliverer':
+        Deliverer.query.filter_by(user_id=user.id).update({Deliverer.is_online: False}, synchronize_session=False)
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'Usuário {user.name} suspenso com sucesso',
+        'user': user.to_dict(),
+        'reason': data['reason'],
+        'suspended_by': admin_user
+    }), 200
 
 @admin_bp.route('/users/<int:user_id>/reactivate', methods=['POST'])
 @jwt_required()
-def reactivate_user_account():
+@admin_endpoint
+def reactivate_user_account(user_id):
     """Reativar conta de usuário suspensa"""
+    data = request.get_json()
+    reason = data.get('reason', 'Reativação administrativa')
+    
+    # SELECT ... FOR UPDATE até o commit (ver suspend_user_account)
+    user = db.session.get(User, user_id, with_for_update=True)
+    if not user:
+        return USER_NOT_FOUND
+    
+    if user.is_active:
+        return jsonify({'error': 'Usuário já está ativo'}), 400
+    
+    # Reativar usuário
+    user.is_active = True
+    user.updated_at = datetime.utcnow()
+    
+    # Se for lojista, reativar loja também (se aprovada)
+    if user.user_type == 'store_owner':
+        Store.query.filter_by(user_id=user.id, is_approved=True).update(
+            {Store.is_active: True}, synchronize_session=False
+        )
+    
+    admin_user = get_jwt_identity()
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'Usuário {user.name} reativado com sucesso',
+        'user': user.to_dict(),
+        'reason': reason,
+        'reactivated_by': admin_user
+    }), 200
+
+def delete_users(users, errors):
+    """Exclui os usuários [(id, nome)] num único DELETE e devolve os excluídos.
+
+    Dados relacionados saem pelas FKs (ON DELETE CASCADE / SET NULL). Se uma
+    FK sem ON DELETE (avaliações, conversas, ...) barrar o lote, refaz um a um
+    em SAVEPOINTs: os demais são excluídos e os bloqueados vão para errors.
+    """
+    if not users:
+        return []
     try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        reason = data.get('reason', 'Reativação administrativa')
-        
-        user = User.query.get(user_id)
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        if user.is_active:
-            return jsonify({'error': 'Usuário já está ativo'}), 400
-        
-        # Reativar usuário
-        user.is_active = True
-        user.updated_at = datetime.utcnow()
-        
-        # Se for lojista, reativar loja também (se aprovada)
-        if user.user_type == 'store_owner':
-            store = Store.query.filter_by(user_id=user.id).first()
-            if store and store.is_approved:
-                store.is_active = True
-        
-        admin_user = get_jwt_identity()
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Usuário {user.name} reativado com sucesso',
-            'user': user.to_dict(),
-            'reason': reason,
-            'reactivated_by': admin_user
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+        with db.session.begin_nested():
+            User.query.filter(User.id.in_([user_id for user_id, _ in users])).delete(synchronize_session=False)
+        deleted = users
+    except IntegrityError:
+        deleted = []
+        for user_id, name in users:
+            try:
+                with db.session.begin_nested():
+                    User.query.filter_by(id=user_id).delete(synchronize_session=False)
+                deleted.append((user_id, name))
+            except IntegrityError:
+                errors.append(f'Usuário {name}: registros vinculados (avaliações, conversas, notificações) impedem exclusão')
+    invalidate_on_commit(db.session, *(('user', str(user_id)) for user_id, _ in deleted))
+    return deleted
 
 @admin_bp.route('/users/bulk-action', methods=['POST'])
 @jwt_required()
+@admin_endpoint
 def bulk_user_action():
     """Ação em lote para múltiplos usuários"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado'}), 403
-        
-        data = request.get_json()
-        
-        required_fields = ['user_ids', 'action', 'reason']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({'error': f'Campo {field} é obrigatório'}), 400
-        
-        valid_actions = ['suspend', 'reactivate', 'delete']
-        if data['action'] not in valid_actions:
-            return jsonify({'error': 'Ação inválida'}), 400
-        
-        user_ids = data['user_ids']
-        if not isinstance(user_ids, list) or len(user_ids) == 0:
-            return jsonify({'error': 'Lista de IDs de usuários inválida'}), 400
-        
-        # Verificar se todos os usuários existem
-        users = User.query.filter(User.id.in_(user_ids)).all()
-        if len(users) != len(user_ids):
-            return jsonify({'error': 'Alguns usuários não foram encontrados'}), 404
-        
-        # Verificar se há admins na lista
-        admin_users = [u for u in users if u.user_type == 'admin']
-        if admin_users:
-            return jsonify({'error': 'Não é possível executar ações em lote em contas de administrador'}), 403
-        
-        results = []
-        errors = []
-        
+    data = request.get_json()
+    
+    required_fields = ['user_ids', 'action', 'reason']
+    for field in required_fields:
+        if field not in data or not data[field]:
+            return jsonify({'error': f'Campo {field} é obrigatório'}), 400
+    
+    valid_actions = ['suspend', 'reactivate', 'delete']
+    if data['action'] not in valid_actions:
+        return jsonify({'error': 'Ação inválida'}), 400
+    
+    user_ids = data['user_ids']
+    if not isinstance(user_ids, list) or len(user_ids) == 0:
+        return jsonify({'error': 'Lista de IDs de usuários inválida'}), 400
+    
+    # Verificar se todos os usuários existem
+    users = User.query.filter(User.id.in_(user_ids)).all()
+    if len(users) != len(user_ids):
+        return jsonify({'error': 'Alguns usuários não foram encontrados'}), 404
+    
+    # Verificar se há admins na lista
+    admin_users = [u for u in users if u.user_type == 'admin']
+    if admin_users:
+        return jsonify({'error': 'Não é possível executar ações em lote em contas de administrador'}), 403
+    
+    results = []
+    errors = []
+    
+    if data['action'] == 'delete':
+        batch_ids = [user.id for user in users]
+        # Pedidos ativos de todo o lote numa única query (inclusive os das lojas)
+        active_counts = Order.count_by_user(batch_ids, Order.status.in_(ACTIVE_STATUSES))
+        # Donos de lojas com histórico de pedidos (orders.store_id não tem ON DELETE)
+        with_store_orders = set(db.session.scalars(
+            select(Store.user_id).where(Store.user_id.in_(batch_ids), exists().where(Order.store_id == Store.id))
+        ))
+        deletable = []
         for user in users:
-            try:
-                if data['action'] == 'suspend':
-                    if user.is_active:
-                        user.is_active = False
-                        results.append(f'Usuário {user.name} suspenso')
-                    else:
-                        results.append(f'Usuário {user.name} já estava suspenso')
-                
-                elif data['action'] == 'reactivate':
-                    if not user.is_active:
-                        user.is_active = True
-                        results.append(f'Usuário {user.name} reativado')
-                    else:
-                        results.append(f'Usuário {user.name} já estava ativo')
-                
-                elif data['action'] == 'delete':
-                    # Para exclusão em lote, verificar pedidos ativos
-                    active_orders = Order.query.filter(
-                        db.or_(
-                            Order.client_id == user.id,
-                            Order.deliverer_id == user.id
-                        ),
-                        Order.status.in_(['pending', 'accepted', 'preparing', 'ready', 'delivering'])
-                    ).count()
-                    
-                    if active_orders > 0:
-                        errors.append(f'Usuário {user.name}: {active_orders} pedidos ativos impedem exclusão')
-                        continue
-                    
-                    # Excluir dados relacionados
-                    if user.user_type == 'store_owner':
-                        store = Store.query.filter_by(user_id=user.id).first()
-                        if store:
-                            Product.query.filter_by(store_id=store.id).delete()
-                            db.session.delete(store)
-                    
-                    elif user.user_type == 'deliverer':
-                        deliverer = Deliverer.query.filter_by(user_id=user.id).first()
-                        if deliverer:
-                            db.session.delete(deliverer)
-                    
-                    db.session.delete(user)
-                    results.append(f'Usuário {user.name} excluído')
-                
-            except Exception as e:
-                errors.append(f'Erro ao processar usuário {user.name}: {str(e)}')
-        
-        db.session.commit()
+            active_orders = active_counts.get(user.id, 0)
+            if active_orders > 0:
+                errors.append(f'Usuário {user.name}: {active_orders} pedidos ativos impedem exclusão')
+            elif user.id in with_store_orders:
+                errors.append(f'Usuário {user.name}: a loja tem histórico de pedidos e não pode ser excluída')
+            else:
+                deletable.append((user.id, user.name))
         
-        admin_user = get_jwt_identity()
+        deleted = delete_users(deletable, errors)
+        for user_id, name in deleted:
+            results.append(f'Usuário {name} excluído')
+    
+    else:
+        # Suspender/reativar: um único UPDATE com os usuários que mudam de estado
+        activate = data['action'] == 'reactivate'
+        changed_ids = []
+        for user in users:
+            if bool(user.is_active) != activate:
+                changed_ids.append(user.id)
+                results.append(f'Usuário {user.name} {"reativado" if activate else "suspenso"}')
+            else:
+                results.append(f'Usuário {user.name} já estava {"ativo" if activate else "suspenso"}')
         
-        return jsonify({
-            'message': f'Ação em lote "{data["action"]}" executada',
-            'results': results,
-            'errors': errors,
-            'total_processed': len(results),
-            'total_errors': len(errors),
-            'action': data['action'],
+        if changed_ids:
+            User.query.filter(User.id.in_(changed_ids)).update(
+                {User.is_active: activate}, synchronize_session=False
+            )
+    
+    db.session.commit()
+    
+    admin_user = get_jwt_identity()
+    
+    if data['action'] == 'delete' and deleted:
+        audit_log('users_deleted', {
+            'deleted_by': admin_user,
+            'deleted_at': datetime.utcnow().isoformat(),
             'reason': data['reason'],
-            'executed_by': admin_user
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+            'users': [{'id': user_id, 'name': name} for user_id, name in deleted]
+        })
+    
+    return jsonify({
+        'message': f'Ação em lote "{data["action"]}" executada',
+        'results': results,
+        'errors': errors,
+        'total_processed': len(results),
+        'total_errors': len(errors),
+        'action': data['action'],
+        'reason': data['reason'],
+        'executed_by': admin_user
+    }), 200
 
 
 # Endpoints para gerenciar privilégio das lojas
 
 @admin_bp.route('/stores/<int:store_id>/privilege', methods=['POST'])
 @jwt_required()
+@admin_endpoint(denied=ADMIN_ONLY_DENIED)
 def toggle_store_privilege(store_id):
     """Conceder ou remover privilégio de uma loja"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado - apenas administradores'}), 403
-        
-        store = Store.query.get(store_id)
-        if not store:
-            return jsonify({'error': 'Loja não encontrada'}), 404
-        
-        data = request.get_json()
-        is_privileged = data.get('is_privileged', False)
-        reason = data.get('reason', '')
-        
-        # Atualizar status de privilégio
-        store.is_privileged = is_privileged
-        db.session.commit()
-        
-        action = 'concedido' if is_privileged else 'removido'
-        
-        return jsonify({
-            'message': f'Privilégio {action} com sucesso para a loja {store.name}',
-            'store': {
-                'id': store.id,
-                'name': store.name,
-                'is_privileged': store.is_privileged
-            },
-            'action': action,
-            'reason': reason,
-            'updated_at': datetime.utcnow().isoformat()
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    is_privileged = data.get('is_privileged', False)
+    reason = data.get('reason', '')
+    
+    # Atualizar status de privilégio: UPDATE ... RETURNING atômico, sem o
+    # SELECT prévio (e sem janela para a loja sumir entre a leitura e a escrita)
+    store = db.session.execute(
+        update(Store).where(Store.id == store_id).values(is_privileged=is_privileged)
+        .returning(Store.id, Store.name, Store.is_privileged)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if not store:
+        return STORE_NOT_FOUND
+    db.session.commit()
+    
+    action = 'concedido' if is_privileged else 'removido'
+    
+    return jsonify({
+        'message': f'Privilégio {action} com sucesso para a loja {store.name}',
+        'store': store._asdict(),
+        'action': action,
+        'reason': reason,
+        'updated_at': datetime.utcnow().isoformat()
+    }), 200
 
 @admin_bp.route('/stores/privileged', methods=['GET'])
 @jwt_required()
+@admin_endpoint(denied=ADMIN_ONLY_DENIED)
 def get_privileged_stores():
     """Listar todas as lojas privilegiadas"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado - apenas administradores'}), 403
-        
-        privileged_stores = Store.query.filter_by(
-            is_privileged=True,
-            is_approved=True,
-            is_active=True
-        ).all()
-        
-        stores_data = []
-        for store in privileged_stores:
-            store_info = store.to_dict()
-            store_info['user_name'] = store.user.name if store.user else None
-            store_info['user_email'] = store.user.email if store.user else None
-            store_info['products_count'] = Product.query.filter_by(
-                store_id=store.id,
-                is_active=True
-            ).count()
-            stores_data.append(store_info)
-        
-        return jsonify({
-            'privileged_stores': stores_data,
-            'total': len(stores_data),
-            'last_update': datetime.utcnow().isoformat()
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Dono e contagem de produtos na mesma query das lojas
+    stores_data = Store.privilege_rows(Store.query.filter_by(
+        is_privileged=True,
+        is_approved=True,
+        is_active=True
+    ))
+    
+    return jsonify({
+        'privileged_stores': stores_data,
+        'total': len(stores_data),
+        'last_update': datetime.utcnow().isoformat()
+    }), 200
 
 @admin_bp.route('/stores/privilege-candidates', methods=['GET'])
 @jwt_required()
+@admin_endpoint(denied=ADMIN_ONLY_DENIED)
 def get_privilege_candidates():
     """Listar lojas que podem receber privilégio (aprovadas e ativas)"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado - apenas administradores'}), 403
-        
-        candidate_stores = Store.query.filter_by(
-            is_approved=True,
-            is_active=True
-        ).all()
-        
-        stores_data = []
-        for store in candidate_stores:
-            store_info = store.to_dict()
-            store_info['user_name'] = store.user.name if store.user else None
-            store_info['user_email'] = store.user.email if store.user else None
-            store_info['products_count'] = Product.query.filter_by(
-                store_id=store.id,
-                is_active=True
-            ).count()
-            
-            # Estatísticas da loja
-            total_orders = Order.query.filter_by(store_id=store.id).count()
-            delivered_orders = Order.query.filter_by(
-                store_id=store.id,
-                status='delivered'
-            ).count()
-            
-            store_info['total_orders'] = total_orders
-            store_info['delivered_orders'] = delivered_orders
-            store_info['success_rate'] = (delivered_orders / total_orders * 100) if total_orders > 0 else 0
-            
-            stores_data.append(store_info)
-        
-        # Ordenar por número de produtos e taxa de sucesso
-        stores_data.sort(key=lambda x: (x['products_count'], x['success_rate']), reverse=True)
-        
-        return jsonify({
-            'candidate_stores': stores_data,
-            'total': len(stores_data),
-            'privileged_count': len([s for s in stores_data if s['is_privileged']]),
-            'non_privileged_count': len([s for s in stores_data if not s['is_privileged']]),
-            'last_update': datetime.utcnow().isoformat()
-        }), 200
-        
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+    # Dono, produtos ativos e estatísticas de pedidos na mesma query das lojas
+    stores_data = Store.privilege_rows(Store.query.filter_by(
+        is_approved=True,
+        is_active=True
+    ), order_stats=True)
+    
+    for store in stores_data:
+        if store.total_orders > 0:
+            store.success_rate = store.delivered_orders / store.total_orders * 100
+    
+    # Ordenar por número de produtos e taxa de sucesso
+    stores_data.sort(key=lambda s: (s.products_count, s.success_rate), reverse=True)
+    privileged_count = sum(1 for s in stores_data if s.is_privileged)
+    
+    return jsonify({
+        'candidate_stores': stores_data,
+        'total': len(stores_data),
+        'privileged_count': privileged_count,
+        'non_privileged_count': len(stores_data) - privileged_count,
+        'last_update': datetime.utcnow().isoformat()
+    }), 200
 
 @admin_bp.route('/stores/privilege/batch', methods=['POST'])
 @jwt_required()
+@admin_endpoint(denied=ADMIN_ONLY_DENIED)
 def batch_manage_privilege():
     """Gerenciar privilégio de múltiplas lojas em lote"""
-    try:
-        if not admin_required():
-            return jsonify({'error': 'Acesso negado - apenas administradores'}), 403
-        
-        data = request.get_json()
-        store_ids = data.get('store_ids', [])
-        action = data.get('action')  # 'grant' ou 'revoke'
-        reason = data.get('reason', '')
-        
-        if not store_ids or action not in ['grant', 'revoke']:
-            return jsonify({'error': 'IDs das lojas e ação válida são obrigatórios'}), 400
-        
-        is_privileged = action == 'grant'
-        results = []
-        errors = []
-        
-        for store_id in store_ids:
-            try:
-                store = Store.query.get(store_id)
-                if not store:
-                    errors.append(f'Loja ID {store_id} não encontrada')
-                    continue
-                
-                if not store.is_approved or not store.is_active:
-                    errors.append(f'Loja {store.name} não está aprovada ou ativa')
-                    continue
-                
-                store.is_privileged = is_privileged
-                action_text = 'concedido' if is_privileged else 'removido'
-                results.append(f'Privilégio {action_text} para {store.name}')
-                
-            except Exception as e:
-                errors.append(f'Erro ao processar loja ID {store_id}: {str(e)}')
-        
-        db.session.commit()
-        
-        return jsonify({
-            'message': f'Ação em lote "{action}" executada',
-            'results': results,
-            'errors': errors,
-            'total_processed': len(results),
-            'total_errors': len(errors),
-            'action': action,
-            'reason': reason
-        }), 200
-        
-    except Exception as e:
-        db.session.rollback()
-        return jsonify({'error': str(e)}), 500
+    data = request.get_json()
+    store_ids = data.get('store_ids', [])
+    action = data.get('action')  # 'grant' ou 'revoke'
+    reason = data.get('reason', '')
+    
+    if not store_ids or action not in ['grant', 'revoke']:
+        return jsonify({'error': 'IDs das lojas e ação válida são obrigatórios'}), 400
+    
+    is_privileged = action == 'grant'
+    action_text = 'concedido' if is_privileged else 'removido'
+    results = []
+    errors = []
+    
+    ids = [int(store_id) for store_id in store_ids if str(store_id).isdigit()]
+    
+    # Um único UPDATE para as lojas aprovadas e ativas; o RETURNING traz os nomes
+    updated = dict(db.session.execute(
+        update(Store).where(Store.id.in_(ids), Store.is_approved == True, Store.is_active == True)
+        .values(is_privileged=is_privileged).returning(Store.id, Store.name)
+        .execution_options(synchronize_session=False)
+    ).all())
+    
+    # Nomes das que ficaram de fora, só para as mensagens de erro
+    skipped_ids = [store_id for store_id in ids if store_id not in updated]
+    skipped = dict(db.session.execute(
+        select(Store.id, Store.name).where(Store.id.in_(skipped_ids))
+    ).all()) if skipped_ids else {}
+    
+    for store_id in store_ids:
+        key = int(store_id) if str(store_id).isdigit() else None
+        if key in updated:
+            results.append(f'Privilégio {action_text} para {updated[key]}')
+        elif key in skipped:
+            errors.append(f'Loja {skipped[key]} não está aprovada ou ativa')
+        else:
+            errors.append(f'Loja ID {store_id} não encontrada')
+    
+    db.session.commit()
+    
+    return jsonify({
+        'message': f'Ação em lote "{action}" executada',
+        'results': results,
+        'errors': errors,
+        'total_processed': len(results),
+        'total_errors': len(errors),
+        'action': action,
+        'reason': reason
+    }), 200
 
@@ -39,7 +39,7 @@ def get_conversations():
         conv_dict = conv.to_dict()
         conv_dict["other_participant_name"] = other_participant.name if other_participant else "Usuário Desconhecido"
         conv_dict["last_message_content"] = last_message.content if last_message else None
-        conv_dict["last_message_timestamp"] = last_message.timestamp.isoformat() if last_message else None
+        conv_dict["last_message_timestamp"] = last_message.timestamp if last_message else None
         conv_dict["unread_count"] = unread_count
         result.append(conv_dict)
         
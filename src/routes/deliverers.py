@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.wendy_models import db, Deliverer, User, DeliveryRequest, Order
+from src.models.wendy_models import db, Deliverer, User, DeliveryRequest, Order, count_where, sum_where
 from datetime import datetime, timedelta
 import random
 import string
@@ -17,7 +17,7 @@ deliverers_bp = Blueprint('deliverers', __name__)
 def toggle_online():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "deliverer":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -44,7 +44,7 @@ def toggle_online():
                                         {"user_id": user_id, "is_online": deliverer.is_online})
         
         return jsonify({
-            "message": f"Status alterado para {"online" if deliverer.is_online else "offline"}",
+            "message": f"Status alterado para {'online' if deliverer.is_online else 'offline'}",
             "is_online": deliverer.is_online
         }), 200
         
@@ -59,7 +59,7 @@ def toggle_online():
 def get_deliverer_stats():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "deliverer":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -73,35 +73,22 @@ def get_deliverer_stats():
                                                 {"user_id": user_id, "route": "/deliverers/stats", "method": "GET"})
             return jsonify({"error": "Perfil de entregador não encontrado"}), 404
         
-        # Estatísticas de hoje
+        # Entregas e ganhos de hoje, da semana e do mês somados no banco, numa única query
         today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        daily_deliveries = Order.query.filter(
-            Order.deliverer_id == user_id,
-            Order.status == "delivered",
-            Order.updated_at >= today
-        ).all()
-        
-        daily_earnings = sum(order.delivery_fee for order in daily_deliveries)
-        
-        # Estatísticas da semana
         week_start = today - timedelta(days=today.weekday())
-        weekly_deliveries = Order.query.filter(
-            Order.deliverer_id == user_id,
-            Order.status == "delivered",
-            Order.updated_at >= week_start
-        ).all()
+        month_start = today.replace(day=1)
         
-        weekly_earnings = sum(order.delivery_fee for order in weekly_deliveries)
+        periods = {'daily': today, 'weekly': week_start, 'monthly': month_start}
+        columns = []
+        for name, start in periods.items():
+            columns.append(count_where(Order.updated_at >= start).label(f'{name}_deliveries'))
+            columns.append(sum_where(Order.updated_at >= start, Order.delivery_fee).label(f'{name}_earnings'))
         
-        # Estatísticas do mês
-        month_start = today.replace(day=1)
-        monthly_deliveries = Order.query.filter(
+        earnings = db.session.query(*columns).filter(
             Order.deliverer_id == user_id,
             Order.status == "delivered",
-            Order.updated_at >= month_start
-        ).all()
-        
-        monthly_earnings = sum(order.delivery_fee for order in monthly_deliveries)
+            Order.updated_at >= min(periods.values())
+        ).one()
         
         # Pedidos ativos
         active_orders = Order.query.filter(
@@ -111,16 +98,16 @@ def get_deliverer_stats():
         
         return jsonify({
             "daily": {
-                "deliveries": len(daily_deliveries),
-                "earnings": daily_earnings
+                "deliveries": earnings.daily_deliveries,
+                "earnings": earnings.daily_earnings
             },
             "weekly": {
-                "deliveries": len(weekly_deliveries),
-                "earnings": weekly_earnings
+                "deliveries": earnings.weekly_deliveries,
+                "earnings": earnings.weekly_earnings
             },
             "monthly": {
-                "deliveries": len(monthly_deliveries),
-                "earnings": monthly_earnings
+                "deliveries": earnings.monthly_deliveries,
+                "earnings": earnings.monthly_earnings
             },
             "active_orders": active_orders,
             "total_deliveries": deliverer.total_deliveries,
@@ -138,7 +125,7 @@ def get_deliverer_stats():
 def get_delivery_history():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "deliverer":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -151,12 +138,12 @@ def get_delivery_history():
         if page <= 0 or per_page <= 0:
             return jsonify({"error": "Parâmetros de paginação inválidos"}), 400
 
-        orders = Order.query.filter_by(deliverer_id=user_id).order_by(
+        orders = Order.for_listing(Order.query.filter_by(deliverer_id=user_id)).order_by(
             Order.updated_at.desc()
         ).paginate(page=page, per_page=per_page, error_out=False)
         
         return jsonify({
-            "orders": [order.to_dict() for order in orders.items],
+            "orders": Order.to_dict_bulk(orders.items),
             "total": orders.total,
             "pages": orders.pages,
             "current_page": page
@@ -176,7 +163,7 @@ def get_delivery_history():
 def create_delivery_request():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "client":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -233,7 +220,7 @@ def create_delivery_request():
 def get_available_delivery_requests():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "deliverer":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -251,7 +238,9 @@ def get_available_delivery_requests():
         requests = DeliveryRequest.query.filter_by(
             status="pending",
             deliverer_id=None
-        ).order_by(DeliveryRequest.created_at.desc()).all()
+        ).order_by(DeliveryRequest.created_at.desc()).options(
+            *DeliveryRequest.default_loader_options()
+        ).all()
         
         return jsonify({
             "delivery_requests": [req.to_dict() for req in requests],
@@ -266,7 +255,7 @@ def get_available_delivery_requests():
 def accept_delivery_request(request_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != 'deliverer':
             return jsonify({'error': 'Acesso negado'}), 403
@@ -311,7 +300,7 @@ def accept_delivery_request(request_id):
 def update_delivery_request_status(request_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "deliverer":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -382,7 +371,7 @@ def update_delivery_request_status(request_id):
 def get_my_delivery_requests():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user:
             SecurityLogger.log_security_event("user_not_found", 
@@ -390,11 +379,15 @@ def get_my_delivery_requests():
             return jsonify({"error": "Usuário não encontrado"}), 404
         
         if user.user_type == "client":
-            requests = DeliveryRequest.query.filter_by(client_id=user_id).order_by(
+            requests = DeliveryRequest.query.filter_by(client_id=user_id).options(
+                *DeliveryRequest.default_loader_options()
+            ).order_by(
                 DeliveryRequest.created_at.desc()
             ).all()
         elif user.user_type == "deliverer":
-            requests = DeliveryRequest.query.filter_by(deliverer_id=user_id).order_by(
+            requests = DeliveryRequest.query.filter_by(deliverer_id=user_id).options(
+                *DeliveryRequest.default_loader_options()
+            ).order_by(
                 DeliveryRequest.created_at.desc()
             ).all()
         else:
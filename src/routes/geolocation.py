@@ -2,11 +2,30 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.wendy_models import db, User, Order, Deliverer
 from src.models.geolocation_models import DelivererLocation, OrderTracking, GeofenceArea
-from datetime import datetime, timedelta
+from sqlalchemy.orm import Bundle
+from datetime import datetime, timedelta, timezone
 import math
 
 geolocation_bp = Blueprint('geolocation', __name__)
 
+# Projeções do mapa de entregadores: só as colunas exibidas, sem entidades ORM
+DELIVERER_BUNDLE = Bundle(
+    'deliverer',
+    User.id.label('deliverer_id'), User.name, User.email, User.phone,
+    Deliverer.is_online, Deliverer.vehicle_type
+)
+LOCATION_BUNDLE = Bundle(
+    'location',
+    DelivererLocation.latitude, DelivererLocation.longitude, DelivererLocation.accuracy,
+    DelivererLocation.speed, DelivererLocation.heading,
+    DelivererLocation.created_at.label('last_update')
+)
+CURRENT_ORDER_BUNDLE = Bundle(
+    'current_order',
+    Order.id.label('order_id'), Order.store_name, Order.client_name,
+    Order.delivery_address, Order.status.label('order_status'), Order.created_at
+)
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """Calcular distância entre duas coordenadas usando fórmula de Haversine"""
     R = 6371  # Raio da Terra em km
@@ -33,12 +52,50 @@ def estimate_arrival_time(distance_km, avg_speed_kmh=25):
     
     return datetime.utcnow() + timedelta(minutes=time_minutes)
 
+def parse_ping_timestamp(value, now):
+    """Horário em que o app registrou a localização (ISO 8601), em UTC sem fuso
+    como as demais colunas; ausente ou no futuro, vale o horário do servidor"""
+    if value is None:
+        return now
+    timestamp = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(timestamp, now)
+
+def build_tracking_rows(deliverer_id, latitude, longitude):
+    """Monta os pontos de tracking dos pedidos em entrega do entregador"""
+    active_order_ids = db.session.query(Order.id).filter_by(
+        deliverer_id=deliverer_id,
+        status='delivering'
+    ).all()
+    
+    rows = []
+    for (order_id,) in active_order_ids:
+        # Calcular distância até o destino (simulado)
+        # Em produção, usar API de mapas para rota real
+        dest_lat = -23.5505  # Coordenadas de exemplo (São Paulo)
+        dest_lon = -46.6333
+        
+        distance = calculate_distance(latitude, longitude, dest_lat, dest_lon)
+        
+        rows.append({
+            'order_id': order_id,
+            'deliverer_id': deliverer_id,
+            'latitude': latitude,
+            'longitude': longitude,
+            'status': 'in_transit',
+            'estimated_arrival': estimate_arrival_time(distance),
+            'distance_remaining': distance
+        })
+    
+    return rows
+
 @geolocation_bp.route('/update-location', methods=['POST'])
 @jwt_required()
 def update_deliverer_location():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != 'deliverer':
             return jsonify({'error': 'Acesso negado'}), 403
@@ -75,35 +132,9 @@ def update_deliverer_location():
         db.session.add(location)
         
         # Atualizar tracking de pedidos ativos
-        active_orders = Order.query.filter_by(
-            deliverer_id=user_id,
-            status='delivering'
-        ).all()
-        
-        for order in active_orders:
-            # Calcular distância até o destino (simulado)
-            # Em produção, usar API de mapas para rota real
-            dest_lat = -23.5505  # Coordenadas de exemplo (São Paulo)
-            dest_lon = -46.6333
-            
-            distance = calculate_distance(
-                float(data['latitude']), float(data['longitude']),
-                dest_lat, dest_lon
-            )
-            
-            estimated_arrival = estimate_arrival_time(distance)
-            
-            tracking = OrderTracking(
-                order_id=order.id,
-                deliverer_id=user_id,
-                latitude=float(data['latitude']),
-                longitude=float(data['longitude']),
-                status='in_transit',
-                estimated_arrival=estimated_arrival,
-                distance_remaining=distance
-            )
-            
-            db.session.add(tracking)
+        OrderTracking.bulk_insert(
+            build_tracking_rows(user_id, float(data['latitude']), float(data['longitude']))
+        )
         
         db.session.commit()
         
@@ -116,12 +147,81 @@ def update_deliverer_location():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@geolocation_bp.route('/update-location/batch', methods=['POST'])
+@jwt_required()
+def update_deliverer_location_batch():
+    """Recebe em lote as localizações acumuladas pelo app (ex.: após ficar sem sinal)"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.get_cached(user_id)
+        
+        if not user or user.user_type != 'deliverer':
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        deliverer = Deliverer.query.filter_by(user_id=user_id).first()
+        
+        if not deliverer or not deliverer.is_online:
+            return jsonify({'error': 'Entregador deve estar online'}), 403
+        
+        data = request.get_json()
+        pings = data.get('locations') or []
+        
+        if not pings:
+            return jsonify({'error': 'Campo locations é obrigatório'}), 400
+        if len(pings) > 500:
+            return jsonify({'error': 'Máximo de 500 localizações por lote'}), 400
+        
+        now = datetime.utcnow()
+        rows = []
+        for ping in pings:
+            if not isinstance(ping, dict) or 'latitude' not in ping or 'longitude' not in ping:
+                return jsonify({'error': 'Cada localização precisa de latitude e longitude'}), 400
+            try:
+                rows.append({
+                    'deliverer_id': user_id,
+                    'latitude': float(ping['latitude']),
+                    'longitude': float(ping['longitude']),
+                    'accuracy': ping.get('accuracy'),
+                    'speed': ping.get('speed'),
+                    'heading': ping.get('heading'),
+                    # Horário do próprio ping: o lote mantém a ordem real das posições
+                    'created_at': parse_ping_timestamp(ping.get('timestamp'), now),
+                    'is_active': False
+                })
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Localização com latitude, longitude ou timestamp inválido'}), 400
+        # Só a posição mais recente fica ativa
+        rows.sort(key=lambda row: row['created_at'])
+        rows[-1]['is_active'] = True
+        
+        # Desativar localização anterior
+        DelivererLocation.query.filter_by(
+            deliverer_id=user_id,
+            is_active=True
+        ).update({'is_active': False})
+        
+        DelivererLocation.bulk_insert(rows)
+        OrderTracking.bulk_insert(
+            build_tracking_rows(user_id, rows[-1]['latitude'], rows[-1]['longitude'])
+        )
+        
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Localizações registradas com sucesso',
+            'total': len(rows)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @geolocation_bp.route('/track-order/<int:order_id>', methods=['GET'])
 @jwt_required()
 def track_order(order_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         order = Order.query.get(order_id)
         
@@ -180,7 +280,7 @@ def track_order(order_id):
 def get_nearby_deliverers():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type not in ['store', 'admin']:
             return jsonify({'error': 'Acesso negado'}), 403
@@ -193,14 +293,20 @@ def get_nearby_deliverers():
         # Buscar entregadores online com localização recente
         recent_time = datetime.utcnow() - timedelta(minutes=10)
         
-        locations = db.session.query(DelivererLocation).join(
+        query = db.session.query(DelivererLocation).join(
             Deliverer, DelivererLocation.deliverer_id == Deliverer.user_id
         ).filter(
             DelivererLocation.is_active == True,
             DelivererLocation.created_at >= recent_time,
             Deliverer.is_online == True,
             Deliverer.is_approved == True
-        ).all()
+        )
+        
+        # No PostgreSQL o índice espacial já descarta quem está fora da caixa do raio
+        if db.engine.dialect.name == 'postgresql':
+            query = query.filter(DelivererLocation.within_box(latitude, longitude, radius_km))
+        
+        locations = query.all()
         
         nearby_deliverers = []
         
@@ -213,7 +319,7 @@ def get_nearby_deliverers():
             if distance <= radius_km:
                 deliverer_data = location.to_dict()
                 deliverer_data['distance_km'] = round(distance, 2)
-                deliverer_data['estimated_arrival'] = estimate_arrival_time(distance).isoformat()
+                deliverer_data['estimated_arrival'] = estimate_arrival_time(distance)
                 nearby_deliverers.append(deliverer_data)
         
         # Ordenar por distância
@@ -252,7 +358,7 @@ def get_delivery_zones():
 def create_delivery_zone():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Acesso negado'}), 403
@@ -291,7 +397,7 @@ def get_all_deliverers_location():
     """Endpoint para Site Administrador visualizar localização de todos os entregadores em tempo real"""
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != 'admin':
             return jsonify({'error': 'Acesso negado - apenas administradores'}), 403
@@ -301,10 +407,9 @@ def get_all_deliverers_location():
         
         # Query para buscar localizações ativas dos entregadores
         deliverers_locations = db.session.query(
-            DelivererLocation,
-            Deliverer,
-            User
-        ).join(
+            DELIVERER_BUNDLE,
+            LOCATION_BUNDLE
+        ).select_from(DelivererLocation).join(
             Deliverer, DelivererLocation.deliverer_id == Deliverer.user_id
         ).join(
             User, Deliverer.user_id == User.id
@@ -314,45 +419,24 @@ def get_all_deliverers_location():
             Deliverer.is_approved == True
         ).all()
         
+        # Pedidos em entrega de todos esses entregadores numa única query
+        deliverer_ids = [row.deliverer.deliverer_id for row in deliverers_locations]
+        active_orders = {}
+        if deliverer_ids:
+            for deliverer_id, current_order in db.session.query(Order.deliverer_id, CURRENT_ORDER_BUNDLE).filter(
+                Order.deliverer_id.in_(deliverer_ids),
+                Order.status == 'delivering'
+            ):
+                active_orders.setdefault(deliverer_id, current_order._asdict())
+        
         deliverers_data = []
         
-        for location, deliverer, user in deliverers_locations:
-            # Buscar pedido ativo do entregador
-            active_order = Order.query.filter_by(
-                deliverer_id=user.id,
-                status='delivering'
-            ).first()
-            
-            deliverer_info = {
-                'deliverer_id': user.id,
-                'name': user.name,
-                'email': user.email,
-                'phone': user.phone,
-                'is_online': deliverer.is_online,
-                'vehicle_type': deliverer.vehicle_type,
-                'location': {
-                    'latitude': location.latitude,
-                    'longitude': location.longitude,
-                    'accuracy': location.accuracy,
-                    'speed': location.speed,
-                    'heading': location.heading,
-                    'last_update': location.created_at.isoformat()
-                },
-                'current_order': None,
-                'status': 'available' if not active_order else 'busy'
-            }
-            
-            # Se tem pedido ativo, incluir informações do pedido
-            if active_order:
-                deliverer_info['current_order'] = {
-                    'order_id': active_order.id,
-                    'store_name': active_order.store.name if active_order.store else None,
-                    'client_name': active_order.client.name if active_order.client else None,
-                    'delivery_address': active_order.delivery_address,
-                    'order_status': active_order.status,
-                    'created_at': active_order.created_at.isoformat()
-                }
-            
+        for deliverer, location in deliverers_locations:
+            deliverer_info = deliverer._asdict()
+            current_order = active_orders.get(deliverer.deliverer_id)
+            deliverer_info['location'] = location._asdict()
+            deliverer_info['current_order'] = current_order
+            deliverer_info['status'] = 'busy' if current_order else 'available'
             deliverers_data.append(deliverer_info)
         
         # Estatísticas gerais
@@ -370,7 +454,7 @@ def get_all_deliverers_location():
                 'busy': busy_deliverers,
                 'available': available_deliverers
             },
-            'last_update': datetime.utcnow().isoformat(),
+            'last_update': datetime.utcnow(),
             'location_timeout_minutes': 5
         }), 200
         
@@ -208,8 +208,8 @@ def get_my_devices():
                 "id": device.id,
                 "device_type": device.device_type,
                 "token_preview": device.token[:20] + "..." if len(device.token) > 20 else device.token,
-                "created_at": device.created_at.isoformat(),
-                "last_used": device.last_used.isoformat() if device.last_used else None
+                "created_at": device.created_at,
+                "last_used": device.updated_at
             })
         
         return jsonify({
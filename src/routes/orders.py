@@ -2,18 +2,12 @@ from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from src.models.wendy_models import db, Order, OrderItem, Product, Store, User
 from datetime import datetime
-import random
-import string
 from src.security_improvements import (
     SecurityValidator, rate_limit, validate_json_input, secure_headers, SecurityLogger
 )
 
 orders_bp = Blueprint("orders", __name__)
 
-def generate_order_number():
-    """Gerar número único do pedido"""
-    return ''.join(random.choices(string.digits, k=6))
-
 @orders_bp.route("/", methods=["POST"])
 @jwt_required()
 @rate_limit(max_requests=5, window_minutes=1, per="user")
@@ -25,7 +19,7 @@ def generate_order_number():
 def create_order():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "client":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -110,15 +104,9 @@ def create_order():
         delivery_zip_code = SecurityValidator.sanitize_string(data.get("delivery_zip_code", ""), 10)
         notes = SecurityValidator.sanitize_string(data.get("notes", ""), 500)
 
-        # Gerar número único do pedido
-        order_number = generate_order_number()
-        while Order.query.filter_by(order_number=order_number).first():
-            order_number = generate_order_number()
-        
         order = Order(
             client_id=user_id,
             store_id=store_id,
-            order_number=order_number,
             total_amount=total_amount,
             delivery_fee=delivery_fee,
             payment_method=payment_method,
@@ -133,17 +121,8 @@ def create_order():
         db.session.flush()  # Para obter o ID do pedido
         
         # Criar itens do pedido e atualizar estoque
+        OrderItem.bulk_create(order.id, order_items)
         for item_data in order_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item_data["product"].id,
-                quantity=item_data["quantity"],
-                unit_price=item_data["unit_price"],
-                total_price=item_data["total_price"]
-            )
-            db.session.add(order_item)
-            
-            # Atualizar estoque
             item_data["product"].stock_quantity -= item_data["quantity"]
         
         db.session.commit()
@@ -167,7 +146,7 @@ def create_order():
 def get_my_orders():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user:
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -175,23 +154,25 @@ def get_my_orders():
             return jsonify({"error": "Usuário não encontrado"}), 404
         
         if user.user_type == "client":
-            orders = Order.query.filter_by(client_id=user_id).order_by(Order.created_at.desc()).all()
+            query = Order.query.filter_by(client_id=user_id)
         elif user.user_type == "store":
             store = Store.query.filter_by(user_id=user_id).first()
             if not store:
                 SecurityLogger.log_security_event("store_not_found", 
                                                 {"user_id": user_id, "route": "/orders/my-orders", "method": "GET"})
                 return jsonify({"error": "Loja não encontrada"}), 404
-            orders = Order.query.filter_by(store_id=store.id).order_by(Order.created_at.desc()).all()
+            query = Order.query.filter_by(store_id=store.id)
         elif user.user_type == "deliverer":
-            orders = Order.query.filter_by(deliverer_id=user_id).order_by(Order.created_at.desc()).all()
+            query = Order.query.filter_by(deliverer_id=user_id)
         else:
             SecurityLogger.log_security_event("invalid_user_type", 
                                             {"user_id": user_id, "user_type": user.user_type, "route": "/orders/my-orders", "method": "GET"})
             return jsonify({"error": "Tipo de usuário inválido"}), 403
         
+        orders = Order.core_rows(query.order_by(Order.created_at.desc()))
+        
         return jsonify({
-            "orders": [order.to_dict() for order in orders],
+            "orders": orders,
             "total": len(orders)
         }), 200
         
@@ -206,7 +187,7 @@ def get_my_orders():
 def get_order(order_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         # Sanitizar order_id
         order_id = int(SecurityValidator.sanitize_string(str(order_id)))
@@ -250,7 +231,7 @@ def get_order(order_id):
 def update_order_status(order_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         # Sanitizar order_id
         order_id = int(SecurityValidator.sanitize_string(str(order_id)))
@@ -335,7 +316,7 @@ def update_order_status(order_id):
 def get_available_orders():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "deliverer":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -343,10 +324,12 @@ def get_available_orders():
             return jsonify({"error": "Acesso negado"}), 403
         
         # Buscar pedidos prontos para entrega
-        orders = Order.query.filter_by(status="ready", deliverer_id=None).order_by(Order.created_at.desc()).all()
+        orders = Order.core_rows(
+            Order.query.filter_by(status="ready", deliverer_id=None).order_by(Order.created_at.desc())
+        )
         
         return jsonify({
-            "orders": [order.to_dict() for order in orders],
+            "orders": orders,
             "total": len(orders)
         }), 200
         
@@ -361,7 +344,7 @@ def get_available_orders():
 def accept_delivery(order_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "deliverer":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.wendy_models import db, Product, Store, User, Category, Subcategory
+from src.models.wendy_models import db, Product, Store, User, Category, Subcategory, serialize_list
 from sqlalchemy import or_
+from sqlalchemy.orm import contains_eager
 from src.security_improvements import (
     SecurityValidator, rate_limit, validate_json_input, secure_headers, SecurityLogger
 )
@@ -66,6 +67,14 @@ def get_products():
         # Paginação com ordenação por privilégio da loja
         # Primeiro, lojas privilegiadas, depois as demais
         query = query.order_by(Store.is_privileged.desc(), Product.created_at.desc())
+        # A loja já está no JOIN: reaproveita as colunas para product.store
+        # (só as usadas no to_dict, sem os textos longos da loja)
+        query = query.options(contains_eager(Product.store).load_only(Store.id, Store.name))
+        
+        # summary=true: sem a descrição (coluna adiada, não trafega do banco)
+        summary = request.args.get("summary") == "true"
+        if summary:
+            query = query.options(*Product.summary_options())
         
         products = query.paginate(
             page=page, 
@@ -73,8 +82,9 @@ def get_products():
             error_out=False
         )
         
+        serialize = Product.to_dict_summary if summary else Product.to_dict
         return jsonify({
-            "products": [product.to_dict() for product in products.items],
+            "products": [serialize(product) for product in products.items],
             "total": products.total,
             "pages": products.pages,
             "current_page": page,
@@ -115,7 +125,7 @@ def get_product(product_id):
 def get_my_products():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "store":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -127,10 +137,10 @@ def get_my_products():
         if not store:
             return jsonify({"error": "Loja não encontrada"}), 404
         
-        products = Product.query.filter_by(store_id=store.id).all()
+        products = Product.core_rows(Product.query.filter_by(store_id=store.id))
         
         return jsonify({
-            "products": [product.to_dict() for product in products],
+            "products": products,
             "total": len(products)
         }), 200
         
@@ -149,7 +159,7 @@ def get_my_products():
 def create_product():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "store":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -238,7 +248,7 @@ def create_product():
 def update_product(product_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "store":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -322,7 +332,7 @@ def update_product(product_id):
 def delete_product(product_id):
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "store":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -358,10 +368,10 @@ def delete_product(product_id):
 def get_product_categories():
     try:
         # Buscar categorias únicas dos produtos ativos
-        categories = Category.query.filter_by(is_active=True).all()
+        categories = serialize_list(Category.query.filter_by(is_active=True), Category.default_loader_options())
         
         return jsonify({
-            "categories": [cat.to_dict() for cat in categories]
+            "categories": categories
         }), 200
         
     except Exception as e:
@@ -383,7 +393,7 @@ def get_featured_products():
         ).order_by(
             Store.is_privileged.desc(),
             Product.stock_quantity.desc()
-        ).limit(12).all()
+        ).options(contains_eager(Product.store)).limit(12).all()
         
         return jsonify({
             "products": [product.to_dict() for product in products]
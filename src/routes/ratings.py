@@ -92,15 +92,14 @@ def create_rating():
             order_id=order_id,
             rating=rating,
             comment=comment,
-            rating_type=rating_type,
-            created_at=datetime.utcnow()
+            rating_type=rating_type
         )
         
         db.session.add(rating_obj)
-        db.session.commit()
         
-        # Atualizar estatísticas do usuário avaliado
-        update_user_rating_stats(rated_id)
+        # Atualizar estatísticas do usuário avaliado na mesma transação
+        UserRatingStats.apply_new_rating(rated_id, rating)
+        db.session.commit()
         
         SecurityLogger.log_security_event("rating_created", 
                                         {"user_id": user_id, "rating_id": rating_obj.id, "rated_id": rated_id})
@@ -182,34 +181,16 @@ def get_order_ratings(order_id):
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 def update_user_rating_stats(user_id):
-    """Atualizar estatísticas de avaliação do usuário"""
+    """Recalcular do zero as estatísticas de avaliação do usuário (reparo)"""
     try:
-        ratings = Rating.query.filter_by(rated_id=user_id).all()
-        
-        if not ratings:
-            return
-        
-        total_ratings = len(ratings)
-        average_rating = sum(r.rating for r in ratings) / total_ratings
-        
-        # Contar por estrelas
-        rating_counts = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-        for rating in ratings:
-            rating_counts[rating.rating] += 1
-        
         # Atualizar ou criar estatísticas
         stats = UserRatingStats.query.filter_by(user_id=user_id).first()
         if not stats:
             stats = UserRatingStats(user_id=user_id)
             db.session.add(stats)
         
-        stats.total_ratings = total_ratings
-        stats.average_rating = round(average_rating, 2)
-        stats.five_star_count = rating_counts[5]
-        stats.four_star_count = rating_counts[4]
-        stats.three_star_count = rating_counts[3]
-        stats.two_star_count = rating_counts[2]
-        stats.one_star_count = rating_counts[1]
+        stats.update_stats()
+        stats.average_rating = round(stats.average_rating, 2)
         stats.updated_at = datetime.utcnow()
         
         db.session.commit()
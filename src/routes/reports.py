@@ -19,7 +19,7 @@ def get_sales_by_store():
         user_id = get_jwt_identity()
         
         # Verificar se o usuário é admin ou lojista
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         if not user:
             SecurityLogger.log_security_event("user_not_found_for_sales_report", 
                                             {"user_id": user_id})
@@ -69,11 +69,8 @@ def get_sales_by_store():
         
         # Se for lojista, filtrar apenas suas lojas
         if user.user_type == "store_owner":
-            user_stores = Store.query.filter_by(owner_id=user_id).all()
-            store_ids = [store.id for store in user_stores]
-            if not store_ids:
-                return jsonify({"sales_by_store": []}), 200
-            query = query.filter(Store.id.in_(store_ids))
+            # Filtro direto na loja já presente no JOIN, sem carregar as lojas antes
+            query = query.filter(Store.user_id == user_id)
         elif store_id:
             query = query.filter(Store.id == store_id)
         
@@ -112,7 +109,7 @@ def get_deliverer_performance():
         user_id = get_jwt_identity()
         
         # Verificar se o usuário é admin
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         if not user or user.user_type != "admin":
             SecurityLogger.log_security_event("unauthorized_deliverer_report_access", 
                                             {"user_id": user_id, "user_type": user.user_type if user else None})
@@ -184,7 +181,7 @@ def get_admin_dashboard_stats():
         user_id = get_jwt_identity()
         
         # Verificar se o usuário é admin
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         if not user or user.user_type != "admin":
             SecurityLogger.log_security_event("unauthorized_admin_stats_access", 
                                             {"user_id": user_id, "user_type": user.user_type if user else None})
@@ -1,7 +1,7 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.wendy_models import db, Store, User, Product, Category, AllowedCity
-from sqlalchemy import or_
+from src.models.wendy_models import db, Store, User, Product, Category, AllowedCity, serialize_list, sum_where
+from sqlalchemy import func, or_
 from src.security_improvements import (
     SecurityValidator, rate_limit, validate_json_input, secure_headers, SecurityLogger
 )
@@ -49,10 +49,10 @@ def get_stores():
             )
         
         # Ordenar por privilégio primeiro, depois por nome
-        stores = query.order_by(Store.is_privileged.desc(), Store.name.asc()).all()
+        stores = Store.core_rows(query.order_by(Store.is_privileged.desc(), Store.name.asc()))
         
         return jsonify({
-            "stores": [store.to_dict() for store in stores],
+            "stores": stores,
             "total": len(stores)
         }), 200
         
@@ -74,7 +74,9 @@ def get_store(store_id):
             return jsonify({"error": "Loja não encontrada"}), 404
         
         # Buscar produtos da loja
-        products = Product.query.filter_by(store_id=store_id, is_active=True).all()
+        products = Product.query.filter_by(store_id=store_id, is_active=True).options(
+            *Product.default_loader_options()
+        ).all()
         
         store_data = store.to_dict()
         store_data["products"] = [product.to_dict() for product in products]
@@ -92,7 +94,7 @@ def get_store(store_id):
 def get_my_store():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "store":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -122,7 +124,7 @@ def get_my_store():
 def update_my_store():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "store":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -186,10 +188,10 @@ def update_my_store():
 def get_categories():
     try:
         # Buscar categorias ativas e aprovadas
-        categories = Category.query.filter_by(is_active=True).all()
+        categories = serialize_list(Category.query.filter_by(is_active=True), Category.default_loader_options())
         
         return jsonify({
-            "categories": [cat.to_dict() for cat in categories]
+            "categories": categories
         }), 200
         
     except Exception as e:
@@ -203,7 +205,7 @@ def get_categories():
 def get_store_stats():
     try:
         user_id = get_jwt_identity()
-        user = User.query.get(user_id)
+        user = User.get_cached(user_id)
         
         if not user or user.user_type != "store":
             SecurityLogger.log_security_event("unauthorized_access", 
@@ -225,25 +227,17 @@ def get_store_stats():
         total_orders = Order.query.filter_by(store_id=store.id).count()
         pending_orders = Order.query.filter_by(store_id=store.id, status="pending").count()
         
-        # Vendas do mês atual
+        # Vendas do mês atual e de hoje somadas no banco (hoje está sempre dentro do mês)
         current_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        monthly_orders = Order.query.filter(
-            Order.store_id == store.id,
-            Order.created_at >= current_month,
-            Order.status.in_(["delivered", "ready", "preparing"])
-        ).all()
-        
-        monthly_revenue = sum(order.total_amount for order in monthly_orders)
-        
-        # Vendas de hoje
         today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        daily_orders = Order.query.filter(
+        monthly_revenue, daily_revenue = db.session.query(
+            func.coalesce(func.sum(Order.total_amount), 0),
+            sum_where(Order.created_at >= today, Order.total_amount)
+        ).filter(
             Order.store_id == store.id,
-            Order.created_at >= today,
+            Order.created_at >= current_month,
             Order.status.in_(["delivered", "ready", "preparing"])
-        ).all()
-        
-        daily_revenue = sum(order.total_amount for order in daily_orders)
+        ).one()
         
         return jsonify({
             "products": {
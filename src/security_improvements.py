@@ -277,16 +277,12 @@ def admin_required():
     """Verifica se o usuário é administrador"""
     try:
         verify_jwt_in_request()
-        current_user_id = get_jwt_identity()
         
+        # Tipo do usuário pelo banco (cache invalidado nos commits): os tokens
+        # não expiram, então o claim não serve para rebaixamentos/exclusões
         # Importar aqui para evitar importação circular
         from src.models.wendy_models import User
-        user = User.query.get(current_user_id)
-        
-        if not user or user.user_type != 'admin':
-            return False
-        
-        return True
+        return User.cached_type(get_jwt_identity()) == 'admin'
     except:
         return False
 